@@ -78,6 +78,30 @@ def fixture_load_cfg():
         setattr(cfg, key, saved_state[key])
 
 
+@pytest.fixture(name='clear_kvstore_cache', autouse=True)
+def fixture_clear_kvstore_cache():
+    """Forget values cached by key/value store in previous tests.
+
+    Database is rolled back after each test but the cache is not.
+    """
+    from plinth import kvstore
+    kvstore.clear_cache()
+    yield
+    kvstore.clear_cache()
+
+
+@pytest.fixture(name='invalidate_apt_cache', autouse=True)
+def fixture_invalidate_apt_cache():
+    """Don't reuse the shared apt cache built by previous tests.
+
+    Tests often mock the apt cache.
+    """
+    from plinth import package
+    package.invalidate_apt_cache()
+    yield
+    package.invalidate_apt_cache()
+
+
 @pytest.fixture(name='develop_mode')
 def fixture_develop_mode(load_cfg):
     """Turn on development mode for a test."""
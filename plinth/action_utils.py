@@ -3,12 +3,16 @@
 Python action utility functions.
 """
 
+import collections
+import fcntl
 import logging
 import os
 import pathlib
 import shutil
+import struct
 import subprocess
 import tempfile
+import time
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
@@ -16,6 +20,18 @@ logger = logging.getLogger(__name__)
 UWSGI_ENABLED_PATH = '/etc/uwsgi/apps-enabled/{config_name}.ini'
 UWSGI_AVAILABLE_PATH = '/etc/uwsgi/apps-available/{config_name}.ini'
 
+# Lock files taken by dpkg and apt while they are running
+PACKAGE_MANAGER_LOCK_FILES = [
+    '/var/lib/dpkg/lock-frontend', '/var/lib/dpkg/lock',
+    '/var/cache/apt/archives/lock', '/var/lib/apt/lists/lock'
+]
+
+# Layout of struct flock: l_type, l_whence, l_start, l_len and l_pid
+_FLOCK_FORMAT = 'hhqqi'
+
+# Largest amount of log data returned at once when tailing a log file
+LOG_TAIL_MAX_BYTES = 128 * 1024
+
 # Flag on disk to indicate if freedombox package was held by
 # plinth. This is a backup in case the process is interrupted and hold
 # is not released.
@@ -36,8 +52,14 @@ def service_daemon_reload():
 def service_is_running(servicename):
     """Return whether a service is currently running.
 
-    Does not need to run as root.
+    Does not need to run as root. Answered from memory when unit states are
+    being tracked by FreedomBox service.
     """
+    from plinth import unit_state
+    is_running = unit_state.is_running(servicename)
+    if is_running is not None:
+        return is_running
+
     try:
         subprocess.run(['systemctl', 'status', servicename], check=True,
                        stdout=subprocess.DEVNULL)
@@ -56,7 +78,15 @@ def service_is_enabled(service_name, strict_check=False):
     query. Until we understand better, a conservative work around is to pass
     strict=True to services effected by this behavior.
 
+    Answered from memory when unit states are being tracked by FreedomBox
+    service.
+
     """
+    from plinth import unit_state
+    is_enabled = unit_state.is_enabled(service_name, strict_check)
+    if is_enabled is not None:
+        return is_enabled
+
     try:
         process = subprocess.run(['systemctl', 'is-enabled', service_name],
                                  check=True, stdout=subprocess.PIPE,
@@ -463,13 +493,162 @@ def apt_unhold_freedombox():
         apt_hold_flag.unlink()
 
 
+def get_package_manager_lock_holder():
+    """Return the PID of a process holding a package manager lock.
+
+    The lock files of dpkg and apt are probed with fcntl() F_GETLK, the same
+    kind of lock that dpkg and apt take, without taking the locks. Return None
+    if no lock is held. The PID is -1 if the lock is an open file description
+    lock.
+    """
+    for path in PACKAGE_MANAGER_LOCK_FILES:
+        pid = _get_lock_holder(path)
+        if pid is not None:
+            return pid
+
+    return None
+
+
+def _get_lock_holder(path):
+    """Return the PID of the process holding a write lock on a file."""
+    try:
+        file_descriptor = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    except FileNotFoundError:
+        return None
+
+    try:
+        lock = struct.pack(_FLOCK_FORMAT, fcntl.F_WRLCK, os.SEEK_SET, 0, 0, 0)
+        lock = fcntl.fcntl(file_descriptor, fcntl.F_GETLK, lock)
+    finally:
+        os.close(file_descriptor)
+
+    lock_type, _, _, _, pid = struct.unpack(_FLOCK_FORMAT, lock)
+    return None if lock_type == fcntl.F_UNLCK else pid
+
+
 def is_package_manager_busy():
     """Return whether package manager is busy.
-    This command uses the `lsof` command to check whether the dpkg lock file
-    is open which indicates that the package manager is busy"""
-    LOCK_FILE = '/var/lib/dpkg/lock'
-    try:
-        subprocess.check_output(['lsof', LOCK_FILE])
+
+    Package manager is busy when any of the dpkg or apt lock files is locked.
+    """
+    pid = get_package_manager_lock_holder()
+    if pid is not None:
+        logger.debug('Package manager lock is held by process %s', pid)
         return True
-    except subprocess.CalledProcessError:
-        return False
+
+    return False
+
+
+def wait_for_package_manager(timeout, interval=0.5):
+    """Wait until package manager is no longer busy or timeout expires.
+
+    Return whether package manager is free.
+    """
+    end_time = time.monotonic() + timeout
+    while is_package_manager_busy():
+        remaining = end_time - time.monotonic()
+        if remaining <= 0:
+            return False
+
+        time.sleep(min(interval, remaining))
+
+    return True
+
+
+def _parse_log_position(position):
+    """Return inode and offset from a position returned by read_log_file()."""
+    try:
+        inode, offset = position.split(':')
+        return int(inode), int(offset)
+    except (AttributeError, ValueError):
+        return None, 0
+
+
+def read_log_file(path, position=None, max_bytes=LOG_TAIL_MAX_BYTES):
+    """Return the lines added to a log file after a position.
+
+    'position' is an opaque string returned by an earlier call. When it is not
+    given or when the file has been rotated or truncated since, the file is
+    read from the start. At most the last 'max_bytes' of new data are read,
+    starting at a line boundary. An incomplete last line is left for the next
+    call.
+
+    Return a dictionary with 'data' containing the new lines, 'position' to
+    pass to the next call and 'reset' which is True when 'data' does not
+    continue from the earlier position and replaces what was read before.
+    """
+    try:
+        file_handle = open(path, 'rb')
+    except FileNotFoundError:
+        return {'data': '', 'position': None, 'reset': True}
+
+    with file_handle:
+        stat = os.fstat(file_handle.fileno())
+        inode, offset = _parse_log_position(position)
+        reset = inode != stat.st_ino or offset > stat.st_size
+        if reset:
+            offset = 0
+
+        start = max(offset, stat.st_size - max_bytes)
+        file_handle.seek(start)
+        data = file_handle.read(stat.st_size - start)
+
+    first = 0
+    if start > offset:
+        # Skip the partial line at the beginning
+        reset = True
+        first = data.find(b'\n') + 1 or len(data)
+
+    end = data.rfind(b'\n', first) + 1 or first
+    return {
+        'data': data[first:end].decode(errors='replace'),
+        'position': f'{stat.st_ino}:{start + end}',
+        'reset': reset
+    }
+
+
+def read_journal(unit, position=None, lines=100):
+    """Return the journal entries of a unit after a position.
+
+    'position' is a journal cursor returned by an earlier call. When it is not
+    given or is invalid, the last 'lines' lines are returned. Otherwise, all
+    the entries following the cursor are read and at most the last 'lines'
+    lines of them are returned. Return value is a dictionary like the one
+    returned by read_log_file(). 'reset' is also True when older entries
+    after the cursor have been left out.
+    """
+    command = [
+        'journalctl', '--no-pager', '--quiet', '--show-cursor',
+        f'--unit={unit}'
+    ]
+    reset = not position
+    if position:
+        command.append(f'--after-cursor={position}')
+    else:
+        command.append(f'--lines={lines}')
+
+    # Keep one more line for the cursor printed at the end
+    output = collections.deque(maxlen=lines + 1)
+    count = 0
+    with subprocess.Popen(command, stdout=subprocess.PIPE) as process:
+        for line in process.stdout:
+            output.append(line)
+            count += 1
+
+    if process.returncode and position:
+        return read_journal(unit, lines=lines)
+
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+    prefix = b'-- cursor: '
+    if output and output[-1].startswith(prefix):
+        position = output.pop()[len(prefix):].decode().strip()
+        count -= 1
+
+    if len(output) > lines:
+        output.popleft()
+
+    reset = reset or count > lines
+    data = b''.join(output).decode(errors='replace')
+    return {'data': data, 'position': position, 'reset': reset}
@@ -1,6 +1,9 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Framework to run specified actions with elevated privileges."""
 
+import asyncio
+import concurrent.futures
+import contextlib
 import functools
 import importlib
 import inspect
@@ -9,11 +12,26 @@ import logging
 import os
 import subprocess
 import threading
+import traceback
+import types
+import typing
 
 from plinth import cfg
+from plinth.errors import ActionNotRunError
+
+EXIT_SYNTAX = 10
+EXIT_PERM = 20
+
+SOCKET_PATH = '/run/freedombox/privileged.socket'
 
 logger = logging.getLogger(__name__)
 
+_thread_local = threading.local()
+
+_event_loop = None
+_event_loop_lock = threading.Lock()
+_reaper_tasks = set()
+
 
 def privileged(func):
     """Mark a method as allowed to be run as privileged method.
@@ -29,8 +47,9 @@ def privileged(func):
     undergo such serialization and de-serialization. This decorator makes this
     task simpler.
 
-    A call to a decorated method will be serialized into a sudo call (or later
-    into a D-Bus call). The method arguments are turned to JSON and method is
+    A call to a decorated method will be serialized into a request to the
+    privileged daemon over a UNIX socket or, when the daemon is not available,
+    into a sudo call. The method arguments are turned to JSON and method is
     called with superuser privileges. As arguments are de-serialized, they are
     verified for type before the actual call as superuser. Return values are
     serialized and returned where they are de-serialized. Exceptions are also
@@ -45,6 +64,9 @@ def privileged(func):
 
     Privileged methods many not output to the stdout as it interferes
     with the serialization and de-serialization process.
+
+    When called inside a :func:`batch` context, the call is not run
+    immediately and a :class:`concurrent.futures.Future` is returned instead.
     """
     setattr(func, '_privileged', True)
 
@@ -54,23 +76,319 @@ def privileged(func):
     def wrapper(*args, **kwargs):
         module_name = _get_privileged_action_module_name(func)
         action_name = func.__name__
-        return _run_privileged_method_as_process(module_name, action_name,
-                                                 args, kwargs)
+        batch_calls = getattr(_thread_local, 'batch_calls', None)
+        if batch_calls is not None:
+            return _add_to_batch(batch_calls, module_name, action_name, args,
+                                 kwargs)
+
+        return _run_privileged_method(module_name, action_name, args, kwargs)
 
     return wrapper
 
 
-def _run_privileged_method_as_process(module_name, action_name, args, kwargs):
-    """Execute the privileged method in a sub-process with sudo."""
+@contextlib.contextmanager
+def batch():
+    """Collect privileged calls and run them together in one round-trip.
+
+    Privileged calls made in the current thread inside this context are not
+    run immediately. Instead, each of them returns a
+    :class:`concurrent.futures.Future`. When the context exits, all the calls
+    are sent together to the privileged daemon or to a single actions
+    process. Each call is validated separately before any of them are run.
+    The calls are run in the order in which they were made.
+
+    Each future is resolved with the return value or the exception of its
+    call. If a call fails, the remaining calls are not run and their futures
+    are resolved with :class:`~plinth.errors.ActionNotRunError`. The exception
+    of the failed call is then raised from the context so that code that
+    ignores the futures behaves as if the calls were made one after another.
+
+    If the body of the context raises an exception, the collected calls are
+    not run. Nested batch contexts join the outermost batch. _run_as_user,
+    _run_in_background and _raw_output are not supported for calls in a batch.
+
+    Usage::
+
+        with actions.batch():
+            service_privileged.enable(unit)
+            running = service_privileged.is_running(unit)
+
+        print(running.result())
+    """
+    if getattr(_thread_local, 'batch_calls', None) is not None:
+        yield
+        return
+
+    batch_calls = []
+    _thread_local.batch_calls = batch_calls
+    try:
+        yield
+    finally:
+        _thread_local.batch_calls = None
+
+    if batch_calls:
+        _run_batch(batch_calls)
+
+
+def _add_to_batch(batch_calls, module_name, action_name, args, kwargs):
+    """Add a privileged call to the current batch and return its future."""
+    for key in ('_run_as_user', '_run_in_background', '_raw_output'):
+        if kwargs.get(key):
+            raise ValueError(f'{key} is not supported in a batch')
+
+    kwargs.pop('_run_as_user', None)
+    kwargs.pop('_run_in_background', None)
+    kwargs.pop('_raw_output', None)
+    log_error = kwargs.pop('_log_error', True)
+    request = {
+        'module': module_name,
+        'action': action_name,
+        'args': args,
+        'kwargs': kwargs
+    }
+    future = concurrent.futures.Future()
+    batch_calls.append((request, log_error, future))
+    return future
+
+
+def _run_batch(batch_calls):
+    """Run a batch of privileged calls and resolve their futures."""
+    requests = [request for request, _, _ in batch_calls]
+    for request in requests:
+        _log_action(request['module'], request['action'], None, False)
+
+    coroutine = _run_request({'calls': requests}, ['--batch'], requests)
+    returncode, command, output, error, return_values = \
+        asyncio.run_coroutine_threadsafe(coroutine,
+                                         _get_event_loop()).result()
+    if returncode != 0:
+        logger.error('Error executing command - %s, %s, %s', command, output,
+                     error)
+        exception = subprocess.CalledProcessError(returncode, command)
+        for _, _, future in batch_calls:
+            future.set_exception(exception)
+
+        raise exception
+
+    first_exception = None
+    for index, (request, log_error, future) in enumerate(batch_calls):
+        if index >= len(return_values):
+            future.set_exception(
+                ActionNotRunError(request['module'], request['action']))
+            continue
+
+        try:
+            future.set_result(
+                _process_return_value(request['module'], request['action'],
+                                      request['args'], request['kwargs'],
+                                      log_error, return_values[index], output,
+                                      error))
+        except Exception as exception:
+            future.set_exception(exception)
+            first_exception = first_exception or exception
+
+    if first_exception:
+        raise first_exception
+
+
+def _get_event_loop():
+    """Return the event loop running privileged calls, start it if needed.
+
+    A single event loop running in a separate thread waits on all the
+    processes and daemon connections of privileged calls. This avoids creating
+    threads for each call.
+    """
+    global _event_loop
+
+    with _event_loop_lock:
+        if not _event_loop:
+            _event_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_event_loop.run_forever,
+                                      name='privileged-actions', daemon=True)
+            thread.start()
+
+        return _event_loop
+
+
+def _run_privileged_method(module_name, action_name, args, kwargs):
+    """Execute the privileged method on the daemon or in a sub-process.
+
+    The call is always performed on the event loop of privileged calls. When
+    _run_async is set, a :class:`concurrent.futures.Future` is returned
+    immediately. It may be awaited in a different event loop after wrapping it
+    with :func:`asyncio.wrap_future`. Cancelling the future before the call
+    completes terminates the action along with the processes it started. On
+    the privileged daemon, this happens when the daemon notices that the
+    connection has been closed. When _timeout is set, the call is cancelled in
+    the same way after the given number of seconds and TimeoutError is raised.
+    """
     run_as_user = kwargs.pop('_run_as_user', None)
     run_in_background = kwargs.pop('_run_in_background', False)
+    run_async = kwargs.pop('_run_async', False)
     raw_output = kwargs.pop('_raw_output', False)
     log_error = kwargs.pop('_log_error', True)
+    timeout = kwargs.pop('_timeout', None)
+
+    if raw_output:
+        return _run_privileged_method_as_raw_process(module_name, action_name,
+                                                     args, kwargs,
+                                                     run_as_user)
+
+    _log_action(module_name, action_name, run_as_user, run_in_background)
+
+    coroutine = _call_privileged_method(module_name, action_name, args, kwargs,
+                                        run_as_user, log_error)
+    if timeout is not None:
+        coroutine = asyncio.wait_for(coroutine, timeout)
+
+    future = asyncio.run_coroutine_threadsafe(coroutine, _get_event_loop())
+    if run_async:
+        return future
+
+    if run_in_background:
+        return None
 
+    return future.result()
+
+
+async def _call_privileged_method(module_name, action_name, args, kwargs,
+                                  run_as_user, log_error):
+    """Execute the privileged method and return its value or raise."""
+    request = {
+        'module': module_name,
+        'action': action_name,
+        'args': args,
+        'kwargs': kwargs
+    }
+    returncode, command, output, error, return_value = await _run_request(
+        request, [module_name, action_name], {
+            'args': args,
+            'kwargs': kwargs
+        }, run_as_user)
+    if returncode != 0:
+        logger.error('Error executing command - %s, %s, %s', command, output,
+                     error)
+        raise subprocess.CalledProcessError(returncode, command)
+
+    return _process_return_value(module_name, action_name, args, kwargs,
+                                 log_error, return_value, output, error)
+
+
+async def _run_request(request, process_args, process_input,
+                       run_as_user=None):
+    """Run a request on the daemon or in a sub-process.
+
+    The privileged daemon keeps the privileged modules imported and avoids the
+    cost of starting sudo and a new Python interpreter for each call. Running
+    as a different user is only supported by running a separate process. In
+    development mode, the daemon might be running code other than the one
+    being developed, so it is not used.
+
+    Return a tuple of exit code, command, output, error and the decoded return
+    value.
+    """
+    if not cfg.develop and not run_as_user:
+        try:
+            reader, writer = await _connect_to_server()
+        except OSError:
+            pass  # Daemon is not installed or not running, use the fallback.
+        else:
+            return await _run_request_on_server(reader, writer, request)
+
+    return await _run_request_as_process(process_args, process_input,
+                                         run_as_user)
+
+
+async def _connect_to_server():
+    """Return a stream reader and writer connected to the privileged daemon."""
+    return await asyncio.open_unix_connection(path=SOCKET_PATH)
+
+
+async def _run_request_on_server(reader, writer, request):
+    """Send a request to the daemon and return the decoded response.
+
+    Closing the connection before the response is received, such as when the
+    call is cancelled, makes the daemon terminate the action.
+    """
+    try:
+        writer.write(json.dumps(request).encode())
+        await writer.drain()
+        writer.write_eof()
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    try:
+        response = json.loads(response)
+    except json.JSONDecodeError:
+        logger.error('Error decoding daemon response for %s: %s', request,
+                     response)
+        raise
+
+    # Output of the action is sent as text to preserve the bytes exactly.
+    output = response['output'].encode(errors='surrogateescape')
+    error = response['error'].encode(errors='surrogateescape')
+    command = [SOCKET_PATH] + (['--batch'] if 'calls' in request else
+                               [request['module'], request['action']])
+    return (response['returncode'], command, output, error,
+            response['return_value'])
+
+
+async def _run_request_as_process(process_args, process_input, run_as_user):
+    """Run the actions script with sudo and return its results."""
     read_fd, write_fd = os.pipe()
     os.set_inheritable(write_fd, True)
+    command = _get_process_command(write_fd, run_as_user, process_args)
+    proc = _start_process(command, write_fd)
+    try:
+        output, error, return_value, _ = await asyncio.gather(
+            _read_fd(proc.stdout.fileno()), _read_fd(proc.stderr.fileno()),
+            _read_fd(read_fd),
+            _write_input(proc, json.dumps(process_input).encode()))
+        await _wait_for_process(proc)
+    except asyncio.CancelledError:
+        _terminate_process(proc)
+        raise
+    finally:
+        os.close(read_fd)
+        proc.stdout.close()
+        proc.stderr.close()
+        proc.stdin.close()
+
+    if proc.returncode != 0:
+        return proc.returncode, command, output, error, None
+
+    try:
+        return_value = json.loads(return_value)
+    except json.JSONDecodeError:
+        logger.error('Error decoding action return value %s: %s', command,
+                     return_value)
+        raise
+
+    return proc.returncode, command, output, error, return_value
+
+
+def _run_privileged_method_as_raw_process(module_name, action_name, args,
+                                          kwargs, run_as_user):
+    """Start the privileged method in a sub-process and return it.
 
-    # Prepare the command
+    The caller is responsible for writing the returned input to the process
+    and reading the output from the returned file descriptor.
+    """
+    read_fd, write_fd = os.pipe()
+    os.set_inheritable(write_fd, True)
+    command = _get_process_command(write_fd, run_as_user,
+                                   [module_name, action_name])
+
+    _log_action(module_name, action_name, run_as_user, False)
+
+    proc = _start_process(command, write_fd)
+    input_ = json.dumps({'args': args, 'kwargs': kwargs}).encode()
+    return proc, read_fd, input_
+
+
+def _get_process_command(write_fd, run_as_user, action_args):
+    """Return the sudo command to run the actions script."""
     command = ['sudo', '--non-interactive', '--close-from', str(write_fd + 1)]
     if run_as_user:
         command += ['--user', run_as_user]
@@ -78,12 +396,13 @@ def _run_privileged_method_as_process(module_name, action_name, args, kwargs):
     if cfg.develop:
         command += [f'PYTHONPATH={cfg.file_root}']
 
-    command += [
-        os.path.join(cfg.actions_dir, 'actions'), module_name, action_name,
-        '--write-fd',
-        str(write_fd)
-    ]
+    command += [os.path.join(cfg.actions_dir, 'actions')] + action_args
+    command += ['--write-fd', str(write_fd)]
+    return command
+
 
+def _start_process(command, write_fd):
+    """Start the actions script process and close our copy of write_fd."""
     proc_kwargs = {
         'stdin': subprocess.PIPE,
         'stdout': subprocess.PIPE,
@@ -95,50 +414,96 @@ def _run_privileged_method_as_process(module_name, action_name, args, kwargs):
         # In development mode pass on local pythonpath to access Plinth
         proc_kwargs['env'] = {'PYTHONPATH': cfg.file_root}
 
-    _log_action(module_name, action_name, run_as_user, run_in_background)
-
     proc = subprocess.Popen(command, **proc_kwargs)
     os.close(write_fd)
+    return proc
 
-    if raw_output:
-        input_ = json.dumps({'args': args, 'kwargs': kwargs}).encode()
-        return proc, read_fd, input_
 
+async def _read_fd(read_fd):
+    """Read from a file descriptor until end of file using the event loop."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
     buffers = []
-    # XXX: Use async to avoid creating a thread.
-    read_thread = threading.Thread(target=_thread_reader,
-                                   args=(read_fd, buffers))
-    read_thread.start()
 
-    wait_args = (module_name, action_name, args, kwargs, log_error, proc,
-                 command, read_fd, read_thread, buffers)
-    if not run_in_background:
-        return _wait_for_return(*wait_args)
+    def _on_readable():
+        try:
+            buffer = os.read(read_fd, 10240)
+        except BlockingIOError:
+            return
+        except OSError:
+            buffer = b''
+
+        if buffer:
+            buffers.append(buffer)
+        elif not future.done():
+            future.set_result(b''.join(buffers))
+
+    os.set_blocking(read_fd, False)
+    loop.add_reader(read_fd, _on_readable)
+    try:
+        return await future
+    finally:
+        loop.remove_reader(read_fd)
+
+
+async def _write_input(proc, input_):
+    """Write input to the process using the event loop and close stdin."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    write_fd = proc.stdin.fileno()
+    remaining = memoryview(input_)
+
+    def _on_writable():
+        nonlocal remaining
+        try:
+            remaining = remaining[os.write(write_fd, remaining):]
+        except BlockingIOError:
+            return
+        except OSError:
+            # Process exited without reading all of the input
+            remaining = remaining[len(remaining):]
+
+        if not remaining and not future.done():
+            future.set_result(None)
+
+    os.set_blocking(write_fd, False)
+    loop.add_writer(write_fd, _on_writable)
+    try:
+        await future
+    finally:
+        loop.remove_writer(write_fd)
 
-    wait_thread = threading.Thread(target=_wait_for_return, args=wait_args)
-    wait_thread.start()
+    proc.stdin.close()
 
 
-def _wait_for_return(module_name, action_name, args, kwargs, log_error, proc,
-                     command, read_fd, read_thread, buffers):
-    """Communicate with the subprocess and wait for its return."""
-    json_args = json.dumps({'args': args, 'kwargs': kwargs})
+async def _wait_for_process(proc):
+    """Wait for the process to exit without blocking the event loop.
 
-    output, error = proc.communicate(input=json_args.encode())
-    read_thread.join()
-    if proc.returncode != 0:
-        logger.error('Error executing command - %s, %s, %s', command, output,
-                     error)
-        raise subprocess.CalledProcessError(proc.returncode, command)
+    This is called after the process has closed its output, so it usually
+    exits immediately.
+    """
+    delay = 0.001
+    while proc.poll() is None:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
 
+
+def _terminate_process(proc):
+    """Terminate the process of a cancelled call and reap it later."""
+    logger.warning('Terminating cancelled action - %s', proc.args)
     try:
-        return_value = json.loads(b''.join(buffers))
-    except json.JSONDecodeError:
-        logger.error(
-            'Error decoding action return value %s..%s(*%s, **%s): %s',
-            module_name, action_name, args, kwargs, return_value)
-        raise
+        proc.terminate()
+    except ProcessLookupError:
+        pass
+
+    task = asyncio.get_running_loop().create_task(_wait_for_process(proc))
+    _reaper_tasks.add(task)
+    task.add_done_callback(_reaper_tasks.discard)
+
 
+def _process_return_value(module_name, action_name, args, kwargs, log_error,
+                          return_value, output, error):
+    """Return the value returned by action or raise the exception raised."""
     if return_value['result'] == 'success':
         return return_value['return']
 
@@ -154,18 +519,6 @@ def _wait_for_return(module_name, action_name, args, kwargs, log_error, proc,
     raise exception
 
 
-def _thread_reader(read_fd, buffers):
-    """Read from the pipe in a separate thread."""
-    while True:
-        buffer = os.read(read_fd, 10240)
-        if not buffer:
-            break
-
-        buffers.append(buffer)
-
-    os.close(read_fd)
-
-
 def _check_privileged_action_arguments(func):
     """Check that a privileged action has well defined types."""
     argspec = inspect.getfullargspec(func)
@@ -198,3 +551,194 @@ def _log_action(module_name, action_name, run_as_user, run_in_background):
     prompt = f'({run_as_user})$' if run_as_user else '#'
     suffix = '&' if run_in_background else ''
     logger.info('%s %s..%s(…) %s', prompt, module_name, action_name, suffix)
+
+
+def privileged_call(module_name, action_name, arguments):
+    """Import the module and run action as superuser.
+
+    This is called from within the process running as superuser. Both the
+    actions script and the privileged daemon use it.
+    """
+    func = _get_privileged_action(module_name, action_name)
+    _assert_valid_arguments(func, arguments)
+    return _run_privileged_action(func, arguments)
+
+
+def privileged_batch_call(calls):
+    """Import the modules and run a list of actions as superuser.
+
+    Each item in the list is a dictionary with 'module', 'action', 'args' and
+    'kwargs' keys. All the calls are validated before any of them are run.
+    Calls are run in order and a list of return values is returned. If a call
+    raises an exception, the remaining calls are not run and the list of
+    return values ends with the return value describing the exception.
+    """
+    if not isinstance(calls, list):
+        raise SyntaxError('Invalid batch format')
+
+    funcs = []
+    for call in calls:
+        if not isinstance(call, dict):
+            raise SyntaxError('Invalid batch format')
+
+        func = _get_privileged_action(str(call.get('module')),
+                                      str(call.get('action')))
+        arguments = {'args': call.get('args'), 'kwargs': call.get('kwargs')}
+        _assert_valid_arguments(func, arguments)
+        funcs.append((func, arguments))
+
+    return_values = []
+    for func, arguments in funcs:
+        return_value = _run_privileged_action(func, arguments)
+        return_values.append(return_value)
+        if return_value['result'] != 'success':
+            break
+
+    return return_values
+
+
+def _get_privileged_action(module_name, action_name):
+    """Import the module and return the undecorated privileged action."""
+    from plinth import module_loader
+
+    if '.' in module_name:
+        raise SyntaxError('Invalid module name')
+
+    if module_name == 'plinth':
+        import_path = 'plinth'
+    else:
+        import_path = module_loader.get_module_import_path(module_name)
+
+    try:
+        module = importlib.import_module(import_path + '.privileged')
+    except ModuleNotFoundError as exception:
+        raise SyntaxError('Specified module not found') from exception
+
+    try:
+        action = getattr(module, action_name)
+    except AttributeError as exception:
+        raise SyntaxError('Specified action not found') from exception
+
+    if not getattr(action, '_privileged', None):
+        raise SyntaxError('Specified action is not privileged action')
+
+    return getattr(action, '__wrapped__')
+
+
+def _run_privileged_action(func, arguments):
+    """Run an action and return its serializable return value."""
+    try:
+        return_values = func(*arguments['args'], **arguments['kwargs'])
+        return_value = {'result': 'success', 'return': return_values}
+    except Exception as exception:
+        logger.exception('Error executing action: %s', exception)
+        return_value = {
+            'result': 'exception',
+            'exception': {
+                'module': type(exception).__module__,
+                'name': type(exception).__name__,
+                'args': exception.args,
+                'traceback': traceback.format_tb(exception.__traceback__)
+            }
+        }
+
+    return return_value
+
+
+def _assert_valid_arguments(func, arguments):
+    """Check the names, types and completeness of the arguments passed."""
+    # Check if arguments match types
+    if not isinstance(arguments, dict):
+        raise SyntaxError('Invalid arguments format')
+
+    if 'args' not in arguments or 'kwargs' not in arguments:
+        raise SyntaxError('Invalid arguments format')
+
+    args = arguments['args']
+    kwargs = arguments['kwargs']
+    if not isinstance(args, list) or not isinstance(kwargs, dict):
+        raise SyntaxError('Invalid arguments format')
+
+    argspec = inspect.getfullargspec(func)
+    if len(args) + len(kwargs) > len(argspec.args):
+        raise SyntaxError('Too many arguments')
+
+    no_defaults = len(argspec.args)
+    if argspec.defaults:
+        no_defaults -= len(argspec.defaults)
+
+    for key in argspec.args[len(args):no_defaults]:
+        if key not in kwargs:
+            raise SyntaxError(f'Argument not provided: {key}')
+
+    for key, value in kwargs.items():
+        if key not in argspec.args:
+            raise SyntaxError(f'Unknown argument: {key}')
+
+        if argspec.args.index(key) < len(args):
+            raise SyntaxError(f'Duplicate argument: {key}')
+
+        _assert_valid_type(f'arg {key}', value, argspec.annotations[key])
+
+    for index, arg in enumerate(args):
+        annotation = argspec.annotations[argspec.args[index]]
+        _assert_valid_type(f'arg #{index}', arg, annotation)
+
+
+def _assert_valid_type(arg_name, value, annotation):
+    """Assert that the type of argument value matches the annotation."""
+    if annotation == typing.Any:
+        return
+
+    NoneType = type(None)
+    if annotation == NoneType:
+        if value is not None:
+            raise TypeError('Expected None for {arg_name}')
+
+        return
+
+    basic_types = {bool, int, str, float}
+    if annotation in basic_types:
+        if not isinstance(value, annotation):
+            raise TypeError(
+                f'Expected type {annotation.__name__} for {arg_name}')
+
+        return
+
+    # 'int | str' or 'typing.Union[int, str]'
+    if (isinstance(annotation, types.UnionType)
+            or getattr(annotation, '__origin__', None) == typing.Union):
+        for arg in annotation.__args__:
+            try:
+                _assert_valid_type(arg_name, value, arg)
+                return
+            except TypeError:
+                pass
+
+        raise TypeError(f'Expected one of unioned types for {arg_name}')
+
+    # 'list[int]' or 'typing.List[int]'
+    if getattr(annotation, '__origin__', None) == list:
+        if not isinstance(value, list):
+            raise TypeError(f'Expected type list for {arg_name}')
+
+        for index, inner_item in enumerate(value):
+            _assert_valid_type(f'{arg_name}[{index}]', inner_item,
+                               annotation.__args__[0])
+
+        return
+
+    # 'list[dict]' or 'typing.List[dict]'
+    if getattr(annotation, '__origin__', None) == dict:
+        if not isinstance(value, dict):
+            raise TypeError(f'Expected type dict for {arg_name}')
+
+        for inner_key, inner_value in value.items():
+            _assert_valid_type(f'{arg_name}[{inner_key}]', inner_key,
+                               annotation.__args__[0])
+            _assert_valid_type(f'{arg_name}[{inner_value}]', inner_value,
+                               annotation.__args__[1])
+
+        return
+
+    raise TypeError('Unsupported annotation type')
@@ -7,6 +7,7 @@ import collections
 import enum
 import inspect
 import logging
+import threading
 from typing import ClassVar
 
 from plinth import cfg
@@ -51,6 +52,12 @@ class App:
     _all_apps: ClassVar[collections.OrderedDict[
         str, 'App']] = collections.OrderedDict()
 
+    _setup_versions: ClassVar[dict[str, int] | None] = None
+
+    _setup_versions_generation: ClassVar[int] = 0
+
+    _setup_versions_lock: ClassVar[threading.Lock] = threading.Lock()
+
     class SetupState(enum.Enum):
         """Various states of app being setup."""
 
@@ -131,8 +138,18 @@ class App:
         """
         return self.get_component(self.app_id + '-info')
 
+    def pre_install(self, old_version):
+        """Run steps needed before the packages of the app are installed.
+
+        For example, preseed answers to questions asked when installing the
+        packages. This is run at the start of setup(). When packages of
+        multiple apps are installed together, this is also run before that, so
+        it must be safe to run more than once.
+        """
+
     def setup(self, old_version):
         """Install and configure the app and its components."""
+        self.pre_install(old_version)
         for component in self.components.values():
             component.setup(old_version=old_version)
 
@@ -153,16 +170,16 @@ class App:
         return self.SetupState.NEEDS_UPDATE
 
     def get_setup_version(self) -> int:
-        """Return the setup version of the app."""
-        # XXX: Optimize version gets
-        from . import models
+        """Return the setup version of the app.
 
-        try:
-            with db.lock:
-                app_entry = models.Module.objects.get(pk=self.app_id)
-                return app_entry.setup_version
-        except models.Module.DoesNotExist:
-            return 0
+        Setup versions of all apps are read from the database once and then
+        served from memory.
+        """
+        setup_versions = App._setup_versions
+        if setup_versions is None:
+            setup_versions = App._load_setup_versions()
+
+        return setup_versions.get(self.app_id, 0)
 
     def needs_setup(self) -> bool:
         """Return whether the app needs to be setup.
@@ -171,6 +188,7 @@ class App:
         """
         return self.get_setup_state() == self.SetupState.NEEDS_SETUP
 
+    @db.retry_if_busy
     def set_setup_version(self, version: int) -> None:
         """Set the app's setup version."""
         from . import models
@@ -178,6 +196,33 @@ class App:
         with db.lock:
             models.Module.objects.update_or_create(
                 pk=self.app_id, defaults={'setup_version': version})
+            App.clear_setup_versions()
+
+    @classmethod
+    def _load_setup_versions(cls) -> dict[str, int]:
+        """Read the setup versions of all apps from the database.
+
+        The database is read without taking the database lock. If the cache
+        is invalidated by a write during the read, the values read are
+        returned but not cached.
+        """
+        from . import models
+
+        generation = App._setup_versions_generation
+        setup_versions = dict(
+            models.Module.objects.values_list('name', 'setup_version'))
+        with App._setup_versions_lock:
+            if generation == App._setup_versions_generation:
+                App._setup_versions = setup_versions
+
+        return setup_versions
+
+    @classmethod
+    def clear_setup_versions(cls) -> None:
+        """Invalidate the in-memory cache of setup versions of all apps."""
+        with App._setup_versions_lock:
+            App._setup_versions_generation += 1
+            App._setup_versions = None
 
     def enable(self):
         """Enable all the components of the app."""
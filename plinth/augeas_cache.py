@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Shared access to configuration files parsed with Augeas.
+
+Parsing a configuration file with an Augeas lens is slow, especially on single
+board computers, and many pages read the same files repeatedly. An Augeas
+instance is kept for each lens and file with the file's tree loaded. The file
+is parsed again only when it has changed on disk since it was last loaded or
+saved.
+
+Augeas instances must not be used by multiple threads at the same time. So,
+trees are only accessed inside the context managers read() and edit(), which
+hold a lock on the tree. This module may be used in the web interface process
+and in privileged action processes.
+"""
+
+import contextlib
+import os
+import threading
+
+import augeas
+
+_trees: dict[tuple[str, str], '_Tree'] = {}
+_trees_lock = threading.Lock()
+
+
+class _Tree:
+    """An Augeas instance with the tree of a single file loaded."""
+
+    def __init__(self, lens, path):
+        """Create the Augeas instance without loading the file yet."""
+        self.path = path
+        self.lock = threading.Lock()
+        self.file_state = None
+        self.is_loaded = False
+        self.aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
+                                 augeas.Augeas.NO_MODL_AUTOLOAD)
+        self.aug.set(f'/augeas/load/{lens}/lens', f'{lens}.lns')
+        self.aug.set(f'/augeas/load/{lens}/incl[last() + 1]', path)
+        self.aug.set('/augeas/context', '/files' + path)
+
+    def load_if_changed(self):
+        """Load the file if it is not loaded or has changed on disk."""
+        file_state = _get_file_state(self.path)
+        if self.is_loaded and file_state == self.file_state:
+            return
+
+        # Also discards any changes in the tree that were not saved
+        self.aug.load()
+        self.file_state = file_state
+        self.is_loaded = True
+
+
+def _get_file_state(path):
+    """Return values that change when a file is modified or replaced."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _get_tree(lens, path):
+    """Return the shared tree for a lens and file, creating if necessary."""
+    path = str(path)
+    with _trees_lock:
+        try:
+            return _trees[(lens, path)]
+        except KeyError:
+            tree = _Tree(lens, path)
+            _trees[(lens, path)] = tree
+            return tree
+
+
+@contextlib.contextmanager
+def read(lens, path):
+    """Return an Augeas instance with the tree of a file loaded for reading.
+
+    'lens' is the name of an Augeas module such as 'Sshd' whose lens is used to
+    parse the file. Paths relative to the file's tree, such as
+    'PasswordAuthentication', may be used as the Augeas context is set to the
+    file. The tree must not be changed, use edit() for that.
+    """
+    tree = _get_tree(lens, path)
+    with tree.lock:
+        tree.load_if_changed()
+        yield tree.aug
+
+
+@contextlib.contextmanager
+def edit(lens, path):
+    """Return an Augeas instance to change a file and save all changes once.
+
+    Changes are saved to the file when the context exits without an
+    exception. Otherwise, changes are discarded.
+    """
+    tree = _get_tree(lens, path)
+    with tree.lock:
+        tree.load_if_changed()
+        try:
+            yield tree.aug
+            tree.aug.save()
+        except BaseException:
+            tree.is_loaded = False
+            raise
+
+        tree.file_state = _get_file_state(tree.path)
+
+
+def clear():
+    """Forget all the loaded trees."""
+    with _trees_lock:
+        _trees.clear()
@@ -1,13 +1,14 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Component for managing a background daemon or any systemd unit."""
 
+import pathlib
 import socket
+import struct
 import subprocess
 
-import psutil
 from django.utils.translation import gettext_noop
 
-from plinth import action_utils, app
+from plinth import action_utils, actions, app, utils
 
 
 class Daemon(app.LeaderComponent):
@@ -67,16 +68,18 @@ class Daemon(app.LeaderComponent):
     def enable(self):
         """Run operations to enable the daemon/unit."""
         from plinth.privileged import service as service_privileged
-        service_privileged.enable(self.unit)
-        if self.alias:
-            service_privileged.enable(self.alias)
+        with actions.batch():
+            service_privileged.enable(self.unit)
+            if self.alias:
+                service_privileged.enable(self.alias)
 
     def disable(self):
         """Run operations to disable the daemon/unit."""
         from plinth.privileged import service as service_privileged
-        service_privileged.disable(self.unit)
-        if self.alias:
-            service_privileged.disable(self.alias)
+        with actions.batch():
+            service_privileged.disable(self.unit)
+            if self.alias:
+                service_privileged.disable(self.alias)
 
     def is_running(self):
         """Return whether the daemon/unit is running."""
@@ -144,17 +147,116 @@ def app_is_running(app_):
     return True
 
 
+class ListeningSockets:
+    """Index of the TCP and UDP sockets listening on the system.
+
+    Sockets are read from /proc/net/{tcp,tcp6,udp,udp6}. Unlike listing
+    connections with psutil, this does not require scanning the file
+    descriptors of all the processes.
+    """
+
+    PROC_NET_PATH = pathlib.Path('/proc/net')
+
+    PROTOCOLS = {
+        'tcp': ('tcp', 'tcp6'),
+        'tcp4': ('tcp', 'tcp6'),
+        'tcp6': ('tcp6', ),
+        'udp': ('udp', 'udp6'),
+        'udp4': ('udp', 'udp6'),
+        'udp6': ('udp6', ),
+    }
+
+    TCP_LISTEN = '0A'
+
+    def __init__(self):
+        """Read the sockets currently listening."""
+        # (protocol, port, address) -> inode of the socket
+        self.sockets = {}
+        self.ports = set()
+        for protocol in ('tcp', 'tcp6', 'udp', 'udp6'):
+            path = self.PROC_NET_PATH / protocol
+            try:
+                lines = path.read_text().splitlines()
+            except FileNotFoundError:
+                continue
+
+            for line in lines[1:]:
+                self._add_socket(protocol, line.split())
+
+    def _add_socket(self, protocol, fields):
+        """Add a socket from a line in /proc/net/* if it is listening."""
+        local_address, remote_address, state = fields[1:4]
+        if protocol.startswith('tcp'):
+            # TCP sockets must be in listen state
+            if state != self.TCP_LISTEN:
+                return
+        elif set(remote_address) != {'0', ':'}:
+            # UDP sockets must not be connected to a remote address
+            return
+
+        address, port = local_address.split(':')
+        address = self._parse_address(protocol, address)
+        port = int(port, 16)
+        self.sockets[(protocol, port, address)] = int(fields[9])
+        self.ports.add((protocol, port))
+
+    @staticmethod
+    def _parse_address(protocol, address):
+        """Return IP address from hexadecimal format used in /proc/net/*.
+
+        Address is printed as a sequence of 32-bit words in host byte order.
+        """
+        words = [int(address[index:index + 8], 16)
+                 for index in range(0, len(address), 8)]
+        packed = struct.pack(f'={len(words)}I', *words)
+        family = socket.AF_INET6 if protocol.endswith('6') else socket.AF_INET
+        return socket.inet_ntop(family, packed)
+
+    def is_listening(self, port, kind='tcp', listen_address=None):
+        """Return whether a port is being listened on."""
+        for protocol in self.PROTOCOLS[kind]:
+            if listen_address:
+                is_listening = (protocol, port, listen_address) in self.sockets
+            else:
+                is_listening = (protocol, port) in self.ports
+
+            if not is_listening:
+                continue
+
+            # Special additional checks only for IPv4
+            if kind not in ('tcp4', 'udp4') or not protocol.endswith('6'):
+                return True
+
+            # Full IPv6 address range includes mapped IPv4 address also
+            if (protocol, port, '::') in self.sockets and \
+               listen_address in (None, '::'):
+                return True
+
+        return False
+
+
+_listening_sockets = utils.SharedSnapshot(ListeningSockets)
+
+
+def listening_sockets_snapshot():
+    """Share one index of listening sockets among all the checks within.
+
+    Use this when running many port listening diagnostics together, such as
+    when diagnosing all apps. The index is read when it is first needed.
+    """
+    return _listening_sockets.shared()
+
+
 def diagnose_port_listening(port, kind='tcp', listen_address=None):
     """Run a diagnostic on whether a port is being listened on.
 
-    Kind must be one of inet, inet4, inet6, tcp, tcp4, tcp6, udp,
-    udp4, udp6, unix, all.  See psutil.net_connection() for more
-    information.
+    Kind must be one of tcp, tcp4, tcp6, udp, udp4, udp6. See
+    :py:func:`listening_sockets_snapshot` for checking many ports.
 
     """
     from plinth.modules.diagnostics.check import DiagnosticCheck, Result
 
-    result = _check_port(port, kind, listen_address)
+    result = _listening_sockets.get().is_listening(port, kind, listen_address)
 
     parameters = {'kind': kind, 'port': port}
     if listen_address:
@@ -171,50 +273,6 @@ def diagnose_port_listening(port, kind='tcp', listen_address=None):
                            parameters)
 
 
-def _check_port(port, kind='tcp', listen_address=None):
-    """Return whether a port is being listened on."""
-    run_kind = kind
-
-    if kind == 'tcp4':
-        run_kind = 'tcp'
-
-    if kind == 'udp4':
-        run_kind = 'udp'
-
-    for connection in psutil.net_connections(run_kind):
-        # TCP connections must have status='listen'
-        if kind in ('tcp', 'tcp4', 'tcp6') and \
-           connection.status != psutil.CONN_LISTEN:
-            continue
-
-        # UDP connections must have empty remote address
-        if kind in ('udp', 'udp4', 'udp6') and \
-           connection.raddr != ():
-            continue
-
-        # Port should match
-        if connection.laddr[1] != port:
-            continue
-
-        # Listen address if requested should match
-        if listen_address and connection.laddr[0] != listen_address:
-            continue
-
-        # Special additional checks only for IPv4
-        if kind not in ('tcp4', 'udp4'):
-            return True
-
-        # Found socket is IPv4
-        if connection.family == socket.AF_INET:
-            return True
-
-        # Full IPv6 address range includes mapped IPv4 address also
-        if connection.laddr[0] == '::':
-            return True
-
-    return False
-
-
 def diagnose_netcat(host, port, input='', negate=False):
     """Run a diagnostic using netcat."""
     from plinth.modules.diagnostics.check import DiagnosticCheck, Result
@@ -3,19 +3,36 @@
 Common utilities to help with handling a database.
 """
 
+import functools
+import logging
 import threading
+import time
 from typing import ClassVar
 
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
 
 class DBLock:
-    """A re-entrant lock with a fixed timeout (not -1) by default."""
+    """A re-entrant lock with a fixed timeout (not -1) by default.
+
+    Time spent waiting to acquire the lock is recorded so that contention can
+    be reported.
+    """
 
     TIMEOUT: ClassVar[float] = 30
 
+    WARN_WAIT_TIME: ClassVar[float] = 1
+
     def __init__(self, *args, **kwargs):
         """Create an RLock object."""
         self._lock = threading.RLock(*args, **kwargs)
         self.timeout = DBLock.TIMEOUT
+        self.acquire_count = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
 
     def __getattr__(self, name):
         """Return RLock attributes."""
@@ -23,7 +40,10 @@ class DBLock:
 
     def __enter__(self):
         """Use RLock context management."""
-        return self._lock.acquire(timeout=self.timeout)
+        start_time = time.monotonic()
+        acquired = self._lock.acquire(timeout=self.timeout)
+        self._record_wait(time.monotonic() - start_time, acquired)
+        return acquired
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Use RLock context management."""
@@ -33,6 +53,25 @@ class DBLock:
             # Lock was not acquired
             pass
 
+    def _record_wait(self, wait_time, acquired):
+        """Update wait time statistics and log long waits."""
+        self.acquire_count += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        if not acquired:
+            logger.warning('Database lock not acquired after %.2fs',
+                           wait_time)
+        elif wait_time >= self.WARN_WAIT_TIME:
+            logger.warning('Waited %.2fs for database lock', wait_time)
+
+    def get_statistics(self):
+        """Return the wait time statistics of the lock."""
+        return {
+            'acquire_count': self.acquire_count,
+            'total_wait_time': self.total_wait_time,
+            'max_wait_time': self.max_wait_time,
+        }
+
 
 # The Problem
 # -----------
@@ -46,40 +85,94 @@ class DBLock:
 # The 'timeout' value passed during connection creation means that queries will
 # wait for a maximum of given timeout period when trying to acquire locks.
 # However, in some cases, to prevent deadlocks caused by threads waiting on
-# each other, sqlite3 will not wait and immediately throw an exception.
-#
-# If we set the isolation level to 'EXCLUSIVE' or 'IMMEDIATE' instead of the
-# default 'DEFERRED', each transaction should acquire a write lock immediately
-# after transaction is started. This reduces the situations in which threads
-# deadlock on each other. This improves the situation somewhat. However, this
-# is still causing immediate timeout errors due to the way Django does its
-# update_or_create() queries.
+# each other, sqlite3 will not wait and immediately throw an exception. This
+# happens when a transaction that started as a read transaction tries to
+# upgrade itself into a write transaction while another connection is writing.
 #
-# This is true even in 'WAL' (write-ahead-log) journaling mode. While WAL mode
-# makes it easier to have many read transactions while one write query is
-# happening, it does not prevent this situation.
+# Approach
+# --------
+# The database is switched to 'WAL' (write-ahead-log) journaling mode when a
+# connection is created. In this mode, readers don't block the writer and the
+# writer doesn't block readers. So, read queries are made without any locking.
 #
-# Django should ideally provide a way to serialize these queries specifically
-# to work with sqlite3 locking behavior. There seems to be no such way
-# currently.
-#
-# Workaround
-# ----------
-# To workaround the problem, use a simple lock to serialize all database
-# queries. Like this:
+# Writes are serialized within the process using a simple lock. Like this:
 #
 # with db.lock:
-#     # do some short database operation
+#     # do some short database write operation
+#
+# As only one thread writes at a time, transactions never wait on each other
+# to upgrade into write transactions, which was the cause of the immediate
+# failures. This is the same guarantee that 'BEGIN IMMEDIATE' transactions
+# provide. On Django versions that support it, transactions are also started
+# with 'BEGIN IMMEDIATE' to cover writes made by other processes and by the
+# Django framework itself.
 #
-# Queries usually have short execution time (unless stuck on disk I/O). A lot
-# of parallel request processing is not expected from this service. We want
-# more reliability (not failing on DB locks) over the ability to run parallel
-# requests. Typically, requests waiting to perform DB queries will only have to
-# wait < 1 second to get their turn. In the worst case, the database lock will
-# not be acquired and the code continues to anyway.
+# If a write still fails because the database is busy, functions decorated
+# with @db.retry_if_busy are retried a few times with increasing delay.
 #
-# This locking can't be done in all situations. For example, queries made
-# within Django framework are not locked. Still, this approach should prevent
-# most of the significant cases where we have seen database lock issues.
+# Time spent waiting for the lock is recorded and long waits are logged. In the
+# worst case, the database lock will not be acquired and the code continues to
+# anyway.
 
 lock = DBLock()
+
+RETRY_ATTEMPTS = 5
+
+RETRY_INITIAL_DELAY = 0.05
+
+
+def _is_busy_error(exception):
+    """Return whether an exception is due to database being locked."""
+    message = str(exception).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_if_busy(function):
+    """Retry a write operation with backoff if the database is busy.
+
+    Retrying is not possible inside a transaction started by the caller as
+    the transaction has to be rolled back entirely. Errors are raised
+    immediately in that case.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        from django.db import OperationalError, connection
+
+        delay = RETRY_INITIAL_DELAY
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            try:
+                return function(*args, **kwargs)
+            except OperationalError as exception:
+                if (not _is_busy_error(exception) or attempt == RETRY_ATTEMPTS
+                        or connection.in_atomic_block):
+                    raise
+
+                logger.warning('Database busy, retrying in %.2fs: %s', delay,
+                               exception)
+                time.sleep(delay)
+                delay *= 2
+
+    return wrapper
+
+
+def get_database_options(django_version):
+    """Return extra options for the database connection.
+
+    Start transactions with 'BEGIN IMMEDIATE' where Django supports it.
+    """
+    if django_version >= (5, 1):
+        return {'transaction_mode': 'IMMEDIATE'}
+
+    return {}
+
+
+@receiver(connection_created)
+def _on_connection_created(sender, connection, **kwargs):
+    """Switch sqlite3 database connections to WAL mode."""
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
@@ -1,6 +1,6 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """
-Expose some API over D-Bus.
+Expose some API over D-Bus and provide shared access to other D-Bus services.
 """
 
 import logging
@@ -8,14 +8,17 @@ import threading
 
 from plinth.utils import import_from_gi
 
-from . import setup
-
 gio = import_from_gi('Gio', '2.0')
+glib = import_from_gi('GLib', '2.0')
 
 logger = logging.getLogger(__name__)
 
 _server = None
 
+_proxies = {}
+_watched_names = set()
+_proxies_lock = threading.Lock()
+
 
 class PackageHandler():
     """D-Bus service to listen for messages when apt cache is updated."""
@@ -58,6 +61,8 @@ class PackageHandler():
         """Called when system package cache is updated."""
         logger.info('Apt package cache updated.')
 
+        from plinth import setup
+
         # Run in a new thread because we don't want to block the thread running
         # Glib main loop.
         threading.Thread(target=setup.on_package_cache_updated).start()
@@ -114,3 +119,97 @@ def init():
     global _server
     _server = DBusServer()
     _server.connect()
+
+
+def get_connection():
+    """Return the shared connection to the system bus."""
+    return gio.bus_get_sync(gio.BusType.SYSTEM, None)
+
+
+def get_proxy(name, object_path, interface):
+    """Return a proxy for an object on the system bus.
+
+    Creating a proxy requires a round-trip to the service to retrieve the
+    properties of the object. So, proxies are created once and reused. All the
+    proxies for a service are dropped when the service exits or restarts.
+
+    """
+    key = (name, object_path, interface)
+    with _proxies_lock:
+        proxy = _proxies.get(key)
+        if proxy:
+            return proxy
+
+    connection = get_connection()
+    proxy = gio.DBusProxy.new_sync(connection, gio.DBusProxyFlags.NONE, None,
+                                   name, object_path, interface)
+    with _proxies_lock:
+        if name not in _watched_names:
+            _watched_names.add(name)
+            connection.signal_subscribe('org.freedesktop.DBus',
+                                        'org.freedesktop.DBus',
+                                        'NameOwnerChanged',
+                                        '/org/freedesktop/DBus', name,
+                                        gio.DBusSignalFlags.NONE,
+                                        _on_name_owner_changed)
+
+        return _proxies.setdefault(key, proxy)
+
+
+def invalidate_proxies(name, object_path=None):
+    """Drop proxies for a service, or one of its objects, if they are cached.
+
+    Proxies are created again when they are needed next.
+    """
+    with _proxies_lock:
+        for key in list(_proxies):
+            if key[0] == name and object_path in (None, key[1]):
+                del _proxies[key]
+
+
+def _on_name_owner_changed(_connection, _sender, _object_path, _interface,
+                           _signal, parameters):
+    """Drop proxies of a service when it exits or restarts."""
+    name, _old_owner, _new_owner = parameters.unpack()
+    logger.debug('D-Bus service owner changed: %s', name)
+    invalidate_proxies(name)
+
+
+def call_many(calls, timeout=-1):
+    """Make many method calls at once and wait for all of them to finish.
+
+    Each call is a tuple of (name, object path, interface, method, parameters)
+    where parameters is a GLib.Variant or None. Calls are sent without waiting
+    for replies to earlier calls, so all of them together take about as long
+    as a single call. Return a list with the unpacked result of each call or
+    the glib.Error raised by it.
+
+    """
+    results = [None] * len(calls)
+    pending = set(range(len(calls)))
+    connection = get_connection()
+    context = glib.MainContext.new()
+
+    def _on_reply(connection, result, index):
+        try:
+            results[index] = connection.call_finish(result).unpack()
+        except glib.Error as exception:
+            results[index] = exception
+
+        pending.discard(index)
+
+    # Replies are dispatched to the thread-default main context of the caller
+    context.push_thread_default()
+    try:
+        for index, (name, object_path, interface, method,
+                    parameters) in enumerate(calls):
+            connection.call(name, object_path, interface, method, parameters,
+                            None, gio.DBusCallFlags.NONE, timeout, None,
+                            _on_reply, index)
+
+        while pending:
+            context.iteration(True)
+    finally:
+        context.pop_thread_default()
+
+    return results
@@ -25,3 +25,7 @@ class MissingPackageError(PlinthError):
     def __init__(self, name):
         self.name = name
         super().__init__(self.name)
+
+
+class ActionNotRunError(PlinthError):
+    """A privileged action in a batch was not run as an earlier one failed."""
@@ -0,0 +1,56 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Notify web pages about changes to operations and notifications.
+
+Pages showing the progress of an operation used to reload themselves every few
+seconds. Instead, they now make a long-poll request to the events view with the
+version of the state they were rendered with. The request returns as soon as
+the version changes or after a timeout. Pages then update the progress in
+place.
+
+Each waiting request occupies a web server thread. Number of waiting requests
+is limited so that the server remains responsive for other requests. Requests
+beyond the limit return immediately and the page retries after a delay.
+"""
+
+import threading
+from typing import ClassVar
+
+
+class EventStream:
+    """A version counter that can be waited on for changes."""
+
+    MAX_WAITERS: ClassVar[int] = 4
+
+    def __init__(self) -> None:
+        """Initialize the stream."""
+        self.version = 0
+        self._waiters = 0
+        self._condition = threading.Condition()
+
+    def notify(self) -> None:
+        """Signal a change to all the waiting requests."""
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Wait until version changes from the given one or timeout happens.
+
+        Return the current version.
+        """
+        with self._condition:
+            if self.version != version or self._waiters >= self.MAX_WAITERS:
+                return self.version
+
+            self._waiters += 1
+            try:
+                self._condition.wait_for(lambda: self.version != version,
+                                         timeout)
+            finally:
+                self._waiters -= 1
+
+            return self.version
+
+
+stream = EventStream()
@@ -7,7 +7,7 @@ import pathlib
 from typing import ClassVar
 
 from plinth import app, cfg
-from plinth.modules.users import privileged as users_privileged
+from plinth.modules import users
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +17,10 @@ class Shortcut(app.FollowerComponent):
 
     _all_shortcuts: ClassVar[dict[str, 'Shortcut']] = {}
 
+    # Shortcuts shown to users of each set of groups
+    _shortcuts_for_groups: ClassVar[dict[frozenset[str],
+                                         dict[str, 'Shortcut']]] = {}
+
     def __init__(self, component_id, name, short_description=None, icon=None,
                  url=None, description=None, manual_page=None,
                  configure_url=None, clients=None, login_required=False,
@@ -88,10 +92,12 @@ class Shortcut(app.FollowerComponent):
         self.allowed_groups = set(allowed_groups) if allowed_groups else None
 
         self._all_shortcuts[self.component_id] = self
+        self._shortcuts_for_groups.clear()
 
     def remove(self):
         """Remove this shortcut from global list of shortcuts."""
         del self._all_shortcuts[self.component_id]
+        self._shortcuts_for_groups.clear()
 
     @classmethod
     def list(cls, username=None, web_apps_only=False, sort_by='name'):
@@ -113,12 +119,16 @@ class Shortcut(app.FollowerComponent):
         if not username:
             return cls._all_shortcuts
 
-        # XXX: Turn this into an API call in users module and cache
-        user_groups = set(users_privileged.get_user_groups(username))
+        user_groups = frozenset(users.get_user_groups(username))
 
         if 'admin' in user_groups:  # Admin has access to all services
             return cls._all_shortcuts
 
+        try:
+            return cls._shortcuts_for_groups[user_groups]
+        except KeyError:
+            pass
+
         shortcuts = {}
         for shortcut_id, shortcut in cls._all_shortcuts.items():
             if shortcut.login_required and shortcut.allowed_groups and \
@@ -127,6 +137,7 @@ class Shortcut(app.FollowerComponent):
 
             shortcuts[shortcut_id] = shortcut
 
+        cls._shortcuts_for_groups[user_groups] = shortcuts
         return shortcuts
 
 
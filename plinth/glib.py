@@ -7,7 +7,7 @@ import logging
 import random
 import threading
 
-from plinth import dbus, network
+from plinth import dbus, network, unit_state
 from plinth.utils import import_from_gi
 
 from . import cfg
@@ -41,6 +41,7 @@ def _run():
     # Initialize all modules that use glib main loop
     dbus.init()
     network.init()
+    unit_state.init()
 
     global _main_loop
     _main_loop = glib.MainLoop()
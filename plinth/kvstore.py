@@ -1,43 +1,163 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """
 Simple key/value store using Django models
+
+Values are cached in memory after they are read or written for the first
+time. All writes go through this module, so the cache is updated along with
+the database (write-through) and repeated reads don't query the database.
+Reads are not serialized with writes. A value read from the database is only
+cached if a concurrent write has not already cached a newer value.
+Values are cached in their serialized form so that callers modifying a
+returned value do not modify the cached value.
+
+Inside a transaction, values may not have been committed yet. So, values read
+inside a transaction are not cached and written values are cached only after
+the transaction is committed. Until then, written keys are dropped from the
+cache.
 """
 
 from . import db
+from .signals import kvstore_changed
+
+_MISSING = object()
+
+_cache = {}
 
 
 def get(key):
     """Return the value of a key"""
     from plinth.models import KVStore
 
-    with db.lock:
-        # pylint: disable-msg=E1101
-        return KVStore.objects.get(pk=key).value
+    value_json = _cache.get(key)
+    if value_json is None:
+        try:
+            # pylint: disable-msg=E1101
+            value_json = KVStore.objects.get(pk=key).value_json
+        except KVStore.DoesNotExist:
+            value_json = _MISSING
+
+        if not _is_in_transaction():
+            # A concurrent write may have cached a newer value after the read
+            value_json = _cache.setdefault(key, value_json)
+
+    if value_json is _MISSING:
+        raise KVStore.DoesNotExist(f'Key not found: {key}')
+
+    return KVStore(key=key, value_json=value_json).value
 
 
 def get_default(key, default_value):
     """Return the value of the key if key exists else return default_value"""
-    with db.lock:
-        try:
-            return get(key)
-        except Exception:
-            return default_value
+    try:
+        return get(key)
+    except Exception:
+        return default_value
+
+
+def get_many(keys, default_value=None):
+    """Return a dictionary with values of the given keys.
+
+    Keys that are not cached are retrieved with a single query. Missing keys
+    get the default_value.
+    """
+    from plinth.models import KVStore
+
+    cached = {key: _cache[key] for key in keys if key in _cache}
+    keys_to_read = [key for key in keys if key not in cached]
+    if keys_to_read:
+        # pylint: disable-msg=E1101
+        stores = KVStore.objects.filter(pk__in=keys_to_read)
+        values = {store.key: store.value_json for store in stores}
+        in_transaction = _is_in_transaction()
+        for key in keys_to_read:
+            value_json = values.get(key, _MISSING)
+            if not in_transaction:
+                value_json = _cache.setdefault(key, value_json)
+
+            cached[key] = value_json
+
+    values = {}
+    for key in keys:
+        value_json = cached[key]
+        if value_json is _MISSING:
+            values[key] = default_value
+        else:
+            values[key] = KVStore(key=key, value_json=value_json).value
+
+    return values
 
 
 def set(key, value):  # pylint: disable-msg=W0622
     """Store the value of a key"""
+    set_many({key: value})
+
+
+@db.retry_if_busy
+def set_many(values):
+    """Store the values of multiple keys in a single transaction."""
+    from django.db import transaction
+
     from plinth.models import KVStore
+
+    if not values:
+        return
+
+    stores = [KVStore(key=key, value=value) for key, value in values.items()]
     with db.lock:
-        store = KVStore(key=key, value=value)
-        store.save()
+        with transaction.atomic():
+            for store in stores:
+                store.save()
+
+            values_json = {store.key: store.value_json for store in stores}
+            _update_cache_on_commit(values_json)
 
+    kvstore_changed.send_robust(sender='kvstore', keys=list(values.keys()))
 
+
+@db.retry_if_busy
 def delete(key, ignore_missing=False):
     """Delete a key"""
+    from django.db import transaction
+
     from plinth.models import KVStore
-    with db.lock:
+    with db.lock, transaction.atomic():
         try:
-            return KVStore.objects.get(key=key).delete()
+            return_value = KVStore.objects.get(key=key).delete()
         except KVStore.DoesNotExist:
             if not ignore_missing:
                 raise
+
+            return None
+        finally:
+            _update_cache_on_commit({key: _MISSING})
+
+    kvstore_changed.send_robust(sender='kvstore', keys=[key])
+    return return_value
+
+
+def _is_in_transaction():
+    """Return whether the current thread is inside a transaction."""
+    from django.db import transaction
+    return transaction.get_connection().in_atomic_block
+
+
+def _update_cache_on_commit(values_json):
+    """Cache the written values when the current transaction is committed.
+
+    Must be called inside a transaction. If it is rolled back, the keys are
+    read from the database again.
+    """
+    from django.db import transaction
+
+    for key in values_json:
+        _cache.pop(key, None)
+
+    transaction.on_commit(lambda: _cache.update(values_json))
+
+
+def clear_cache():
+    """Forget all the cached values.
+
+    Useful when the database has been modified without using this module.
+    """
+    _cache.clear()
@@ -21,6 +21,7 @@ from plinth import app as app_module
 from plinth import setup
 from plinth.utils import is_user_admin
 
+from . import events
 from . import operation as operation_module
 from . import views
 
@@ -112,7 +113,12 @@ class FirstSetupMiddleware(MiddlewareMixin):
         if not setup.is_first_setup_running:
             return
 
+        # Allow the progress page to wait for first setup to complete
+        if view_func == views.events:
+            return
+
         context = {
+            'events_version': events.stream.version,
             'is_first_setup_running': setup.is_first_setup_running,
             'refresh_page_sec': 3
         }
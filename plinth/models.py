@@ -36,6 +36,13 @@ class Module(models.Model):
     setup_version = models.IntegerField()
 
 
+@receiver(models.signals.post_delete, sender=Module)
+def _on_module_post_delete(sender, instance, **kwargs):
+    """When a module's setup version is deleted, drop cached versions."""
+    from plinth.app import App
+    App.clear_setup_versions()
+
+
 class UserProfile(models.Model):
     """Model to store user profile details that are not auth related."""
     user = models.OneToOneField(settings.AUTH_USER_MODEL,
@@ -1,16 +1,29 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """App component for other apps to use Apache configuration functionality."""
 
+import contextlib
 import re
 import subprocess
+import threading
+from concurrent import futures
 
 from django.utils.translation import gettext_noop
 
-from plinth import action_utils, app
+from plinth import action_utils, app, utils
 from plinth.modules.diagnostics.check import DiagnosticCheck, Result
 from plinth.privileged import service as service_privileged
 
-from . import privileged
+from . import privileged, probe
+
+# Number of URLs checked at the same time by diagnose_url_on_all()
+MAX_PARALLEL_CHECKS = 8
+
+_addresses = utils.SharedSnapshot(lambda: action_utils.get_addresses())
+
+
+# Apache and uWSGI configuration is shared by all apps. Apps that are set up
+# in parallel change it and restart the services one at a time.
+_webserver_lock = threading.RLock()
 
 
 class Webserver(app.LeaderComponent):
@@ -52,11 +65,13 @@ class Webserver(app.LeaderComponent):
 
     def enable(self):
         """Enable the Apache configuration."""
-        privileged.enable(self.web_name, self.kind)
+        with _webserver_lock:
+            privileged.enable(self.web_name, self.kind)
 
     def disable(self):
         """Disable the Apache configuration."""
-        privileged.disable(self.web_name, self.kind)
+        with _webserver_lock:
+            privileged.disable(self.web_name, self.kind)
 
     def diagnose(self):
         """Check if the web path is accessible by clients.
@@ -93,10 +108,11 @@ class Webserver(app.LeaderComponent):
             # when the app is enabled.
             return
 
-        if self.kind == 'module':
-            service_privileged.restart('apache2')
-        else:
-            service_privileged.reload('apache2')
+        with _webserver_lock:
+            if self.kind == 'module':
+                service_privileged.restart('apache2')
+            else:
+                service_privileged.reload('apache2')
 
 
 class Uwsgi(app.LeaderComponent):
@@ -123,11 +139,13 @@ class Uwsgi(app.LeaderComponent):
 
     def enable(self):
         """Enable the uWSGI configuration."""
-        privileged.uwsgi_enable(self.uwsgi_name)
+        with _webserver_lock:
+            privileged.uwsgi_enable(self.uwsgi_name)
 
     def disable(self):
         """Disable the uWSGI configuration."""
-        privileged.uwsgi_disable(self.uwsgi_name)
+        with _webserver_lock:
+            privileged.uwsgi_disable(self.uwsgi_name)
 
     def is_running(self):
         """Return whether the uWSGI daemon is running with configuration."""
@@ -159,23 +177,70 @@ def diagnose_url(url, kind=None, env=None, check_certificate=True,
     return DiagnosticCheck(check_id, description, result, parameters)
 
 
+@contextlib.contextmanager
+def addresses_snapshot():
+    """Share the list of addresses among all the URL diagnostics within.
+
+    Listing the addresses of the machine requires running processes. Use this
+    when running many URL diagnostics together, such as when diagnosing all
+    apps. Idle connections kept open for checking URLs are closed on exit.
+    """
+    try:
+        with _addresses.shared():
+            yield
+    finally:
+        probe.pool.clear()
+
+
+def get_addresses():
+    """Return the addresses of the machine, shared within a snapshot."""
+    return _addresses.get()
+
+
 def diagnose_url_on_all(url, expect_redirects=False, **kwargs):
-    """Run a diagnostic on whether a URL is accessible."""
-    results = []
-    for address in action_utils.get_addresses():
+    """Run a diagnostic on whether a URL is accessible on all addresses.
+
+    URLs on different addresses are checked in parallel.
+    """
+
+    def _diagnose(address):
         current_url = url.format(host=address['url_address'])
         diagnose_kwargs = dict(kwargs)
         if not expect_redirects:
             diagnose_kwargs.setdefault('kind', address['kind'])
 
-        results.append(diagnose_url(current_url, **diagnose_kwargs))
+        return diagnose_url(current_url, **diagnose_kwargs)
 
-    return results
+    with futures.ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHECKS,
+                                    thread_name_prefix='check-url') as pool:
+        return list(pool.map(_diagnose, get_addresses()))
 
 
 def check_url(url, kind=None, env=None, check_certificate=True,
               extra_options=None, wrapper=None, expected_output=None):
-    """Check whether a URL is accessible."""
+    """Check whether a URL is accessible.
+
+    Kind can be '4' for IPv4 or '6' for IPv6. Only proxy settings are used
+    from env. When a wrapper program or extra options for curl are needed, the
+    check is done using curl. Otherwise, it is done in-process.
+    """
+    if wrapper or extra_options:
+        return _check_url_with_curl(url, kind, env, check_certificate,
+                                    extra_options, wrapper, expected_output)
+
+    proxies = {}
+    for key, value in (env or {}).items():
+        if key.lower() in ('http_proxy', 'https_proxy'):
+            proxies[key.lower().removesuffix('_proxy')] = value
+
+    return probe.check_url(url, kind, check_certificate, expected_output,
+                           proxies)
+
+
+def _check_url_with_curl(url, kind=None, env=None, check_certificate=True,
+                         extra_options=None, wrapper=None,
+                         expected_output=None):
+    """Check whether a URL is accessible using curl."""
     command = ['curl', '--location', '-f', '-w', '%{response_code}']
 
     if kind == '6':
@@ -0,0 +1,211 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Check whether URLs are accessible without starting a process for each URL.
+
+Diagnostics check many URLs on all the addresses of the machine. Running
+'curl' for each of them is slow. Instead, requests are made using the Python
+standard library. Connections are kept open and reused for further requests
+to the same host, such as when following redirects or checking another URL on
+the same web server.
+"""
+
+import collections
+import http.client
+import socket
+import ssl
+import threading
+import urllib.parse
+
+TIMEOUT = 30
+
+MAX_REDIRECTS = 10
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# Responses that mean the URL exists but needs authorization or another method
+SUCCESS_STATUSES = (401, 405)
+
+USER_AGENT = 'FreedomBox'
+
+
+class ConnectionPool:
+    """Keep idle HTTP connections for reuse, keyed by destination."""
+
+    MAX_IDLE_CONNECTIONS = 4
+
+    def __init__(self):
+        """Initialize the pool."""
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return an idle connection for the destination or None."""
+        with self._lock:
+            connections = self._idle.get(key)
+            return connections.pop() if connections else None
+
+    def put(self, key, connection):
+        """Keep a connection that has finished a request for reuse."""
+        with self._lock:
+            connections = self._idle[key]
+            if len(connections) < self.MAX_IDLE_CONNECTIONS:
+                connections.append(connection)
+                return
+
+        connection.close()
+
+    def clear(self):
+        """Close all the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, collections.defaultdict(list)
+
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+pool = ConnectionPool()
+
+
+def check_url(url, kind=None, check_certificate=True, expected_output=None,
+              proxies=None):
+    """Return whether a URL is accessible.
+
+    Kind can be '4' for IPv4 or '6' for IPv6. IPv6 link-local addresses may
+    have a zone index such as 'http://[fe80::1%eth0]/'. Redirects are followed.
+    A response with status 401 or 405 is considered success. 'proxies' is a
+    dictionary mapping URL scheme to the URL of a proxy server.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        try:
+            response, body = _request(url, kind, check_certificate, proxies)
+        except (OSError, http.client.HTTPException, ValueError):
+            return False
+
+        location = response.getheader('Location')
+        if response.status not in REDIRECT_STATUSES or not location:
+            break
+
+        url = urllib.parse.urljoin(url, location)
+    else:
+        return False
+
+    if response.status in SUCCESS_STATUSES:
+        return True
+
+    if response.status >= 400:
+        return False
+
+    if expected_output and expected_output not in body.decode(
+            errors='replace'):
+        return False
+
+    return True
+
+
+def _request(url, kind, check_certificate, proxies):
+    """Make a GET request on a pooled connection and return the response."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        raise ValueError(f'Unsupported URL scheme: {parts.scheme}')
+
+    host, _, zone = parts.hostname.partition('%')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    proxy = (proxies or {}).get(parts.scheme)
+    key = (parts.scheme, host, port, zone, kind, check_certificate, proxy)
+
+    path = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query,
+                                    ''))
+    if proxy and parts.scheme == 'http':
+        # Plain HTTP proxies expect the full URL in the request
+        netloc = f'[{host}]' if ':' in host else host
+        path = f'http://{netloc}:{port}{path}'
+
+    connection = pool.get(key)
+    is_reused = connection is not None
+    while True:
+        if not connection:
+            connection = _new_connection(parts.scheme, host, port, zone, kind,
+                                         check_certificate, proxy)
+
+        try:
+            connection.request('GET', path, headers={'User-Agent': USER_AGENT})
+            response = connection.getresponse()
+            body = response.read()
+            break
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            if not is_reused:
+                raise
+
+            # Server may have closed an idle connection, retry with a new one
+            connection = None
+            is_reused = False
+
+    if response.will_close:
+        connection.close()
+    else:
+        pool.put(key, connection)
+
+    return response, body
+
+
+def _new_connection(scheme, host, port, zone, kind, check_certificate,
+                    proxy):
+    """Return a new connection to the host or to the proxy."""
+    connect_host, connect_port = host, port
+    if proxy:
+        proxy_parts = urllib.parse.urlsplit(proxy)
+        connect_host = proxy_parts.hostname
+        connect_port = proxy_parts.port or 1080
+        zone = None
+
+    if scheme == 'https':
+        context = ssl.create_default_context()
+        if not check_certificate:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+
+        connection = http.client.HTTPSConnection(connect_host, connect_port,
+                                                 timeout=TIMEOUT,
+                                                 context=context)
+        if proxy:
+            connection.set_tunnel(host, port)
+    else:
+        connection = http.client.HTTPConnection(connect_host, connect_port,
+                                                timeout=TIMEOUT)
+
+    family = {'4': socket.AF_INET, '6': socket.AF_INET6}.get(kind, 0)
+
+    def _create_connection(address, timeout, source_address=None):
+        return _connect(address, family, zone, timeout)
+
+    connection._create_connection = _create_connection
+    return connection
+
+
+def _connect(address, family, zone, timeout):
+    """Return a socket connected to the address using the address family.
+
+    Zone index is used to pick the interface for link-local IPv6 addresses.
+    It is not part of the host name sent to the server.
+    """
+    host, port = address
+    if zone:
+        host = f'{host}%{zone}'
+
+    error = OSError(f'No addresses found for {host}')
+    for address_info in socket.getaddrinfo(host, port, family,
+                                           socket.SOCK_STREAM):
+        address_family, socket_type, protocol, _, socket_address = \
+            address_info
+        sock = socket.socket(address_family, socket_type, protocol)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(socket_address)
+            return sock
+        except OSError as exception:
+            error = exception
+            sock.close()
+
+    raise error
@@ -4,12 +4,15 @@ Test module for webserver components.
 """
 
 import subprocess
+import threading
+import time
 from unittest.mock import call, patch
 
 import pytest
 
 from plinth import app
-from plinth.modules.apache.components import (Uwsgi, Webserver, check_url,
+from plinth.modules.apache.components import (Uwsgi, Webserver,
+                                              _check_url_with_curl, check_url,
                                               diagnose_url,
                                               diagnose_url_on_all)
 from plinth.modules.diagnostics.check import DiagnosticCheck, Result
@@ -58,6 +61,33 @@ def test_webserver_enable(enable):
     enable.assert_has_calls([call('test-config', 'module')])
 
 
+@patch('plinth.modules.apache.privileged.enable')
+def test_webserver_enable_concurrent(enable):
+    """Test that webserver configurations are enabled one at a time."""
+    running = []
+    overlapped = []
+
+    def _enable(web_name, kind):
+        running.append(web_name)
+        overlapped.append(len(running) > 1)
+        time.sleep(0.05)
+        running.remove(web_name)
+
+    enable.side_effect = _enable
+    threads = [
+        threading.Thread(
+            target=Webserver(f'test-webserver{index}', f'test-config{index}',
+                             kind='module').enable) for index in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert overlapped == [False, False, False]
+
+
 @patch('plinth.modules.apache.privileged.disable')
 def test_webserver_disable(disable):
     """Test that disabling webserver configuration works."""
@@ -295,38 +325,38 @@ def test_diagnose_url(get_addresses, check):
 
 
 @patch('subprocess.run')
-def test_check_url(run):
-    """Test checking whether a URL is accessible."""
+def test_check_url_with_curl(run):
+    """Test checking whether a URL is accessible using curl."""
     url = 'http://localhost/test'
     basic_command = ['curl', '--location', '-f', '-w', '%{response_code}']
     extra_args = {'env': None, 'check': True, 'stdout': -1, 'stderr': -1}
 
     # Basic
-    assert check_url(url)
+    assert _check_url_with_curl(url)
     run.assert_called_with(basic_command + [url], **extra_args)
 
     # Wrapper
-    check_url(url, wrapper='test-wrapper')
+    _check_url_with_curl(url, wrapper='test-wrapper')
     run.assert_called_with(['test-wrapper'] + basic_command + [url],
                            **extra_args)
 
     # No certificate check
-    check_url(url, check_certificate=False)
+    _check_url_with_curl(url, check_certificate=False)
     run.assert_called_with(basic_command + [url, '-k'], **extra_args)
 
     # Extra options
-    check_url(url, extra_options=['test-opt1', 'test-opt2'])
+    _check_url_with_curl(url, extra_options=['test-opt1', 'test-opt2'])
     run.assert_called_with(basic_command + [url, 'test-opt1', 'test-opt2'],
                            **extra_args)
 
     # TCP4/TCP6
-    check_url(url, kind='4')
+    _check_url_with_curl(url, kind='4')
     run.assert_called_with(basic_command + [url, '-4'], **extra_args)
-    check_url(url, kind='6')
+    _check_url_with_curl(url, kind='6')
     run.assert_called_with(basic_command + [url, '-6'], **extra_args)
 
     # IPv6 Link Local URLs
-    check_url('https://[::2%eth0]/test', kind='6')
+    _check_url_with_curl('https://[::2%eth0]/test', kind='6')
     run.assert_called_with(
         basic_command + ['--interface', 'eth0', 'https://[::2]/test', '-6'],
         **extra_args)
@@ -335,16 +365,40 @@ def test_check_url(run):
     exception = subprocess.CalledProcessError(returncode=1, cmd=['curl'])
     run.side_effect = exception
     run.side_effect.stdout = b'500'
-    assert not check_url(url)
+    assert not _check_url_with_curl(url)
 
     # Return code 401, 405
     run.side_effect = exception
     run.side_effect.stdout = b' 401 '
-    assert check_url(url)
+    assert _check_url_with_curl(url)
     run.side_effect.stdout = b'405\n'
-    assert check_url(url)
+    assert _check_url_with_curl(url)
 
     # Error
     run.side_effect = FileNotFoundError()
     with pytest.raises(FileNotFoundError):
-        assert check_url(url)
+        assert _check_url_with_curl(url)
+
+
+@patch('plinth.modules.apache.components._check_url_with_curl')
+@patch('plinth.modules.apache.probe.check_url')
+def test_check_url(probe_check_url, check_url_with_curl):
+    """Test that URLs are checked in-process unless curl is needed."""
+    url = 'https://localhost/test'
+    check_url(url, kind='4', check_certificate=False, expected_output='x')
+    probe_check_url.assert_called_with(url, '4', False, 'x', {})
+    check_url_with_curl.assert_not_called()
+
+    env = {'https_proxy': 'http://proxy:8118/', 'PATH': '/bin'}
+    check_url(url, env=env)
+    probe_check_url.assert_called_with(url, None, True, None,
+                                       {'https': 'http://proxy:8118/'})
+
+    probe_check_url.reset_mock()
+    check_url(url, wrapper='torsocks')
+    check_url_with_curl.assert_called_with(url, None, None, True, None,
+                                           'torsocks', None)
+    check_url(url, extra_options=['--test'])
+    check_url_with_curl.assert_called_with(url, None, None, True, ['--test'],
+                                           None, None)
+    probe_check_url.assert_not_called()
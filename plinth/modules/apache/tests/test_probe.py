@@ -0,0 +1,118 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for checking URLs in-process.
+"""
+
+import http.server
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plinth.modules.apache import components, probe
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Respond with status and body depending on the path."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Handle a GET request."""
+        self.server.requests.append((self.path, self.client_address))
+        status, headers, body = {
+            '/ok': (200, {}, b'hello world'),
+            '/redirect': (302, {'Location': '/ok'}, b''),
+            '/loop': (302, {'Location': '/loop'}, b''),
+            '/auth': (401, {}, b''),
+            '/method': (405, {}, b''),
+            '/error': (500, {}, b''),
+        }.get(self.path, (404, {}, b''))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Don't log requests."""
+
+
+@pytest.fixture(name='server')
+def fixture_server():
+    """Run an HTTP server on localhost."""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                             _RequestHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    probe.pool.clear()
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_check_url(server):
+    """Test checking URLs against a local server."""
+    url = f'http://127.0.0.1:{server.server_port}'
+    assert probe.check_url(url + '/ok')
+    assert probe.check_url(url + '/ok', kind='4')
+    assert not probe.check_url(url + '/ok', kind='6')
+    assert probe.check_url(url + '/redirect')
+    assert probe.check_url(url + '/auth')
+    assert probe.check_url(url + '/method')
+    assert not probe.check_url(url + '/error')
+    assert not probe.check_url(url + '/missing')
+    assert not probe.check_url(url + '/loop')
+    assert probe.check_url(url + '/ok', expected_output='hello')
+    assert not probe.check_url(url + '/ok', expected_output='goodbye')
+    assert not probe.check_url('ftp://127.0.0.1/')
+    assert not probe.check_url('http://127.0.0.1:1/')
+
+
+def test_connection_reuse(server):
+    """Test that connections are reused for requests to the same host."""
+    url = f'http://127.0.0.1:{server.server_port}'
+    assert probe.check_url(url + '/redirect')
+    assert probe.check_url(url + '/ok')
+    assert [path for path, _ in server.requests] == ['/redirect', '/ok', '/ok']
+    assert len({address for _, address in server.requests}) == 1
+
+    # Server closed the idle connection
+    for connections in probe.pool._idle.values():
+        for connection in connections:
+            connection.sock.close()
+
+    assert probe.check_url(url + '/ok')
+    assert len({address for _, address in server.requests}) == 2
+
+
+def test_addresses_snapshot_closes_connections(server):
+    """Test that idle connections are closed after a diagnostics run."""
+    url = f'http://127.0.0.1:{server.server_port}'
+    with components.addresses_snapshot():
+        assert probe.check_url(url + '/ok')
+        assert any(probe.pool._idle.values())
+
+    assert not any(probe.pool._idle.values())
+
+
+def test_proxy(server):
+    """Test that plain HTTP requests are sent to proxy with full URL."""
+    proxy = f'http://127.0.0.1:{server.server_port}/'
+    assert not probe.check_url('http://example.test/ok',
+                               proxies={'http': proxy})
+    assert server.requests[-1][0] == 'http://example.test:80/ok'
+
+
+@patch('socket.getaddrinfo')
+def test_link_local_zone(getaddrinfo, server):
+    """Test that zone index is used to connect but not sent to server."""
+    getaddrinfo.return_value = []
+    assert not probe.check_url('http://[fe80::1%eth0]:8000/ok', kind='6')
+    getaddrinfo.assert_called_once()
+    assert getaddrinfo.call_args.args[0] == 'fe80::1%eth0'
+    assert getaddrinfo.call_args.args[1] == 8000
@@ -6,6 +6,8 @@ import logging
 import os
 import pathlib
 import re
+import threading
+import time
 
 import paramiko
 from django.utils.text import get_valid_filename
@@ -13,10 +15,10 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext_noop
 
 from plinth import app as app_module
-from plinth import cfg, glib, menu
+from plinth import cfg, glib, menu, utils
 from plinth.package import Packages
 
-from . import api, privileged
+from . import api, downloads, privileged
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +29,23 @@ _description = [
 # session variable name that stores when a backup file should be deleted
 SESSION_PATH_VARIABLE = 'fbx-backups-upload-path'
 
+# Number of repositories backed up at the same time by the schedule
+MAX_PARALLEL_BACKUPS = 3
+
+# Seconds after which creating an archive is stopped
+ARCHIVE_TIMEOUT = 6 * 3600
+
+# Seconds after which a scheduled backup of a repository is abandoned. Leaves
+# time for stopping the archive creation, running hooks and restarting apps.
+BACKUP_TIMEOUT = ARCHIVE_TIMEOUT + 600
+
+# Locks to run only one scheduled backup of a repository at a time
+_repository_locks: dict[str, threading.Lock] = {}
+_repository_locks_lock = threading.Lock()
+
+# Time, duration and result of the last scheduled job of each repository
+job_metrics: dict[str, dict] = {}
+
 
 class BackupsApp(app_module.App):
     """FreedomBox app for backup and restore."""
@@ -59,6 +78,11 @@ class BackupsApp(app_module.App):
         # Check every hour to perform scheduled backups
         glib.schedule(3600, backup_by_schedule)
 
+        # Remove staged downloads left over from the previous run and then
+        # expired ones every 10 minutes
+        downloads.remove_expired()
+        glib.schedule(600, downloads.remove_expired)
+
     def setup(self, old_version):
         """Install and configure the app."""
         super().setup(old_version)
@@ -93,20 +117,80 @@ def _backup_handler(packet, encryption_passphrase=None):
 
     privileged.create_archive(packet.path, paths,
                               comment=packet.archive_comment,
-                              encryption_passphrase=encryption_passphrase)
+                              encryption_passphrase=encryption_passphrase,
+                              _timeout=ARCHIVE_TIMEOUT)
 
 
 def backup_by_schedule(data):
-    """Check if backups need to be taken and run the operation."""
+    """Check if backups need to be taken and run them for all repositories.
+
+    Repositories are handled in parallel by a pool of threads so that a slow
+    repository does not delay the others. Only one scheduled backup runs for a
+    repository at a time. Creating an archive is stopped after ARCHIVE_TIMEOUT
+    seconds. A repository whose backup still does not finish within
+    BACKUP_TIMEOUT seconds is reported as failed and later runs skip it until
+    the backup finishes.
+    """
     from . import repository as repository_module
-    for repository in repository_module.get_repositories():
+    repositories = {
+        repository.uuid: repository
+        for repository in repository_module.get_repositories()
+    }
+
+    def _run_job(repository):
+        with _repository_locks_lock:
+            lock = _repository_locks.setdefault(repository.uuid,
+                                                threading.Lock())
+
+        if not lock.acquire(blocking=False):
+            return None
+
         try:
-            repository.schedule.run_schedule()
+            return repository.schedule.run_schedule()
+        finally:
+            lock.release()
+
+    def _on_finish(uuid, future, start_time):
+        _finish_job(repositories[uuid], future, start_time)
+
+    utils.run_in_threads(repositories, _run_job, _on_finish, BACKUP_TIMEOUT,
+                         MAX_PARALLEL_BACKUPS, 'backups')
+
+
+def _finish_job(repository, future, start_time):
+    """Record the result of a scheduled backup job and show errors.
+
+    If future is None, the job has timed out.
+    """
+    duration = time.monotonic() - start_time if start_time else 0.0
+    try:
+        if future is None:
+            raise TimeoutError(
+                f'Backup did not finish in {duration:.0f} seconds')
+
+        result = future.result()
+    except Exception as exception:
+        logger.exception('Error running scheduled backup: %s', exception)
+        _show_schedule_error_notification(repository, is_error=True,
+                                          exception=exception)
+        result = 'failed'
+    else:
+        if result is None:
+            logger.warning(
+                'Skipping scheduled backup of repository %s, previous one is '
+                'still running', repository.uuid)
+            result = 'skipped'
+        else:
             _show_schedule_error_notification(repository, is_error=False)
-        except Exception as exception:
-            logger.exception('Error running scheduled backup: %s', exception)
-            _show_schedule_error_notification(repository, is_error=True,
-                                              exception=exception)
+            result = 'backed up' if result else 'not due'
+
+    job_metrics[repository.uuid] = {
+        'time': time.time(),
+        'duration': duration,
+        'result': result,
+    }
+    logger.info('Scheduled backup job for repository %s: %s in %.1fs',
+                repository.uuid, result, duration)
 
 
 def _restore_exported_archive_handler(packet, encryption_passphrase=None):
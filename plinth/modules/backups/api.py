@@ -10,9 +10,11 @@ TODO:
 - Implement unit tests.
 """
 
+import contextlib
 import logging
+import threading
 
-from plinth import action_utils
+from plinth import action_utils, actions
 from plinth import app as app_module
 from plinth import setup
 from plinth.modules.apache import privileged as apache_privileged
@@ -22,6 +24,10 @@ from .components import BackupRestore
 
 logger = logging.getLogger(__name__)
 
+# Apps prepared for backups that are running, keyed by app ID
+_window: dict[str, dict] = {}
+_window_lock = threading.Lock()
+
 
 class BackupError:
     """Represent an backup/restore operation error."""
@@ -116,27 +122,81 @@ def backup_apps(backup_handler, path, app_ids=None, encryption_passphrase=None,
     else:
         components = get_components_in_order(app_ids)
 
-    if _is_snapshot_available():
-        snapshot = _take_snapshot()
-        backup_root = snapshot['mount_path']
-        snapshotted = True
-    else:
-        _lockdown_apps(components, lockdown=True)
-        original_state = _shutdown_services(components)
-        backup_root = '/'
-        snapshotted = False
+    if not _is_snapshot_available():
+        packet = Packet('backup', 'apps', '/', components, path,
+                        archive_comment)
+        with _backup_window(packet):
+            backup_handler(packet, encryption_passphrase=encryption_passphrase)
+
+        return
 
+    snapshot = _take_snapshot()
     try:
-        packet = Packet('backup', 'apps', backup_root, components, path,
-                        archive_comment)
+        packet = Packet('backup', 'apps', snapshot['mount_path'], components,
+                        path, archive_comment)
         _run_operation(backup_handler, packet,
                        encryption_passphrase=encryption_passphrase)
     finally:
-        if snapshotted:
-            _delete_snapshot(snapshot)
-        else:
-            _restore_services(original_state)
-            _lockdown_apps(components, lockdown=False)
+        _delete_snapshot(snapshot)
+
+
+@contextlib.contextmanager
+def _backup_window(packet):
+    """Keep apps of a packet ready for backup, sharing with other backups.
+
+    Without snapshots, apps are locked down, their services are stopped and
+    their pre-backup hooks are run before their files are read. Backups to
+    different repositories may run at the same time. Preparing apps separately
+    for each of them would restart services and rewrite data dumped by hooks
+    while another backup is reading it. So, an app is prepared by the first
+    backup needing it and restored after the last backup using it finishes.
+    """
+    with _window_lock:
+        new_components = []
+        for component in packet.components:
+            if component.app_id in _window:
+                _window[component.app_id]['users'] += 1
+            else:
+                new_components.append(component)
+
+        _lockdown_apps(new_components, lockdown=True)
+        try:
+            state = _shutdown_services(new_components)
+            _run_hooks('backup_pre', packet, new_components)
+        except Exception:
+            _lockdown_apps(new_components, lockdown=False)
+            for component in packet.components:
+                if component not in new_components:
+                    _window[component.app_id]['users'] -= 1
+
+            raise
+
+        for component in new_components:
+            services = [
+                handler for handler in state
+                if handler.backup_app is component
+            ]
+            _window[component.app_id] = {'users': 1, 'services': services}
+
+    try:
+        yield
+    finally:
+        with _window_lock:
+            done_components = []
+            for component in packet.components:
+                _window[component.app_id]['users'] -= 1
+                if not _window[component.app_id]['users']:
+                    done_components.append(component)
+
+            _run_hooks('backup_post', packet, done_components)
+            state = []
+            for component in done_components:
+                state += _window.pop(component.app_id)['services']
+
+            try:
+                _restore_services(state)
+            finally:
+                _lockdown_apps(done_components, lockdown=False)
 
 
 def restore_apps(restore_handler, app_ids=None, create_subvolume=True,
@@ -367,8 +427,9 @@ def _shutdown_services(components):
         for service in component.services:
             state.append(ServiceHandler.create(component, service))
 
-    for service in reversed(state):
-        service.stop()
+    with actions.batch():
+        for service in reversed(state):
+            service.stop()
 
     return state
 
@@ -378,11 +439,12 @@ def _restore_services(original_state):
 
     Maintain exact order of services so dependencies are satisfied.
     """
-    for service_handler in original_state:
-        service_handler.restart()
+    with actions.batch():
+        for service_handler in original_state:
+            service_handler.restart()
 
 
-def _run_hooks(hook, packet):
+def _run_hooks(hook, packet, components=None):
     """Run pre/post operation hooks in applications.
 
     Using the manifest mechanism, applications will convey to the backups
@@ -408,9 +470,15 @@ def _run_hooks(hook, packet):
     - restore_post(packet):
       Called after the restore process has completed for the application.
 
+    The hooks are run for the given components or for all the components of
+    the packet.
+
     """
     logger.info('Running %s hooks', hook)
-    for component in packet.components:
+    if components is None:
+        components = packet.components
+
+    for component in components:
         try:
             getattr(component, hook)(packet)
         except Exception as exception:
@@ -142,12 +142,12 @@ class BackupRestore(app.FollowerComponent):
             return
 
         from plinth import kvstore
-        data = {}
-        for key in self.settings:
-            try:
-                data[key] = kvstore.get(key)
-            except Exception:
-                pass
+        missing = object()
+        values = kvstore.get_many(self.settings, missing)
+        data = {
+            key: value
+            for key, value in values.items() if value is not missing
+        }
 
         privileged.dump_settings(self.app_id, data)
 
@@ -159,5 +159,4 @@ class BackupRestore(app.FollowerComponent):
         data = privileged.load_settings(self.app_id)
 
         from plinth import kvstore
-        for key, value in data.items():
-            kvstore.set(key, value)
+        kvstore.set_many(data)
@@ -0,0 +1,377 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Stage exported backup archives for downloading.
+
+Exporting an archive with borg and compressing it is slow. Exports are
+streamed directly to the browser by default. When a resumable download is
+requested, the export is written to a staging file while it is being sent to
+the browser. Interrupted downloads are resumed with HTTP range requests served
+from the staging file instead of exporting the archive again. Staging files
+hold the data of the archive unencrypted and are removed after they have not
+been used for a while.
+
+When there is not enough free space for staging, the export is streamed
+instead. Staging stops if free space runs low while writing. The number of
+exports running at the same time is limited as each one runs borg and a
+compressor.
+"""
+
+import errno
+import logging
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+from plinth import cfg
+
+from .errors import TooManyExportsError
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+STAGING_TIMEOUT = 3600
+
+# Free space left in the staging directory's file system after staging
+MINIMUM_FREE_SPACE = 2 * 1024 * 1024 * 1024
+
+# Number of chunks written between checks of free space while staging
+FREE_SPACE_CHECK_CHUNKS = 64
+
+# Number of exports running at the same time
+MAX_EXPORTS = 2
+
+# Compressions of exported archives with their default, fast, levels
+COMPRESSIONS = {
+    'gzip': {
+        'extension': '.tar.gz',
+        'content_type': 'application/gzip',
+        'levels': range(1, 10),
+        'level': 1,
+    },
+    'zstd': {
+        'extension': '.tar.zst',
+        'content_type': 'application/zstd',
+        'levels': range(1, 20),
+        'level': 3,
+    },
+    'none': {
+        'extension': '.tar',
+        'content_type': 'application/x-tar',
+        'levels': range(0),
+        'level': None,
+    },
+}
+
+_exports: dict[tuple, '_Export'] = {}
+_streams: set['_StreamedExport'] = set()
+_exports_lock = threading.Lock()
+
+
+def get_staging_directory():
+    """Return the directory where exports are staged."""
+    return pathlib.Path(cfg.data_dir) / 'backups-downloads'
+
+
+def get_compressions():
+    """Return the names of compressions available on this system."""
+    return [
+        compression for compression in COMPRESSIONS
+        if compression != 'zstd' or shutil.which('zstd')
+    ]
+
+
+class _Export:
+    """An archive export being written to a staging file."""
+
+    def __init__(self, path):
+        """Initialize the export with an empty staging file."""
+        self.path = path
+        self.etag = f'"{time.time_ns():x}"'
+        self.size = 0
+        self.is_complete = False
+        self.error = None
+        self.last_used = time.monotonic()
+        self.condition = threading.Condition()
+
+    def get_size(self):
+        """Return the size of the finished export or None if unfinished."""
+        with self.condition:
+            return self.size if self.is_complete else None
+
+    def write(self, process):
+        """Copy the exported data from a process into the staging file."""
+        directory = os.path.dirname(self.path)
+        try:
+            with open(self.path, 'wb', buffering=0) as file_handle:
+                chunks = 0
+                while chunk := process.stdout.read1(CHUNK_SIZE):
+                    chunks += 1
+                    if not chunks % FREE_SPACE_CHECK_CHUNKS and \
+                       not _has_free_space(directory):
+                        raise OSError(errno.ENOSPC,
+                                      'Not enough free space to stage export')
+
+                    file_handle.write(chunk)
+                    with self.condition:
+                        self.size += len(chunk)
+                        self.condition.notify_all()
+
+            process.stdout.close()
+            if process.wait():
+                raise RuntimeError(
+                    f'Export failed with exit code {process.returncode}')
+        except Exception as exception:
+            logger.exception('Error exporting archive: %s', exception)
+            self.error = exception
+            process.kill()
+            process.wait()
+
+        with self.condition:
+            self.is_complete = True
+            self.last_used = time.monotonic()
+            self.condition.notify_all()
+
+    def open(self, start=0, end=None):
+        """Return an iterator over the exported data in a range.
+
+        Data not yet written is waited for. 'end' is exclusive. The file is
+        opened immediately so that reading continues even if the staging file
+        is removed.
+        """
+        file_handle = open(self.path, 'rb')
+        file_handle.seek(start)
+        return self._read(file_handle, start, end)
+
+    def _read(self, file_handle, position, end):
+        """Yield large chunks of data from an open staging file."""
+        with file_handle:
+            while end is None or position < end:
+                with self.condition:
+                    self.condition.wait_for(
+                        lambda: self.size > position or self.is_complete)
+                    if self.error:
+                        raise RuntimeError('Export of archive failed')
+
+                    available = self.size
+                    self.last_used = time.monotonic()
+
+                if position >= available:
+                    break
+
+                if end is not None:
+                    available = min(available, end)
+
+                chunk = file_handle.read(min(CHUNK_SIZE, available - position))
+                position += len(chunk)
+                yield chunk
+
+
+class _StreamedExport:
+    """An archive export sent directly without staging.
+
+    Its size is unknown and ranges can't be served.
+    """
+
+    etag = None
+
+    def __init__(self, process):
+        """Initialize the export with the exporting process."""
+        self.process = process
+
+    def get_size(self):
+        """Return None as the size is not known in advance."""
+        return None
+
+    def is_running(self):
+        """Return whether the exporting process is still running."""
+        return self.process.poll() is None
+
+    def open(self, start=0, end=None):
+        """Return an iterable over all the exported data."""
+        assert start == 0 and end is None
+        return self
+
+    def __iter__(self):
+        """Yield large chunks of data from the exporting process."""
+        while chunk := self.process.stdout.read1(CHUNK_SIZE):
+            yield chunk
+
+        self.process.stdout.close()
+        if self.process.wait():
+            raise RuntimeError(
+                f'Export failed with exit code {self.process.returncode}')
+
+    def close(self):
+        """Stop the export when the response is closed."""
+        if self.is_running():
+            self.process.kill()
+
+        self.process.wait()
+
+
+def stream_export(repository, archive, compression, level):
+    """Start an export of an archive that is sent without staging.
+
+    Raise TooManyExportsError if too many exports are already running.
+    """
+    with _exports_lock:
+        _check_running_exports()
+        return _start_stream(repository, archive, compression, level)
+
+
+def get_export(repository, archive, compression, level):
+    """Return a staged export of an archive, starting it if necessary.
+
+    An export with the same archive, compression and level is reused, unless
+    it has failed, to resume downloads. An archive is staged only if the file
+    system has room for the original size of its files and
+    MINIMUM_FREE_SPACE more. Otherwise, it is streamed. Raise
+    TooManyExportsError if too many exports are already running.
+    """
+    key = (repository.uuid, archive['id'], compression, level)
+    with _exports_lock:
+        _remove_expired()
+        export = _get_reusable_export(key)
+        if export:
+            return export
+
+        _check_running_exports()
+
+    # Reading the size of an archive with borg is slow, don't block others
+    size = repository.get_archive_size(archive['name'])
+
+    with _exports_lock:
+        export = _get_reusable_export(key)
+        if export:
+            return export
+
+        _check_running_exports()
+        staging_directory = get_staging_directory()
+        staging_directory.mkdir(mode=0o700, exist_ok=True)
+        if not _has_free_space(staging_directory, size):
+            logger.warning('Not enough free space to stage export, '
+                           'streaming it instead')
+            return _start_stream(repository, archive, compression, level)
+
+        extension = COMPRESSIONS[compression]['extension']
+        file_handle, path = tempfile.mkstemp(suffix=extension,
+                                             dir=staging_directory)
+        os.close(file_handle)
+        try:
+            process = repository.export_archive(archive['name'], compression,
+                                                level)
+        except Exception:
+            os.remove(path)
+            raise
+
+        export = _Export(path)
+        _exports[key] = export
+
+    threading.Thread(target=export.write, args=(process, ),
+                     daemon=True).start()
+    return export
+
+
+def _get_reusable_export(key):
+    """Return an export that has not failed for a key, marking it used."""
+    export = _exports.get(key)
+    if not export or export.error:
+        return None
+
+    with export.condition:
+        export.last_used = time.monotonic()
+
+    return export
+
+
+def _check_running_exports():
+    """Raise an error if too many exports are running."""
+    _streams.difference_update(
+        [stream for stream in _streams if not stream.is_running()])
+    running = len(_streams) + sum(
+        1 for export in _exports.values() if export.get_size() is None)
+    if running >= MAX_EXPORTS:
+        raise TooManyExportsError('Too many exports are running')
+
+
+def _start_stream(repository, archive, compression, level):
+    """Start an export that is sent without staging."""
+    stream = _StreamedExport(
+        repository.export_archive(archive['name'], compression, level))
+    _streams.add(stream)
+    return stream
+
+
+def _has_free_space(directory, size=0):
+    """Return whether there is room for staging data of given size."""
+    try:
+        return shutil.disk_usage(directory).free >= size + MINIMUM_FREE_SPACE
+    except OSError:
+        return False
+
+
+def remove_expired(_data=None):
+    """Remove finished exports that have not been used for a while.
+
+    Run periodically and on startup.
+    """
+    with _exports_lock:
+        _remove_expired()
+
+
+def _remove_expired():
+    """Remove finished exports that have not been used for a while.
+
+    Staging files left over from a previous run are also removed. Must be
+    called with the exports lock held.
+    """
+    now = time.monotonic()
+    for key, export in list(_exports.items()):
+        with export.condition:
+            if export.is_complete and \
+               now - export.last_used > STAGING_TIMEOUT:
+                del _exports[key]
+
+    staging_directory = get_staging_directory()
+    if not staging_directory.exists():
+        return
+
+    paths = {export.path for export in _exports.values()}
+    for path in staging_directory.iterdir():
+        if str(path) not in paths:
+            path.unlink(missing_ok=True)
+
+
+def parse_range(header, size):
+    """Return the start and exclusive end of a single byte range request.
+
+    Return None when the header is not understood or asks for multiple ranges
+    and the whole content should be sent. Raise ValueError when the range
+    can't be satisfied.
+    """
+    match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', header)
+    if not match or not any(match.groups()):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range asking for the last bytes
+        if int(last) == 0:
+            raise ValueError('Empty suffix range')
+
+        return max(size - int(last), 0), size
+
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if last and int(last) < start:
+        return None
+
+    if start >= size:
+        raise ValueError('Range starts after the end')
+
+    return start, end
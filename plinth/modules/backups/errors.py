@@ -21,3 +21,7 @@ class BorgRepositoryExists(BorgError):
 
 class BorgUnencryptedRepository(BorgError):
     """Attempt to provide password on an unencrypted repository."""
+
+
+class TooManyExportsError(PlinthError):
+    """Too many archives are being exported for downloading at once."""
@@ -137,7 +137,9 @@ class UploadForm(forms.Form):
     file = forms.FileField(
         label=_('Upload File'), required=True, validators=[
             FileExtensionValidator(
-                ['gz'], _('Backup files have to be in .tar.gz format'))
+                ['gz', 'tar', 'zst'],
+                _('Backup files have to be in .tar.gz, .tar.zst or .tar '
+                  'format'))
         ], help_text=_('Select the backup file you want to upload'))
 
 
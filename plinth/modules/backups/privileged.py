@@ -1,6 +1,7 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Configure backups (with borg) and sshfs."""
 
+import configparser
 import json
 import os
 import pathlib
@@ -14,6 +15,7 @@ from plinth.utils import Version
 TIMEOUT = 30
 BACKUPS_DATA_PATH = pathlib.Path('/var/lib/plinth/backups-data/')
 MANIFESTS_FOLDER = '/var/lib/plinth/backups-manifests/'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
 
 
 class AlreadyMountedError(Exception):
@@ -134,13 +136,54 @@ def info(path: str, encryption_passphrase: str | None = None) -> dict:
 
 
 @privileged
-def list_repo(path: str, encryption_passphrase: str | None = None) -> dict:
-    """List repository contents."""
-    process = _run(['borg', 'list', '--json', '--format="{comment}"', path],
-                   encryption_passphrase, stdout=subprocess.PIPE)
+def list_repo(path: str, encryption_passphrase: str | None = None,
+              archive_name: str | None = None) -> dict:
+    """List repository contents.
+
+    When an archive name is given, only that archive is listed. Listing reads
+    the comment of each archive, so this is much faster for large
+    repositories.
+    """
+    command = ['borg', 'list', '--json', '--format="{comment}"']
+    if archive_name:
+        # Match the name literally instead of as a shell-style pattern
+        pattern = re.sub(r'([*?[\]])', r'[\1]', archive_name)
+        command += ['--glob-archives', pattern]
+
+    process = _run(command + [path], encryption_passphrase,
+                   stdout=subprocess.PIPE)
     return json.loads(process.stdout.decode())
 
 
+@privileged
+def get_repository_state(path: str) -> str | None:
+    """Return a value that changes whenever archives in a repository change.
+
+    Borg commits every change to the manifest, the list of archives, as a new
+    transaction and writes an index file named after the transaction ID. The
+    state is made of the repository ID and the latest transaction ID. Reading
+    it does not need borg or the encryption passphrase. Return None if path is
+    not a local or mounted borg repository.
+    """
+    config = configparser.ConfigParser()
+    try:
+        with open(os.path.join(path, 'config'), encoding='utf-8') as file:
+            config.read_file(file)
+
+        repository_id = config['repository']['id']
+        transactions = [
+            int(name.partition('.')[2]) for name in os.listdir(path)
+            if re.fullmatch(r'index\.\d+', name)
+        ]
+    except (OSError, configparser.Error, KeyError):
+        return None
+
+    if not transactions:
+        return None
+
+    return f'{repository_id}:{max(transactions)}'
+
+
 def _get_borg_version():
     """Return the version of borgbackup."""
     process = _run(['borg', '--version'], stdout=subprocess.PIPE)
@@ -172,6 +215,13 @@ def delete_archive(path: str, encryption_passphrase: str | None = None):
     _run(['borg', 'delete', path], encryption_passphrase)
 
 
+@privileged
+def delete_archives(path: str, archive_names: list[str],
+                    encryption_passphrase: str | None = None):
+    """Delete multiple archives from a repository at once."""
+    _run(['borg', 'delete', path] + archive_names, encryption_passphrase)
+
+
 def _extract(archive_path, destination, encryption_passphrase, locations=None):
     """Extract archive contents."""
     prev_dir = os.getcwd()
@@ -196,11 +246,37 @@ def _extract(archive_path, destination, encryption_passphrase, locations=None):
         os.chdir(prev_dir)
 
 
+def _get_tar_filter(compression, level):
+    """Return the command used to compress exported tar data."""
+    if compression == 'none':
+        return None
+
+    if compression == 'gzip':
+        command, levels = 'gzip', range(1, 10)
+    elif compression == 'zstd':
+        command, levels = 'zstd -T0', range(1, 20)
+    else:
+        raise ValueError('Unknown compression')
+
+    if level is None:
+        return command
+
+    if level not in levels:
+        raise ValueError('Invalid compression level')
+
+    return f'{command} -{level}'
+
+
 @privileged
-def export_tar(path: str, encryption_passphrase: str | None = None):
+def export_tar(path: str, encryption_passphrase: str | None = None,
+               compression: str = 'gzip', level: int | None = None):
     """Export archive contents as tar stream on stdout."""
-    _run(['borg', 'export-tar', path, '-', '--tar-filter=gzip'],
-         encryption_passphrase)
+    command = ['borg', 'export-tar', path, '-']
+    tar_filter = _get_tar_filter(compression, level)
+    if tar_filter:
+        command.append(f'--tar-filter={tar_filter}')
+
+    _run(command, encryption_passphrase)
 
 
 def _read_archive_file(archive, filepath, encryption_passphrase):
@@ -255,11 +331,29 @@ def _get_apps_of_manifest(manifest):
     return apps
 
 
+def _open_exported_archive(path):
+    """Open an exported archive file, uncompressing zstd data first.
+
+    Python's tarfile module reads uncompressed and gzip compressed files but
+    not zstd. The file is uncompressed in place so that it is done only once.
+    """
+    with open(path, 'rb') as file_handle:
+        is_zstd = file_handle.read(len(ZSTD_MAGIC)) == ZSTD_MAGIC
+
+    if is_zstd:
+        uncompressed_path = path + '.tar'
+        subprocess.run(['zstd', '--decompress', '--quiet', '--force', path,
+                        '-o', uncompressed_path], check=True)
+        os.replace(uncompressed_path, path)
+
+    return tarfile.open(path)
+
+
 @privileged
 def get_exported_archive_apps(path: str) -> list[str]:
     """Get list of apps included in an exported archive file."""
     manifest = None
-    with tarfile.open(path) as tar_handle:
+    with _open_exported_archive(path) as tar_handle:
         filenames = tar_handle.getnames()
         for name in filenames:
             if 'var/lib/plinth/backups-manifests/' in name \
@@ -298,7 +392,7 @@ def restore_archive(archive_path: str, destination: str,
 def restore_exported_archive(path: str, directories: list[str],
                              files: list[str]):
     """Restore files from an exported archive."""
-    with tarfile.open(path) as tar_handle:
+    with _open_exported_archive(path) as tar_handle:
         for member in tar_handle.getmembers():
             path = '/' + member.name
             if path in files:
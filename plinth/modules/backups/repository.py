@@ -3,10 +3,10 @@
 
 import abc
 import contextlib
-import io
 import logging
 import os
 import re
+import threading
 from uuid import uuid1
 
 import paramiko
@@ -21,6 +21,9 @@ from .schedule import Schedule
 
 logger = logging.getLogger(__name__)
 
+# Stored indexes of archives are changed by operations in multiple threads
+_index_lock = threading.Lock()
+
 # known errors that come up when remotely accessing a borg repository
 # 'errors' are error strings to look for in the stacktrace.
 KNOWN_ERRORS = [
@@ -170,27 +173,132 @@ class BaseBorgRepository(abc.ABC):
 
     def list_archives(self):
         """Return list of archives in this repository."""
+        return self._get_index()['archives']
+
+    def _get_state(self):
+        """Return a value that changes whenever archives are changed."""
+        with self._handle_errors():
+            return privileged.get_repository_state(self.borg_path)
+
+    def _get_index(self):
+        """Return the index of archives, listing them only if necessary.
+
+        Listing archives with borg takes many seconds, especially for remote
+        repositories. So, a list of archives and the apps in each archive is
+        stored for each repository. It is used as long as the repository's
+        state has not changed since the list was made.
+        """
+        state = self._get_state()
+        index = store.get_archive_index(self.uuid)
+        if state is not None and index and index['state'] == state:
+            return index
+
         with self._handle_errors():
             archives = privileged.list_repo(
                 self.borg_path, self._get_encryption_passpharse())['archives']
-        return sorted(archives, key=lambda archive: archive['start'],
-                      reverse=True)
+
+        archives = sorted(archives, key=lambda archive: archive['start'],
+                          reverse=True)
+        archive_ids = {archive['id'] for archive in archives}
+        apps = index['apps'] if index else {}
+        index = {
+            'state': state,
+            'archives': archives,
+            'apps': {
+                archive_id: app_ids
+                for archive_id, app_ids in apps.items()
+                if archive_id in archive_ids
+            }
+        }
+        if state is not None:
+            with _index_lock:
+                store.set_archive_index(self.uuid, index)
+
+        return index
+
+    def _update_index(self, state, function):
+        """Change the stored index if it is for the given repository state.
+
+        'function' is called with the index and returns the new repository
+        state. When the index is outdated, it is left to be made again.
+        """
+        with _index_lock:
+            index = store.get_archive_index(self.uuid)
+            if state is None or not index or index['state'] != state:
+                return
+
+            index['state'] = function(index)
+            store.set_archive_index(self.uuid, index)
 
     def create_archive(self, archive_name, app_ids, archive_comment=None):
         """Create a new archive in this repository with given name."""
         archive_path = self._get_archive_path(archive_name)
         passphrase = self.credentials.get('encryption_passphrase', None)
+        state = self._get_state()
         api.backup_apps(_backup_handler, path=archive_path, app_ids=app_ids,
                         encryption_passphrase=passphrase,
                         archive_comment=archive_comment)
 
+        self._add_to_index(state, archive_name, app_ids)
+
+    def _add_to_index(self, state, archive_name, app_ids):
+        """Add a created archive to the index, listing only that archive."""
+        index = store.get_archive_index(self.uuid)
+        if state is None or not index or index['state'] != state:
+            return
+
+        with self._handle_errors():
+            archives = privileged.list_repo(self.borg_path,
+                                            self._get_encryption_passpharse(),
+                                            archive_name)['archives']
+
+        archive = _find_archive(archives, archive_name)
+        if not archive:
+            return
+
+        def add_archive(index):
+            index['archives'].append(archive)
+            index['archives'].sort(key=lambda archive: archive['start'],
+                                   reverse=True)
+            if app_ids:
+                index['apps'][archive['id']] = list(app_ids)
+
+            return self._get_state()
+
+        self._update_index(state, add_archive)
+
     def delete_archive(self, archive_name):
         """Delete an archive with given name from this repository."""
         archive_path = self._get_archive_path(archive_name)
+        state = self._get_state()
         with self._handle_errors():
             privileged.delete_archive(archive_path,
                                       self._get_encryption_passpharse())
 
+        self._remove_from_index(state, [archive_name])
+
+    def delete_archives(self, archive_names):
+        """Delete archives with given names using a single borg command."""
+        state = self._get_state()
+        with self._handle_errors():
+            privileged.delete_archives(self.borg_path, archive_names,
+                                       self._get_encryption_passpharse())
+
+        self._remove_from_index(state, archive_names)
+
+    def _remove_from_index(self, state, archive_names):
+        """Remove deleted archives from the index."""
+
+        def remove_archives(index):
+            for archive in list(index['archives']):
+                if archive['name'] in archive_names:
+                    index['archives'].remove(archive)
+                    index['apps'].pop(archive['id'], None)
+
+            return self._get_state()
+
+        self._update_index(state, remove_archives)
+
     def initialize(self):
         """Initialize / create a borg repository."""
         encryption = 'none'
@@ -231,42 +339,32 @@ class BaseBorgRepository(abc.ABC):
 
         return self.credentials.get('encryption_passphrase', None)
 
-    def get_download_stream(self, archive_name):
-        """Return an stream of .tar.gz binary data for a backup archive."""
-
-        class BufferedReader(io.BufferedReader):
-            """Improve performance of buffered binary streaming.
-
-            Django simply returns the iterator as a response for the WSGI app.
-            CherryPy then iterates over this iterator and writes to HTTP
-            response. This calls __next__ over the BufferedReader that is
-            process.stdout. However, this seems to call readline() which looks
-            for \n in binary data which leads to short unpredictably sized
-            chunks which in turn lead to severe performance degradation. So,
-            overwrite this and call read() which is better geared for handling
-            binary data.
-
-            """
+    def get_archive_size(self, archive_name):
+        """Return the original size of the files in an archive."""
+        with self._handle_errors():
+            output = privileged.info(self._get_archive_path(archive_name),
+                                     self._get_encryption_passpharse())
 
-            def __next__(self):
-                """Override to call read() instead of readline()."""
-                chunk = self.read(io.DEFAULT_BUFFER_SIZE)
-                if not chunk:
-                    raise StopIteration
+        return output['archives'][0]['stats']['original_size']
 
-                return chunk
+    def export_archive(self, archive_name, compression='gzip', level=None):
+        """Start exporting a backup archive as tar data.
 
+        Return the process writing the tar data, compressed as requested, to
+        its stdout.
+        """
         with self._handle_errors():
             proc, read_fd, input_ = privileged.export_tar(
                 self._get_archive_path(archive_name),
-                self._get_encryption_passpharse(), _raw_output=True)
+                self._get_encryption_passpharse(), compression=compression,
+                level=level, _raw_output=True)
 
         os.close(read_fd)  # Don't use the pipe for communication, just stdout
         proc.stdin.write(input_)
         proc.stdin.close()
         proc.stderr.close()  # writing to stderr in child will cause SIGPIPE
 
-        return BufferedReader(proc.stdout)
+        return proc
 
     def _get_archive_path(self, archive_name):
         """Return full borg path for an archive."""
@@ -285,19 +383,29 @@ class BaseBorgRepository(abc.ABC):
 
     def get_archive(self, name):
         """Return a specific archive from this repository with given name."""
-        for archive in self.list_archives():
-            if archive['name'] == name:
-                return archive
-
-        return None
+        return _find_archive(self.list_archives(), name)
 
     def get_archive_apps(self, archive_name):
         """Get list of apps included in an archive."""
+        index = self._get_index()
+        archive = _find_archive(index['archives'], archive_name)
+        if archive and archive['id'] in index['apps']:
+            return index['apps'][archive['id']]
+
         archive_path = self._get_archive_path(archive_name)
         with self._handle_errors():
-            return privileged.get_archive_apps(
+            app_ids = privileged.get_archive_apps(
                 archive_path, self._get_encryption_passpharse())
 
+        def add_apps(index):
+            index['apps'][archive['id']] = app_ids
+            return index['state']
+
+        if archive:
+            self._update_index(index['state'], add_apps)
+
+        return app_ids
+
     def restore_archive(self, archive_name, app_ids=None):
         """Restore an archive from this repository to the system."""
         archive_path = self._get_archive_path(archive_name)
@@ -359,6 +467,7 @@ class BorgRepository(BaseBorgRepository):
     def remove(self):
         """Remove a repository from the kvstore."""
         store.delete(self.uuid)
+        store.delete_archive_index(self.uuid)
 
 
 class SshBorgRepository(BaseBorgRepository):
@@ -468,6 +577,7 @@ class SshBorgRepository(BaseBorgRepository):
         """Remove a repository from the kvstore and delete its mountpoint."""
         self.umount()
         store.delete(self.uuid)
+        store.delete_archive_index(self.uuid)
         try:
             if os.path.exists(self._mountpoint):
                 try:
@@ -502,6 +612,15 @@ class SshBorgRepository(BaseBorgRepository):
                     sftp_client.mkdir(dir_path)
 
 
+def _find_archive(archives, name):
+    """Return the archive with given name from a list of archives."""
+    for archive in archives:
+        if archive['name'] == name:
+            return archive
+
+    return None
+
+
 @contextlib.contextmanager
 def _ssh_connection(hostname, username, password):
     """Context manager to create and close an SSH connection."""
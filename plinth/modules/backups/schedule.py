@@ -300,6 +300,7 @@ class Schedule:
         """Cleanup old backups."""
         archives = self._list_scheduled_archives(repository)
         counts = {'daily': 0, 'weekly': 0, 'monthly': 0}
+        expired_archives = []
         for archive in archives:
             keep = False
             archive_periods = archive['comment']['periods']
@@ -318,8 +319,11 @@ class Schedule:
                     keep = True
 
             if not keep:
-                logger.info('Cleaning up in repository %s backup archive %s',
-                            self.repository_uuid, archive['name'])
-                repository.delete_archive(archive['name'])
+                expired_archives.append(archive['name'])
+
+        if expired_archives:
+            logger.info('Cleaning up in repository %s backup archives %s',
+                        self.repository_uuid, ', '.join(expired_archives))
+            repository.delete_archives(expired_archives)
 
         repository.cleanup()
@@ -12,6 +12,9 @@ from plinth import kvstore
 STORAGE_KEY = 'network_storage'
 REQUIRED_FIELDS = ['path', 'storage_type', 'added_by_module']
 
+# kvstore key for index of archives in a repository
+ARCHIVE_INDEX_KEY = 'backups_archive_index_{uuid}'
+
 
 def get_storages(storage_type=None):
     """Get all repositories from store."""
@@ -59,3 +62,22 @@ def delete(uuid):
     storages = get_storages()
     del storages[uuid]
     kvstore.set(STORAGE_KEY, json.dumps(storages))
+
+
+def get_archive_index(uuid):
+    """Return the index of archives of a repository or None if not stored."""
+    index = kvstore.get_default(ARCHIVE_INDEX_KEY.format(uuid=uuid), None)
+    if index:
+        index = json.loads(index)
+
+    return index
+
+
+def set_archive_index(uuid, index):
+    """Store the index of archives of a repository."""
+    kvstore.set(ARCHIVE_INDEX_KEY.format(uuid=uuid), json.dumps(index))
+
+
+def delete_archive_index(uuid):
+    """Remove the index of archives of a repository from store."""
+    kvstore.delete(ARCHIVE_INDEX_KEY.format(uuid=uuid), ignore_missing=True)
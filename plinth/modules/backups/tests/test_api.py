@@ -212,6 +212,47 @@ class TestBackupProcesses:
         service_start.assert_has_calls([call('a-service')])
         apache_enable.assert_has_calls([call('c-service', 'site')])
 
+    @staticmethod
+    @patch('plinth.modules.backups.api._restore_services')
+    @patch('plinth.modules.backups.api._shutdown_services')
+    def test__backup_window(shutdown_services, restore_services):
+        """Test that concurrent backups prepare and restore apps once."""
+        apps = [_get_test_app('test-app-1'), _get_test_app('test-app-2')]
+        components = [
+            apps[0].components['test-app-1-component'],
+            apps[1].components['test-app-2-component']
+        ]
+        for component in components:
+            component.backup_pre = MagicMock()
+            component.backup_post = MagicMock()
+
+        handlers = [
+            MagicMock(backup_app=component) for component in components
+        ]
+        shutdown_services.side_effect = lambda components_: [
+            handler for handler in handlers
+            if handler.backup_app in components_
+        ]
+
+        packet1 = api.Packet('backup', 'apps', '/', components[:1])
+        packet2 = api.Packet('backup', 'apps', '/', components)
+        with api._backup_window(packet1):
+            shutdown_services.assert_called_once_with(components[:1])
+            with api._backup_window(packet2):
+                shutdown_services.assert_called_with(components[1:])
+                assert apps[0].locked and apps[1].locked
+
+            restore_services.assert_called_once_with(handlers[1:])
+            components[1].backup_post.assert_called_once_with(packet2)
+            components[0].backup_post.assert_not_called()
+            assert apps[0].locked and not apps[1].locked
+
+        restore_services.assert_called_with(handlers[:1])
+        components[0].backup_pre.assert_called_once_with(packet1)
+        components[0].backup_post.assert_called_once_with(packet1)
+        assert not apps[0].locked
+        assert not api._window
+
     @staticmethod
     def test__run_operation():
         """Test that operation runs handler and app hooks."""
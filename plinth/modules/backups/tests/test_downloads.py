@@ -0,0 +1,200 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test staging exported archives for downloading.
+"""
+
+import subprocess
+from unittest.mock import Mock, patch
+
+import pytest
+
+from plinth.modules.backups import downloads, privileged
+from plinth.modules.backups.errors import TooManyExportsError
+
+
+@pytest.fixture(name='staging_directory', autouse=True)
+def fixture_staging_directory(tmp_path):
+    """Use a temporary staging directory and forget exports."""
+    with patch('plinth.cfg.data_dir', str(tmp_path)), \
+         patch('plinth.modules.backups.downloads._exports', {}), \
+         patch('plinth.modules.backups.downloads._streams', set()):
+        yield tmp_path / 'backups-downloads'
+
+
+def _get_repository(tmp_path, data=b'archive data', returncode=0):
+    """Return a repository whose exports write given data."""
+    data_file = tmp_path / 'archive.tar'
+    data_file.write_bytes(data)
+    repository = Mock(uuid='test-uuid')
+    repository.get_archive_size.return_value = len(data)
+    repository.export_archive.side_effect = lambda *args: subprocess.Popen(
+        ['sh', '-c', f'cat "{data_file}"; exit {returncode}'],
+        stdout=subprocess.PIPE)
+    return repository
+
+
+def test_get_export(tmp_path, staging_directory):
+    """Test that exports are staged, reused and removed when expired."""
+    repository = _get_repository(tmp_path,
+                                 b'x' * (downloads.CHUNK_SIZE + 10))
+    archive = {'id': 'test-id', 'name': 'test-archive'}
+    export = downloads.get_export(repository, archive, 'gzip', 1)
+    data = b''.join(export.open())
+    assert data == b'x' * (downloads.CHUNK_SIZE + 10)
+    assert export.get_size() == len(data)
+    assert b''.join(export.open(5, 10)) == b'xxxxx'
+    repository.export_archive.assert_called_once_with(
+        'test-archive', 'gzip', 1)
+
+    assert downloads.get_export(repository, archive, 'gzip', 1) is export
+    other_export = downloads.get_export(repository, archive, 'none', None)
+    assert other_export is not export
+    b''.join(other_export.open())
+    assert len(list(staging_directory.iterdir())) == 2
+
+    export.last_used -= downloads.STAGING_TIMEOUT + 1
+    downloads.get_export(repository, archive, 'none', None)
+    assert [str(path) for path in staging_directory.iterdir()] == \
+        [other_export.path]
+
+    # Staging files left over from a previous run are removed
+    (staging_directory / 'left-over').write_bytes(b'')
+    downloads.get_export(repository, archive, 'none', None)
+    assert len(list(staging_directory.iterdir())) == 1
+
+
+def test_get_export_error(tmp_path):
+    """Test that failed exports are reported and not reused."""
+    repository = _get_repository(tmp_path, returncode=2)
+    archive = {'id': 'test-id', 'name': 'test-archive'}
+    export = downloads.get_export(repository, archive, 'gzip', 1)
+    with pytest.raises(RuntimeError):
+        b''.join(export.open())
+
+    assert downloads.get_export(repository, archive, 'gzip', 1) is not export
+
+
+def test_stream_export(tmp_path, staging_directory):
+    """Test that exports are streamed without staging by default."""
+    repository = _get_repository(tmp_path)
+    archive = {'id': 'test-id', 'name': 'test-archive'}
+    export = downloads.stream_export(repository, archive, 'gzip', 1)
+    assert export.etag is None
+    assert export.get_size() is None
+    assert b''.join(export.open()) == b'archive data'
+    export.close()
+    assert not staging_directory.exists()
+    repository.get_archive_size.assert_not_called()
+
+
+def test_get_export_without_free_space(tmp_path, staging_directory):
+    """Test that exports are streamed when there is no space for staging."""
+    repository = _get_repository(tmp_path)
+    archive = {'id': 'test-id', 'name': 'test-archive'}
+    with patch('shutil.disk_usage') as disk_usage:
+        disk_usage.return_value = Mock(free=downloads.MINIMUM_FREE_SPACE +
+                                       len(b'archive data') - 1)
+        export = downloads.get_export(repository, archive, 'gzip', 1)
+
+    repository.get_archive_size.assert_called_once_with('test-archive')
+    assert export.etag is None
+    assert b''.join(export.open()) == b'archive data'
+    export.close()
+    assert not list(staging_directory.iterdir())
+
+
+@patch('plinth.modules.backups.downloads.FREE_SPACE_CHECK_CHUNKS', 1)
+def test_get_export_free_space_runs_low(tmp_path, staging_directory):
+    """Test that staging stops when free space runs low while writing."""
+    repository = _get_repository(tmp_path)
+    archive = {'id': 'test-id', 'name': 'test-archive'}
+    with patch('shutil.disk_usage') as disk_usage:
+        disk_usage.side_effect = [
+            Mock(free=downloads.MINIMUM_FREE_SPACE + 100),
+            Mock(free=downloads.MINIMUM_FREE_SPACE - 1)
+        ]
+        export = downloads.get_export(repository, archive, 'gzip', 1)
+        with pytest.raises(RuntimeError):
+            b''.join(export.open())
+
+    assert isinstance(export.error, OSError)
+
+
+def test_get_export_limit():
+    """Test that the number of running exports is limited."""
+    processes = []
+
+    def export_archive(*args):
+        process = subprocess.Popen(['sleep', '10'], stdout=subprocess.PIPE)
+        processes.append(process)
+        return process
+
+    repository = Mock(uuid='test-uuid')
+    repository.get_archive_size.return_value = 0
+    repository.export_archive.side_effect = export_archive
+    archives = [{
+        'id': f'test-id{index}',
+        'name': 'test-archive'
+    } for index in range(downloads.MAX_EXPORTS + 1)]
+    try:
+        # Staged and streamed exports both count
+        exports = [
+            downloads.get_export(repository, archives[0], 'gzip', 1),
+            downloads.stream_export(repository, archives[1], 'gzip', 1)
+        ]
+        with pytest.raises(TooManyExportsError):
+            downloads.get_export(repository, archives[-1], 'gzip', 1)
+
+        with pytest.raises(TooManyExportsError):
+            downloads.stream_export(repository, archives[-1], 'gzip', 1)
+
+        # Running exports are still reused
+        assert downloads.get_export(repository, archives[0], 'gzip',
+                                    1) is exports[0]
+    finally:
+        for process in processes:
+            process.kill()
+
+    for export in exports:
+        with pytest.raises(RuntimeError):
+            b''.join(export.open())
+
+    exports[1].close()
+    downloads.get_export(repository, archives[-1], 'gzip', 1)
+    processes[-1].kill()
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 100)),
+    ('bytes=100-', (100, 1000)),
+    ('bytes=900-2000', (900, 1000)),
+    ('bytes=-100', (900, 1000)),
+    ('bytes=-2000', (0, 1000)),
+    ('bytes=10-5', None),
+    ('bytes=0-1,5-6', None),
+    ('items=0-1', None),
+    ('bytes=-', None),
+])
+def test_parse_range(header, expected):
+    """Test parsing byte range requests."""
+    assert downloads.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=-0'])
+def test_parse_range_unsatisfiable(header):
+    """Test that ranges outside the content are rejected."""
+    with pytest.raises(ValueError):
+        downloads.parse_range(header, 1000)
+
+
+def test_get_tar_filter():
+    """Test choosing the compression of exported archives."""
+    assert privileged._get_tar_filter('none', None) is None
+    assert privileged._get_tar_filter('gzip', None) == 'gzip'
+    assert privileged._get_tar_filter('gzip', 1) == 'gzip -1'
+    assert privileged._get_tar_filter('zstd', 3) == 'zstd -T0 -3'
+    with pytest.raises(ValueError):
+        privileged._get_tar_filter('gzip', 10)
+
+    with pytest.raises(ValueError):
+        privileged._get_tar_filter('bzip2', None)
@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test the index of archives kept for repositories.
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from plinth.modules.backups import store
+from plinth.modules.backups.repository import BorgRepository
+
+pytestmark = pytest.mark.django_db
+
+_archives = [
+    {
+        'id': 'id1',
+        'name': 'archive1',
+        'start': '2024-01-01T00:00:00.000000',
+        'comment': ''
+    },
+    {
+        'id': 'id2',
+        'name': 'archive2',
+        'start': '2024-01-02T00:00:00.000000',
+        'comment': ''
+    },
+]
+
+
+@pytest.fixture(name='privileged')
+def fixture_privileged():
+    """Patch privileged actions accessing the repository."""
+    with patch('plinth.modules.backups.repository.privileged') as privileged:
+        privileged.get_repository_state.return_value = 'repo:1'
+        privileged.list_repo.return_value = {'archives': list(_archives)}
+        privileged.get_archive_apps.return_value = ['app1']
+        yield privileged
+
+
+def test_list_archives(privileged):
+    """Test that archives are listed with borg only when changed."""
+    repository = BorgRepository('/test/repo', uuid='test-uuid')
+    expected = [_archives[1], _archives[0]]
+    assert repository.list_archives() == expected
+    assert repository.list_archives() == expected
+    assert repository.get_archive('archive1') == _archives[0]
+    assert repository.get_archive('archive3') is None
+    assert privileged.list_repo.call_count == 1
+
+    privileged.get_repository_state.return_value = 'repo:2'
+    assert repository.list_archives() == expected
+    assert privileged.list_repo.call_count == 2
+
+    # Repository that is not available is not indexed
+    privileged.get_repository_state.return_value = None
+    repository.list_archives()
+    repository.list_archives()
+    assert privileged.list_repo.call_count == 4
+
+    repository.save()
+    repository.remove()
+    assert store.get_archive_index('test-uuid') is None
+
+
+def test_delete_archive(privileged):
+    """Test that deleting an archive updates the index."""
+    repository = BorgRepository('/test/repo', uuid='test-uuid')
+    repository.list_archives()
+    privileged.get_repository_state.side_effect = ['repo:1', 'repo:2']
+    repository.delete_archive('archive1')
+    privileged.get_repository_state.side_effect = None
+    privileged.get_repository_state.return_value = 'repo:2'
+    assert repository.list_archives() == [_archives[1]]
+    assert privileged.list_repo.call_count == 1
+
+
+def test_get_archive_apps(privileged):
+    """Test that apps in an archive are read from it only once."""
+    repository = BorgRepository('/test/repo', uuid='test-uuid')
+    assert repository.get_archive_apps('archive1') == ['app1']
+    assert repository.get_archive_apps('archive1') == ['app1']
+    privileged.get_archive_apps.assert_called_once()
+
+    # Apps of archives still in the repository are kept
+    privileged.get_repository_state.return_value = 'repo:2'
+    assert repository.get_archive_apps('archive1') == ['app1']
+    privileged.get_archive_apps.assert_called_once()
+
+
+def test_delete_archives(privileged):
+    """Test that multiple archives are deleted together."""
+    repository = BorgRepository('/test/repo', uuid='test-uuid')
+    repository.list_archives()
+    privileged.get_repository_state.side_effect = ['repo:1', 'repo:2']
+    repository.delete_archives(['archive1', 'archive2'])
+    privileged.delete_archives.assert_called_once_with(
+        '/test/repo', ['archive1', 'archive2'], None)
+    privileged.get_repository_state.side_effect = None
+    privileged.get_repository_state.return_value = 'repo:2'
+    assert repository.list_archives() == []
+    assert privileged.list_repo.call_count == 1
+
+
+@patch('plinth.modules.backups.api.backup_apps')
+def test_create_archive(backup_apps, privileged):
+    """Test that creating an archive adds only it to the index."""
+    repository = BorgRepository('/test/repo', uuid='test-uuid')
+    repository.list_archives()
+    archive = {
+        'id': 'id3',
+        'name': 'archive3',
+        'start': '2024-01-03T00:00:00.000000',
+        'comment': ''
+    }
+    privileged.list_repo.return_value = {'archives': [archive]}
+    privileged.get_repository_state.side_effect = ['repo:1', 'repo:2']
+    repository.create_archive('archive3', ['app1', 'app2'])
+    backup_apps.assert_called_once()
+    privileged.list_repo.assert_called_with('/test/repo', None, 'archive3')
+    privileged.get_repository_state.side_effect = None
+    privileged.get_repository_state.return_value = 'repo:2'
+    assert repository.list_archives() == [archive, _archives[1], _archives[0]]
+    assert privileged.list_repo.call_count == 2
+    assert repository.get_archive_apps('archive3') == ['app1', 'app2']
+    privileged.get_archive_apps.assert_not_called()
@@ -4,6 +4,7 @@ Test scheduling of backups.
 """
 
 import json
+import threading
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock, call, patch
 
@@ -472,7 +473,52 @@ def test_run_schedule(get_instance, get_setup_state, schedule_params,
                 [call(name, app_ids, archive_comment=archive_comment)])
 
         if not cleanups:
-            repository.delete_archive.assert_not_called()
+            repository.delete_archives.assert_not_called()
         else:
-            calls = [call(name) for name in cleanups]
-            repository.delete_archive.assert_has_calls(calls)
+            repository.delete_archives.assert_called_once_with(cleanups)
+
+
+@patch('plinth.modules.backups._show_schedule_error_notification')
+@patch('plinth.modules.backups.repository.get_repositories')
+def test_backup_by_schedule(get_repositories, show_notification):
+    """Test that repositories are backed up in parallel with a timeout."""
+    from plinth.modules import backups
+
+    started = threading.Barrier(2, timeout=5)
+    release = threading.Event()
+
+    def _run_slow():
+        started.wait()
+        release.wait(5)
+        return True
+
+    def _run_fast():
+        started.wait()  # Only passes when both run at the same time
+        return False
+
+    slow, fast, error = (MagicMock(uuid=uuid)
+                         for uuid in ('slow', 'fast', 'error'))
+    slow.schedule.run_schedule.side_effect = _run_slow
+    fast.schedule.run_schedule.side_effect = _run_fast
+    error.schedule.run_schedule.side_effect = RuntimeError('test error')
+    get_repositories.return_value = [slow, fast, error]
+    with patch.object(backups, 'BACKUP_TIMEOUT', 0.5), \
+         patch.object(backups, 'job_metrics', {}) as job_metrics:
+        try:
+            backups.backup_by_schedule(None)
+            assert job_metrics['slow']['result'] == 'failed'
+            assert job_metrics['slow']['duration'] >= 0.5
+            assert job_metrics['fast']['result'] == 'not due'
+            assert job_metrics['error']['result'] == 'failed'
+            assert show_notification.call_count == 3
+            show_notification.assert_any_call(fast, is_error=False)
+
+            # Repository with the abandoned backup is skipped
+            fast.schedule.run_schedule.side_effect = None
+            fast.schedule.run_schedule.return_value = True
+            backups.backup_by_schedule(None)
+            assert job_metrics['slow']['result'] == 'skipped'
+            assert job_metrics['fast']['result'] == 'backed up'
+            assert slow.schedule.run_schedule.call_count == 1
+        finally:
+            release.set()
@@ -12,7 +12,7 @@ from urllib.parse import unquote
 import paramiko
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import Http404, StreamingHttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
@@ -24,9 +24,10 @@ from plinth.errors import PlinthError
 from plinth.modules import backups, storage
 from plinth.views import AppView
 
-from . import (SESSION_PATH_VARIABLE, api, forms, get_known_hosts_path,
-               is_ssh_hostkey_verified, privileged)
+from . import (SESSION_PATH_VARIABLE, api, downloads, forms,
+               get_known_hosts_path, is_ssh_hostkey_verified, privileged)
 from .decorators import delete_tmp_backup_file
+from .errors import TooManyExportsError
 from .repository import (BorgRepository, SshBorgRepository, get_instance,
                          get_repositories)
 
@@ -46,6 +47,7 @@ class BackupsView(AppView):
         context['repositories'] = [
             repository.get_view_content() for repository in get_repositories()
         ]
+        context['download_compressions'] = downloads.get_compressions()
         return context
 
 
@@ -275,17 +277,86 @@ class RestoreArchiveView(BaseRestoreView):
 
 
 class DownloadArchiveView(View):
-    """View to export and download an archive as stream."""
+    """View to export and download an archive as stream.
+
+    The compression is chosen with the 'compression' and 'level' query
+    parameters. With the 'resumable' query parameter, the export is staged
+    and single byte ranges are served once it is finished so that
+    interrupted downloads can be resumed.
+    """
 
     def get(self, request, uuid, name):
+        compression = request.GET.get('compression', 'gzip')
+        if compression not in downloads.get_compressions():
+            raise Http404
+
+        options = downloads.COMPRESSIONS[compression]
+        level = request.GET.get('level')
+        if level is None:
+            level = options['level']
+        elif not level.isdigit() or int(level) not in options['levels']:
+            raise Http404
+        else:
+            level = int(level)
+
         repository = get_instance(uuid)
-        filename = f'{name}.tar.gz'
+        archive = repository.get_archive(name)
+        if not archive:
+            raise Http404
+
+        if request.GET.get('resumable'):
+            get_export = downloads.get_export
+        else:
+            get_export = downloads.stream_export
+
+        try:
+            export = get_export(repository, archive, compression, level)
+        except TooManyExportsError:
+            messages.error(
+                request,
+                _('Too many downloads are being prepared. Try again later.'))
+            return redirect(reverse_lazy('backups:index'))
+
+        filename = name + options['extension']
+        return _get_download_response(request, export, filename,
+                                      options['content_type'])
+
+
+def _get_download_response(request, export, filename, content_type):
+    """Return a response with the whole or a requested range of an export."""
+    status, start, end = 200, 0, None
+    size = export.get_size()
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if size is not None and header and if_range in (None, export.etag):
+        try:
+            byte_range = downloads.parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range:
+            status = 206
+            start, end = byte_range
+
+    response = StreamingHttpResponse(export.open(start, end), status=status,
+                                     content_type=content_type)
+    if size is not None:
+        response['Content-Length'] = str((end or size) - start)
+
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+
+    if export.etag:
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = export.etag
+    else:
+        response['Accept-Ranges'] = 'none'
 
-        response = StreamingHttpResponse(repository.get_download_stream(name),
-                                         content_type='application/gzip')
-        response['Content-Disposition'] = 'attachment; filename="%s"' % \
-            filename
-        return response
+    response['Content-Disposition'] = 'attachment; filename="%s"' % \
+        filename
+    return response
 
 
 class AddRepositoryView(SuccessMessageMixin, FormView):
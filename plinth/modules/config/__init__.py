@@ -3,11 +3,10 @@
 
 import socket
 
-import augeas
 from django.utils.translation import gettext_lazy as _
 
 from plinth import app as app_module
-from plinth import frontpage, menu
+from plinth import augeas_cache, frontpage, menu
 from plinth.daemon import RelatedDaemon
 from plinth.modules.apache import (get_users_with_website, user_of_uws_url,
                                    uws_url_of_user)
@@ -158,18 +157,11 @@ def _home_page_scid2url(shortcut_id):
 def _get_home_page_url():
     """Get the default application for the domain."""
     conf_file = privileged.APACHE_HOMEPAGE_CONFIG
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-    aug.set('/augeas/load/Httpd/lens', 'Httpd.lns')
-    aug.set('/augeas/load/Httpd/incl[last() + 1]', conf_file)
-    aug.load()
-
-    aug.defvar('conf', '/files' + conf_file)
-
-    for match in aug.match('/files' + conf_file +
-                           '/directive["RedirectMatch"]'):
-        if aug.get(match + "/arg[1]") == '''"^/$"''':
-            return aug.get(match + "/arg[2]").strip('"')
+    with augeas_cache.read('Httpd', conf_file) as aug:
+        for match in aug.match('/files' + conf_file +
+                               '/directive["RedirectMatch"]'):
+            if aug.get(match + "/arg[1]") == '''"^/$"''':
+                return aug.get(match + "/arg[2]").strip('"')
 
     return None
 
@@ -8,6 +8,7 @@ import json
 import logging
 import pathlib
 import threading
+import time
 from copy import deepcopy
 
 import psutil
@@ -15,9 +16,10 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext_noop
 
 from plinth import app as app_module
-from plinth import daemon, glib, kvstore, menu
+from plinth import daemon, glib, kvstore, menu, utils
 from plinth import operation as operation_module
-from plinth.modules.apache.components import diagnose_url_on_all
+from plinth.modules.apache.components import (addresses_snapshot,
+                                              diagnose_url_on_all)
 from plinth.modules.backups.components import BackupRestore
 
 from . import manifest
@@ -34,6 +36,16 @@ logger = logging.Logger(__name__)
 current_results = {}
 results_lock = threading.Lock()
 
+# Number of diagnostic jobs run at the same time
+MAX_WORKERS = 4
+
+# Seconds after which diagnostics of a component or an app are abandoned
+CHECK_TIMEOUT = 120
+
+# Diagnostics of a component or an app taking longer than this many seconds
+# are logged
+SLOW_CHECK_TIME = 30
+
 
 class DiagnosticsApp(app_module.App):
     """FreedomBox app for diagnostics."""
@@ -123,29 +135,105 @@ def _run_on_all_enabled_modules():
 
         current_results['apps'] = apps
 
-    for current_index, (app_id, app) in enumerate(apps):
-        app_results = {
-            'diagnosis': [],
-            'exception': None,
-            'show_rerun_setup': False,
-        }
+    if apps:
+        # All apps check the same listening ports and addresses
+        with daemon.listening_sockets_snapshot(), addresses_snapshot():
+            _run_on_apps(apps)
+
+
+def _get_diagnose_jobs(app):
+    """Return a dictionary of names and functions that diagnose an app.
+
+    Each component of an app is diagnosed separately so that a slow component
+    does not hold back the results of others. Apps that override diagnose()
+    add their own checks to those of components and are diagnosed as a whole.
+    """
+    if type(app).diagnose is not app_module.App.diagnose:
+        return {app.app_id: app.diagnose}
+
+    return {
+        component.component_id: component.diagnose
+        for component in app.components.values()
+        if component.has_diagnostics()
+    }
+
+
+def _run_on_apps(apps):
+    """Diagnose apps in parallel and store results as each check finishes.
 
+    Diagnostic checks mostly wait for processes, network and D-Bus. So, they
+    are run in a pool of threads, one job for each component. A job that does
+    not finish within CHECK_TIMEOUT seconds is marked as failed.
+    """
+    jobs = {}
+    for app_id, app in apps:
+        for name, diagnose in _get_diagnose_jobs(app).items():
+            jobs[(app_id, name)] = diagnose
+
+    with results_lock:
+        for app_id, _app in apps:
+            current_results['results'][app_id].update({
+                'diagnosis': [],
+                'exception': None,
+                'show_rerun_setup': False,
+                'duration': 0,
+                'durations': {},
+            })
+
+        if not jobs:
+            current_results['progress_percentage'] = 100
+
+    job_results = {}
+
+    def _on_finish(key, future, start_time):
+        _store_job_results(key, future, start_time, jobs, job_results)
+
+    utils.run_in_threads(jobs, lambda diagnose: diagnose(), _on_finish,
+                         CHECK_TIMEOUT, MAX_WORKERS, 'diagnostics')
+
+
+def _store_job_results(key, future, start_time, jobs, job_results):
+    """Store the results of a diagnostic job and update progress.
+
+    If future is None, the job has timed out. 'job_results' has the checks of
+    jobs finished so far and is used to keep checks of an app in order.
+    """
+    app_id, name = key
+    duration = time.monotonic() - start_time
+    checks = []
+    exception = None
+    if future is None:
+        logger.error('Timeout running %s diagnostics of %s after %.1fs', name,
+                     app_id, duration)
+        exception = f'Diagnostics timed out after {duration:.0f} seconds'
+    else:
         try:
-            app_results['diagnosis'] = app.diagnose()
-        except Exception as exception:
-            logger.exception('Error running %s diagnostics - %s', app_id,
-                             exception)
-            app_results['exception'] = str(exception)
-
-        for check in app_results['diagnosis']:
-            if check.result in [Result.FAILED, Result.WARNING]:
-                app_results['show_rerun_setup'] = True
-                break
-
-        with results_lock:
-            current_results['results'][app_id].update(app_results)
-            current_results['progress_percentage'] = \
-                int((current_index + 1) * 100 / len(apps))
+            checks = future.result()
+        except Exception as error:
+            logger.exception('Error running %s diagnostics of %s - %s', name,
+                             app_id, error)
+            exception = str(error)
+
+    if duration > SLOW_CHECK_TIME:
+        logger.warning('Diagnostics %s of %s took %.1fs', name, app_id,
+                       duration)
+
+    with results_lock:
+        job_results[key] = checks
+        app_results = current_results['results'][app_id]
+        app_results['diagnosis'] = [
+            check for job_key in jobs if job_key[0] == app_id
+            for check in job_results.get(job_key, [])
+        ]
+        app_results['exception'] = app_results['exception'] or exception
+        app_results['duration'] += duration
+        app_results['durations'][name] = duration
+        if any(check.result in [Result.FAILED, Result.WARNING]
+               for check in checks):
+            app_results['show_rerun_setup'] = True
+
+        current_results['progress_percentage'] = \
+            int(len(job_results) * 100 / len(jobs))
 
 
 def _get_memory_info_from_cgroups():
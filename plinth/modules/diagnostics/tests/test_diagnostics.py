@@ -0,0 +1,178 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests for running diagnostics on all apps."""
+
+import collections
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plinth import app as app_module
+from plinth.modules import diagnostics
+from plinth.modules.diagnostics.check import DiagnosticCheck, Result
+
+
+class _AppTest:
+    """Fake app whose diagnostics can be controlled."""
+
+    def __init__(self, app_id, result=Result.PASSED, exception=None,
+                 event=None):
+        self.app_id = app_id
+        self.result = result
+        self.exception = exception
+        self.event = event
+
+    def diagnose(self):
+        """Return diagnostic results or raise the given exception."""
+        if self.event:
+            self.event.wait()
+
+        if self.exception:
+            raise self.exception
+
+        return [DiagnosticCheck(f'{self.app_id}-check', 'test', self.result)]
+
+
+class _ComponentTest(app_module.Component):
+    """Fake component whose diagnostics can be controlled."""
+
+    def __init__(self, component_id, result=Result.PASSED, event=None):
+        super().__init__(component_id)
+        self.result = result
+        self.event = event
+
+    def diagnose(self):
+        """Return diagnostic results after the given event is set."""
+        if self.event:
+            self.event.wait()
+
+        return [DiagnosticCheck(f'{self.component_id}-check', 'test',
+                                self.result)]
+
+
+class _ComponentAppTest(app_module.App):
+    """Fake app with components that are diagnosed separately."""
+
+    app_id = 'component-app'
+
+
+@pytest.fixture(name='empty_apps', autouse=True)
+def fixture_empty_apps():
+    """Remove all apps from global list before starting a test."""
+    app_module.App._all_apps = collections.OrderedDict()
+
+
+def _run(apps):
+    """Run diagnostics on given apps and return the results."""
+    results = {app_id: {'id': app_id} for app_id, _ in apps}
+    with diagnostics.results_lock:
+        diagnostics.current_results = {
+            'apps': apps,
+            'results': results,
+            'progress_percentage': 0
+        }
+
+    diagnostics._run_on_apps(apps)
+    return diagnostics.current_results
+
+
+def test_run_on_apps():
+    """Test that apps are diagnosed in parallel and results are stored."""
+    event = threading.Event()
+    apps = [
+        ('app1', _AppTest('app1', event=event)),
+        ('app2', _AppTest('app2', result=Result.FAILED)),
+        ('app3', _AppTest('app3', exception=RuntimeError('x'))),
+    ]
+
+    # app1 finishes only after other apps have finished
+    app3_diagnose = apps[2][1].diagnose
+
+    def diagnose():
+        try:
+            return app3_diagnose()
+        finally:
+            event.set()
+
+    apps[2][1].diagnose = diagnose
+    results = _run(apps)
+    assert results['progress_percentage'] == 100
+    app1, app2, app3 = (results['results'][app_id]
+                        for app_id in ('app1', 'app2', 'app3'))
+    assert app1['diagnosis'][0].result == Result.PASSED
+    assert not app1['show_rerun_setup']
+    assert app2['diagnosis'][0].result == Result.FAILED
+    assert app2['show_rerun_setup']
+    assert app3['diagnosis'] == []
+    assert app3['exception'] == 'x'
+    for app_results in (app1, app2, app3):
+        assert app_results['duration'] >= 0
+        assert list(app_results['durations']) == [app_results['id']]
+
+
+@patch('plinth.modules.diagnostics.MAX_WORKERS', 1)
+@patch('plinth.modules.diagnostics.CHECK_TIMEOUT', 0)
+def test_run_on_apps_timeout():
+    """Test that a hung app is marked as failed and others still run."""
+    event = threading.Event()
+    apps = [
+        ('app1', _AppTest('app1', event=event)),
+        ('app2', _AppTest('app2')),
+    ]
+    with patch.object(apps[1][1], 'diagnose',
+                      wraps=apps[1][1].diagnose) as app2_diagnose:
+        results = _run(apps)
+
+    event.set()
+    app1 = results['results']['app1']
+    assert app1['diagnosis'] == []
+    assert 'timed out' in app1['exception']
+    assert app2_diagnose.called
+    assert results['progress_percentage'] == 100
+
+
+@patch('plinth.modules.diagnostics.MAX_WORKERS', 1)
+@patch('plinth.modules.diagnostics.CHECK_TIMEOUT', 0)
+def test_run_on_apps_components():
+    """Test that components are diagnosed and timed separately."""
+    event = threading.Event()
+    app = _ComponentAppTest()
+    app.add(_ComponentTest('component-1', event=event))
+    app.add(_ComponentTest('component-2', result=Result.WARNING))
+    app.add(app_module.Component('component-3'))
+    try:
+        results = _run([(app.app_id, app)])
+    finally:
+        event.set()
+
+    app_results = results['results']['component-app']
+    assert [check.check_id for check in app_results['diagnosis']
+            ] == ['component-2-check']
+    assert 'timed out' in app_results['exception']
+    assert app_results['show_rerun_setup']
+    assert list(app_results['durations']) == ['component-1', 'component-2']
+    assert results['progress_percentage'] == 100
+
+
+def test_run_on_apps_publish_checks():
+    """Test that checks are published as each component finishes."""
+    event = threading.Event()
+    app = _ComponentAppTest()
+    app.add(_ComponentTest('component-1', event=event))
+    app.add(_ComponentTest('component-2'))
+    published = []
+
+    def on_finish(key, future, start_time, jobs, job_results):
+        store_job_results(key, future, start_time, jobs, job_results)
+        app_results = diagnostics.current_results['results']['component-app']
+        published.append([check.check_id
+                          for check in app_results['diagnosis']])
+        event.set()
+
+    store_job_results = diagnostics._store_job_results
+    with patch('plinth.modules.diagnostics._store_job_results', on_finish):
+        results = _run([(app.app_id, app)])
+
+    assert published == [['component-2-check'],
+                         ['component-1-check', 'component-2-check']]
+    assert results['progress_percentage'] == 100
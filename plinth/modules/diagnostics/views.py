@@ -12,9 +12,10 @@ from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView
 
-from plinth import operation
+from plinth import daemon, operation
 from plinth.app import App
 from plinth.modules import diagnostics
+from plinth.modules.apache.components import addresses_snapshot
 from plinth.views import AppView
 
 from .check import Result
@@ -90,7 +91,8 @@ def diagnose_app(request, app_id):
     diagnosis = None
     diagnosis_exception = None
     try:
-        diagnosis = app.diagnose()
+        with daemon.listening_sockets_snapshot(), addresses_snapshot():
+            diagnosis = app.diagnose()
     except Exception as exception:
         logger.exception('Error running %s diagnostics - %s', app_id,
                          exception)
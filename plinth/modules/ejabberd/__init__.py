@@ -134,12 +134,15 @@ class EjabberdApp(app_module.App):
         post_hostname_change.connect(on_post_hostname_change)
         domain_added.connect(on_domain_added)
 
+    def pre_install(self, old_version):
+        """Preseed the domain name before installing packages."""
+        privileged.pre_install(config.get_domainname())
+
     def setup(self, old_version):
         """Install and configure the app."""
         domainname = config.get_domainname()
         logger.info('ejabberd service domainname - %s', domainname)
 
-        privileged.pre_install(domainname)
         # XXX: Configure all other domain names
         super().setup(old_version)
         self.get_component('letsencrypt-ejabberd').setup_certificates(
@@ -3,12 +3,13 @@
 
 import contextlib
 import logging
+import threading
 
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext_noop
 
 from plinth import app as app_module
-from plinth import cfg, menu
+from plinth import cfg, dbus, menu
 from plinth.daemon import Daemon
 from plinth.modules.backups.components import BackupRestore
 from plinth.modules.diagnostics.check import DiagnosticCheck, Result
@@ -77,6 +78,13 @@ class FirewallApp(app_module.App):
                                        **manifest.backup)
         self.add(backup_restore)
 
+    def post_init(self):
+        """Perform post initialization operations."""
+        try:
+            zone_mirror.subscribe(dbus.get_connection())
+        except glib.Error as exception:
+            logger.warning('Unable to watch firewall zones: %s', exception)
+
     def setup(self, old_version):
         """Install and configure the app."""
         super().setup(old_version)
@@ -119,9 +127,7 @@ def _run_setup():
 
 def _get_dbus_proxy(object, interface):
     """Return a DBusProxy for a given firewalld object and interface."""
-    connection = gio.bus_get_sync(gio.BusType.SYSTEM)
-    return gio.DBusProxy.new_sync(connection, gio.DBusProxyFlags.NONE, None,
-                                  _DBUS_NAME, object, interface)
+    return dbus.get_proxy(_DBUS_NAME, object, interface)
 
 
 @contextlib.contextmanager
@@ -159,6 +165,9 @@ def reload():
         proxy = _get_dbus_proxy(_FIREWALLD_OBJECT, _FIREWALLD_INTERFACE)
         proxy.reload()
 
+    # Configuration objects are created again by firewalld
+    dbus.invalidate_proxies(_DBUS_NAME)
+
 
 def try_with_reload(operation):
     """Try an operation and retry after firewalld reload.
@@ -183,11 +192,131 @@ def try_with_reload(operation):
 
 def get_enabled_services(zone):
     """Return the status of various services currently enabled."""
-    with ignore_dbus_error(dbus_error='ServiceUnknown'):
-        zone_proxy = _get_dbus_proxy(_FIREWALLD_OBJECT, _ZONE_INTERFACE)
-        return zone_proxy.getServices('(s)', zone)
+    return get_enabled_services_in_zones([zone])[zone]
 
-    return []  # When firewalld is not running
+
+def get_enabled_services_in_zones(zones):
+    """Return a dictionary of services currently enabled in each zone.
+
+    Services are served from the zone mirror when it is current. Otherwise,
+    all the zones are queried together in a single round-trip.
+    """
+    return zone_mirror.get(zones)
+
+
+def _query_enabled_services(zones):
+    """Query firewalld for the services enabled in each zone."""
+    calls = [(_DBUS_NAME, _FIREWALLD_OBJECT, _ZONE_INTERFACE, 'getServices',
+              glib.Variant('(s)', (zone, ))) for zone in zones]
+    services = {}
+    for zone, result in zip(zones, dbus.call_many(calls)):
+        services[zone] = []  # When firewalld is not running
+        if not isinstance(result, glib.Error):
+            services[zone] = result[0]
+            continue
+
+        with ignore_dbus_error(dbus_error='ServiceUnknown'):
+            raise result
+
+    return services
+
+
+class ZoneMirror:
+    """In-memory copy of the services enabled in firewalld zones.
+
+    Services of a zone are queried from firewalld when first needed. After
+    that, they are kept current using the signals emitted by firewalld when a
+    service is added to or removed from a zone, when firewalld is reloaded and
+    when it is restarted. Until signals are subscribed to, such as in tests
+    and privileged actions, firewalld is queried every time.
+    """
+
+    def __init__(self):
+        """Initialize the mirror."""
+        self.is_subscribed = False
+        self._services = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, connection):
+        """Subscribe to changes in firewalld zones."""
+        for signal in ('ServiceAdded', 'ServiceRemoved'):
+            connection.signal_subscribe(_DBUS_NAME, _ZONE_INTERFACE, signal,
+                                        _FIREWALLD_OBJECT, None,
+                                        gio.DBusSignalFlags.NONE,
+                                        self._on_service_changed)
+
+        connection.signal_subscribe(_DBUS_NAME, _FIREWALLD_INTERFACE,
+                                    'Reloaded', _FIREWALLD_OBJECT, None,
+                                    gio.DBusSignalFlags.NONE,
+                                    self._on_reloaded)
+        connection.signal_subscribe('org.freedesktop.DBus',
+                                    'org.freedesktop.DBus', 'NameOwnerChanged',
+                                    '/org/freedesktop/DBus', _DBUS_NAME,
+                                    gio.DBusSignalFlags.NONE,
+                                    self._on_reloaded)
+        with self._lock:
+            self.is_subscribed = True
+
+    def get(self, zones):
+        """Return a dictionary of services enabled in each of the zones."""
+        with self._lock:
+            generation = self._generation
+            missing_zones = [zone for zone in zones
+                             if zone not in self._services]
+            services = {
+                zone: list(self._services[zone])
+                for zone in zones if zone in self._services
+            }
+
+        if not missing_zones:
+            return services
+
+        queried_services = _query_enabled_services(missing_zones)
+        services.update(queried_services)
+        with self._lock:
+            # Signals received during the query may have made it stale
+            if self.is_subscribed and generation == self._generation:
+                for zone, zone_services in queried_services.items():
+                    self._services[zone] = set(zone_services)
+
+        return services
+
+    def invalidate(self):
+        """Forget the services of all the zones."""
+        with self._lock:
+            self._services = {}
+            self._generation += 1
+
+    def update(self, zone, service, is_enabled):
+        """Record that a service has been enabled or disabled in a zone.
+
+        Called after changing firewalld so that the change is seen right away
+        instead of when its signal is dispatched.
+        """
+        with self._lock:
+            self._generation += 1
+            if zone not in self._services:
+                return
+
+            if is_enabled:
+                self._services[zone].add(service)
+            else:
+                self._services[zone].discard(service)
+
+    def _on_service_changed(self, _connection, _sender, _object_path,
+                            _interface, signal, parameters):
+        """Update the services of a zone when they change."""
+        zone, service = parameters.unpack()[:2]
+        self.update(zone, service, signal == 'ServiceAdded')
+
+    def _on_reloaded(self, *_args):
+        """Forget the services when firewalld is reloaded or restarted."""
+        logger.info('Firewalld reloaded, zone services will be queried again')
+        self.invalidate()
+
+
+zone_mirror = ZoneMirror()
 
 
 def get_port_details(service_port):
@@ -222,6 +351,8 @@ def add_service(port, zone):
         with ignore_dbus_error(service_error='ALREADY_ENABLED'):
             zone_proxy.addService('(ssi)', zone, port, 0)
 
+        zone_mirror.update(zone, port, True)
+
         config = _get_dbus_proxy(_CONFIG_OBJECT, _CONFIG_INTERFACE)
         zone_path = config.getZoneByName('(s)', zone)
         config_zone = _get_dbus_proxy(zone_path, _CONFIG_ZONE_INTERFACE)
@@ -236,6 +367,8 @@ def remove_service(port, zone):
         with ignore_dbus_error(service_error='NOT_ENABLED'):
             zone_proxy.removeService('(ss)', zone, port)
 
+        zone_mirror.update(zone, port, False)
+
         config = _get_dbus_proxy(_CONFIG_OBJECT, _CONFIG_INTERFACE)
         zone_path = config.getZoneByName('(s)', zone)
         config_zone = _get_dbus_proxy(zone_path, _CONFIG_ZONE_INTERFACE)
@@ -5,6 +5,7 @@ App component for other apps to use firewall functionality.
 
 import logging
 import re
+import threading
 from typing import ClassVar
 
 from django.utils.translation import gettext_noop
@@ -15,12 +16,19 @@ from plinth.modules.diagnostics.check import DiagnosticCheck, Result
 
 logger = logging.getLogger(__name__)
 
+# firewalld configuration is shared by all apps. Apps that are set up in
+# parallel change it and reload it one at a time.
+_firewall_lock = threading.RLock()
+
 
 class Firewall(app.FollowerComponent):
     """Component to open/close firewall ports for an app."""
 
     _all_firewall_components: ClassVar[dict[str, 'Firewall']] = {}
 
+    # Port name -> components that need the port open
+    _components_by_port: ClassVar[dict[str, list['Firewall']]] = {}
+
     def __init__(self, component_id, name=None, ports=None, is_external=False):
         """Initialize the firewall component."""
         super().__init__(component_id)
@@ -32,7 +40,20 @@ class Firewall(app.FollowerComponent):
         self.ports = ports
         self.is_external = is_external
 
+        old_component = self._all_firewall_components.get(component_id)
+        if old_component:
+            old_component._remove_from_port_index()
+
         self._all_firewall_components[component_id] = self
+        for port in self.ports:
+            self._components_by_port.setdefault(port, []).append(self)
+
+    def _remove_from_port_index(self):
+        """Remove the component from the port to components index."""
+        for port in self.ports:
+            components = self._components_by_port.get(port, [])
+            if self in components:
+                components.remove(self)
 
     @property
     def ports_details(self):
@@ -54,12 +75,15 @@ class Firewall(app.FollowerComponent):
     def enable(self):
         """Open firewall ports when the component is enabled."""
         super().enable()
-        firewall.try_with_reload(self._enable)
+        with _firewall_lock:
+            firewall.try_with_reload(self._enable)
 
     def _enable(self):
         """Open firewall ports."""
-        internal_enabled_ports = firewall.get_enabled_services(zone='internal')
-        external_enabled_ports = firewall.get_enabled_services(zone='external')
+        services = firewall.get_enabled_services_in_zones(
+            ['internal', 'external'])
+        internal_enabled_ports = services['internal']
+        external_enabled_ports = services['external']
 
         logger.info('Firewall ports opened - %s, %s', self.name, self.ports)
         for port in self.ports:
@@ -72,33 +96,31 @@ class Firewall(app.FollowerComponent):
     def disable(self):
         """Close firewall ports when the component is disabled."""
         super().disable()
-        firewall.try_with_reload(self._disable)
+        with _firewall_lock:
+            firewall.try_with_reload(self._disable)
 
     def _disable(self):
         """Close firewall ports."""
-        internal_enabled_ports = firewall.get_enabled_services(zone='internal')
-        external_enabled_ports = firewall.get_enabled_services(zone='external')
+        services = firewall.get_enabled_services_in_zones(
+            ['internal', 'external'])
+        internal_enabled_ports = services['internal']
+        external_enabled_ports = services['external']
 
         logger.info('Firewall ports closed - %s, %s', self.name, self.ports)
         for port in self.ports:
+            other_components = [
+                component for component in self._components_by_port[port]
+                if self.component_id != component.component_id
+            ]
             if port in internal_enabled_ports:
-                enabled_components_on_port = [
-                    component.is_enabled()
-                    for component in self._all_firewall_components.values()
-                    if port in component.ports
-                    and self.component_id != component.component_id
-                ]
-                if not any(enabled_components_on_port):
+                if not any(component.is_enabled()
+                           for component in other_components):
                     firewall.remove_service(port, zone='internal')
 
             if port in external_enabled_ports:
-                enabled_components_on_port = [
-                    component.is_enabled()
-                    for component in self._all_firewall_components.values()
-                    if port in component.ports and self.component_id !=
-                    component.component_id and component.is_external
-                ]
-                if not any(enabled_components_on_port):
+                if not any(component.is_enabled()
+                           for component in other_components
+                           if component.is_external):
                     firewall.remove_service(port, zone='external')
 
     @staticmethod
@@ -121,8 +143,10 @@ class Firewall(app.FollowerComponent):
 
         """
         results = []
-        internal_ports = firewall.get_enabled_services(zone='internal')
-        external_ports = firewall.get_enabled_services(zone='external')
+        services = firewall.get_enabled_services_in_zones(
+            ['internal', 'external'])
+        internal_ports = services['internal']
+        external_ports = services['external']
         for port_detail in self.ports_details:
             port = port_detail['name']
             details = ', '.join(
@@ -187,20 +211,24 @@ class FirewallLocalProtection(app.FollowerComponent):
     def enable(self):
         """Block traffic to local service from local users."""
         super().enable()
-        for port in self.tcp_ports:
-            firewall.add_passthrough('ipv6', '-A', 'INPUT', '-p', 'tcp',
-                                     '--dport', port, '-j', 'REJECT')
-            firewall.add_passthrough('ipv4', '-A', 'INPUT', '-p', 'tcp',
-                                     '--dport', port, '-j', 'REJECT')
+        with _firewall_lock:
+            for port in self.tcp_ports:
+                firewall.add_passthrough('ipv6', '-A', 'INPUT', '-p', 'tcp',
+                                         '--dport', port, '-j', 'REJECT')
+                firewall.add_passthrough('ipv4', '-A', 'INPUT', '-p', 'tcp',
+                                         '--dport', port, '-j', 'REJECT')
 
     def disable(self):
         """Unblock traffic to local service from local users."""
         super().disable()
-        for port in self.tcp_ports:
-            firewall.remove_passthrough('ipv6', '-A', 'INPUT', '-p', 'tcp',
-                                        '--dport', port, '-j', 'REJECT')
-            firewall.remove_passthrough('ipv4', '-A', 'INPUT', '-p', 'tcp',
-                                        '--dport', port, '-j', 'REJECT')
+        with _firewall_lock:
+            for port in self.tcp_ports:
+                firewall.remove_passthrough('ipv6', '-A', 'INPUT', '-p',
+                                            'tcp', '--dport', port, '-j',
+                                            'REJECT')
+                firewall.remove_passthrough('ipv4', '-A', 'INPUT', '-p',
+                                            'tcp', '--dport', port, '-j',
+                                            'REJECT')
 
     def setup(self, old_version):
         """Protect services of an app that newly introduced the feature."""
@@ -17,6 +17,7 @@ from plinth.modules.firewall.components import (Firewall,
 def fixture_empty_firewall_list():
     """Remove all entries in firewall list before starting a test."""
     Firewall._all_firewall_components = {}
+    Firewall._components_by_port = {}
 
 
 def test_init_without_arguments():
@@ -65,14 +66,14 @@ def test_port_details(get_port_details):
 
 
 @patch('plinth.modules.firewall.add_service')
-@patch('plinth.modules.firewall.get_enabled_services')
+@patch('plinth.modules.firewall.get_enabled_services_in_zones')
 def test_enable(get_enabled_services, add_service):
     """Test enabling a firewall component."""
 
-    def get_enabled_services_side_effect(zone):
-        return {'internal': ['test-port1'], 'external': ['test-port2']}[zone]
-
-    get_enabled_services.side_effect = get_enabled_services_side_effect
+    get_enabled_services.return_value = {
+        'internal': ['test-port1'],
+        'external': ['test-port2']
+    }
     # Internal
     firewall = Firewall('test-firewall-1', ports=['test-port1', 'test-port2'],
                         is_external=False)
@@ -94,7 +95,7 @@ def test_enable(get_enabled_services, add_service):
 
 @patch('plinth.modules.firewall.remove_service')
 @patch('plinth.modules.firewall.add_service')
-@patch('plinth.modules.firewall.get_enabled_services')
+@patch('plinth.modules.firewall.get_enabled_services_in_zones')
 def test_disable(get_enabled_services, add_service, remove_service):
     """Test disabling a firewall component."""
     Firewall('firewall-1', ports=['test-port1'], is_external=False)
@@ -102,13 +103,10 @@ def test_disable(get_enabled_services, add_service, remove_service):
     Firewall('firewall-3', ports=['test-port4'], is_external=True)
     Firewall('firewall-4', ports=['test-port5'], is_external=True).enable()
 
-    def get_enabled_services_side_effect(zone):
-        return {
-            'internal': ['test-port1', 'test-port2'],
-            'external': ['test-port4', 'test-port5']
-        }[zone]
-
-    get_enabled_services.side_effect = get_enabled_services_side_effect
+    get_enabled_services.return_value = {
+        'internal': ['test-port1', 'test-port2'],
+        'external': ['test-port4', 'test-port5']
+    }
     all_ports = [
         'test-port1', 'test-port2', 'test-port3', 'test-port4', 'test-port5',
         'test-port6'
@@ -131,7 +129,7 @@ def test_disable(get_enabled_services, add_service, remove_service):
 
 
 @patch('plinth.modules.firewall.get_port_details')
-@patch('plinth.modules.firewall.get_enabled_services')
+@patch('plinth.modules.firewall.get_enabled_services_in_zones')
 def test_diagnose(get_enabled_services, get_port_details):
     """Test diagnosing open/closed firewall ports."""
 
@@ -143,13 +141,10 @@ def test_diagnose(get_enabled_services, get_port_details):
             'test-port4': [(4567, 'udp')]
         }[port]
 
-    def get_enabled_services_side_effect(zone):
-        return {
-            'internal': ['test-port1', 'test-port3'],
-            'external': ['test-port2', 'test-port3']
-        }[zone]
-
-    get_enabled_services.side_effect = get_enabled_services_side_effect
+    get_enabled_services.return_value = {
+        'internal': ['test-port1', 'test-port3'],
+        'external': ['test-port2', 'test-port3']
+    }
     get_port_details.side_effect = get_port_details_side_effect
     firewall = Firewall('test-firewall-1', ports=['test-port1', 'test-port2'],
                         is_external=False)
@@ -290,3 +285,20 @@ def test_local_protection_setup(enable):
     app.enabled = True
     component.setup(old_version=1)
     enable.assert_has_calls([call()])
+
+
+def test_port_index():
+    """Test that components are indexed by the ports they need."""
+    firewall1 = Firewall('firewall-1', ports=['port1', 'port2'])
+    firewall2 = Firewall('firewall-2', ports=['port2'])
+    assert Firewall._components_by_port == {
+        'port1': [firewall1],
+        'port2': [firewall1, firewall2]
+    }
+
+    firewall3 = Firewall('firewall-1', ports=['port3'])
+    assert Firewall._components_by_port == {
+        'port1': [],
+        'port2': [firewall2],
+        'port3': [firewall3]
+    }
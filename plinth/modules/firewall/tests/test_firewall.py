@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for firewall zone mirror.
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from plinth.modules import firewall
+
+glib = firewall.glib
+
+
+@pytest.fixture(name='query')
+def fixture_query():
+    """Patch querying firewalld for enabled services."""
+    services = {
+        'internal': ['http', 'ssh'],
+        'external': ['http'],
+        'public': []
+    }
+    with patch('plinth.modules.firewall._query_enabled_services') as query:
+        query.side_effect = lambda zones: {
+            zone: list(services[zone])
+            for zone in zones
+        }
+        query.services = services
+        yield query
+
+
+@pytest.fixture(name='mirror')
+def fixture_mirror():
+    """Return a zone mirror subscribed to signals."""
+    mirror = firewall.ZoneMirror()
+    mirror.subscribe(Mock())
+    return mirror
+
+
+def _service_changed(mirror, signal, zone, service):
+    """Emit a signal about a change in services of a zone."""
+    parameters = glib.Variant('(ss)', (zone, service))
+    mirror._on_service_changed(None, None, None, None, signal, parameters)
+
+
+def test_not_subscribed(query):
+    """Test that firewalld is queried every time without signals."""
+    mirror = firewall.ZoneMirror()
+    assert mirror.get(['internal']) == {'internal': ['http', 'ssh']}
+    assert mirror.get(['internal']) == {'internal': ['http', 'ssh']}
+    assert query.call_count == 2
+
+
+def test_mirror(query, mirror):
+    """Test that services are queried once and updated by signals."""
+    services = mirror.get(['internal', 'external'])
+    assert sorted(services['internal']) == ['http', 'ssh']
+    assert services['external'] == ['http']
+    query.assert_called_once_with(['internal', 'external'])
+
+    _service_changed(mirror, 'ServiceAdded', 'external', 'ssh')
+    _service_changed(mirror, 'ServiceRemoved', 'internal', 'http')
+    _service_changed(mirror, 'ServiceAdded', 'public', 'ssh')
+    services = mirror.get(['internal', 'external'])
+    assert services['internal'] == ['ssh']
+    assert sorted(services['external']) == ['http', 'ssh']
+    assert query.call_count == 1
+
+    mirror.get(['public'])
+    query.assert_called_with(['public'])
+
+    mirror._on_reloaded()
+    mirror.get(['internal', 'external'])
+    assert query.call_count == 3
+
+
+def test_mirror_stale_query(query, mirror):
+    """Test that a query overtaken by a signal is not remembered."""
+
+    def _query(zones):
+        _service_changed(mirror, 'ServiceAdded', 'internal', 'dns')
+        return {'internal': ['http']}
+
+    query.side_effect = _query
+    assert mirror.get(['internal']) == {'internal': ['http']}
+    query.side_effect = lambda zones: {'internal': ['http', 'dns']}
+    assert mirror.get(['internal']) == {'internal': ['http', 'dns']}
+    assert query.call_count == 2
+
+
+@patch('plinth.modules.firewall._get_dbus_proxy')
+def test_add_remove_service(get_dbus_proxy, query, mirror):
+    """Test that changes made to firewalld are mirrored right away."""
+    with patch('plinth.modules.firewall.zone_mirror', mirror):
+        mirror.get(['internal'])
+        firewall.add_service('dns', 'internal')
+        assert sorted(mirror.get(['internal'])['internal']) == [
+            'dns', 'http', 'ssh'
+        ]
+
+        firewall.remove_service('http', 'internal')
+        assert sorted(mirror.get(['internal'])['internal']) == ['dns', 'ssh']
+        assert query.call_count == 1
@@ -17,8 +17,8 @@ class FirewallAppView(views.AppView):
         """Add additional context data for the template."""
         context = super().get_context_data(*args, **kwargs)
         context['components'] = components.Firewall.list()
-        internal_enabled_ports = firewall.get_enabled_services(zone='internal')
-        external_enabled_ports = firewall.get_enabled_services(zone='external')
-        context['internal_enabled_ports'] = internal_enabled_ports
-        context['external_enabled_ports'] = external_enabled_ports
+        services = firewall.get_enabled_services_in_zones(
+            ['internal', 'external'])
+        context['internal_enabled_ports'] = services['internal']
+        context['external_enabled_ports'] = services['external']
         return context
@@ -108,9 +108,10 @@ def next_step_or_none():
     """
     from plinth import kvstore
 
-    for step in _get_steps():
-        done = kvstore.get_default(step['id'], 0)
-        if not done:
+    steps = _get_steps()
+    done_steps = kvstore.get_many([step['id'] for step in steps], 0)
+    for step in steps:
+        if not done_steps[step['id']]:
             return step.get('url')
 
 
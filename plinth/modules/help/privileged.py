@@ -1,14 +1,13 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Actions for help module."""
 
-import subprocess
+from typing import Any
 
+from plinth.action_utils import read_journal
 from plinth.actions import privileged
 
 
 @privileged
-def get_logs() -> str:
-    """Get latest FreedomBox logs."""
-    command = ['journalctl', '--no-pager', '--lines=100', '--unit=plinth']
-    process = subprocess.run(command, check=True, stdout=subprocess.PIPE)
-    return process.stdout.decode()
+def get_logs(position: str | None = None) -> dict[str, Any]:
+    """Get latest FreedomBox logs or those after a journal cursor."""
+    return read_journal('plinth', position, lines=100)
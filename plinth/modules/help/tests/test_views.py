@@ -314,3 +314,14 @@ def test_download_full_manual_file(rf, tmp_path):
 
     _diff('fallback.pdf', 'unspecified.pdf', same=True)
     _diff('fallback.pdf', 'translated.pdf', same=False)
+
+
+@patch('plinth.modules.help.privileged.get_logs')
+def test_status_log_tail(get_logs, rf):
+    """Test that only lines after the given position are returned."""
+    log = {'data': 'line1\n', 'position': 's=2', 'reset': False}
+    get_logs.return_value = log
+    url = urls.reverse('help:status-log-tail')
+    response = views.status_log_tail(rf.get(url, {'plinth': 's=1'}))
+    assert json.loads(response.content) == {'logs': {'plinth': log}}
+    get_logs.assert_called_once_with('s=1')
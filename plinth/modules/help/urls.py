@@ -26,4 +26,6 @@ urlpatterns = [
             name='download-manual'),
     re_path(r'^help/status-log/$', non_admin_view(views.status_log),
             name='status-log'),
+    re_path(r'^help/status-log/tail/$', non_admin_view(views.status_log_tail),
+            name='status-log-tail'),
 ]
@@ -7,16 +7,17 @@ import mimetypes
 import os
 import pathlib
 
-import apt
 import requests
 from django.core.files.base import File
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import (Http404, HttpResponse, HttpResponseRedirect,
+                         JsonResponse)
 from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.translation import get_language_from_request
 from django.utils.translation import gettext as _
 
 from plinth import __version__, cfg
+from plinth import package as package_module
 from plinth.modules.upgrades import views as upgrades_views
 
 from . import privileged
@@ -39,34 +40,34 @@ def contribute(request):
     no_testing = []
     gift = []
     help_needed = []
-    cache = apt.Cache()
-    for issue in issues:
-        if issue['type'] == 'testing-autorm':
-            for package in issue['packages']:
+    with package_module.apt_cache() as cache:
+        for issue in issues:
+            if issue['type'] == 'testing-autorm':
+                for package in issue['packages']:
+                    try:
+                        if cache[package].is_installed:
+                            testing_autorm.append(issue)
+                            break
+                    except KeyError:
+                        pass
+            elif issue['type'] == 'no-testing':
                 try:
-                    if cache[package].is_installed:
-                        testing_autorm.append(issue)
-                        break
+                    if cache[issue['package']].is_installed:
+                        no_testing.append(issue)
+                except KeyError:
+                    pass
+            elif issue['type'] == 'gift':
+                try:
+                    if cache[issue['package']].is_installed:
+                        gift.append(issue)
+                except KeyError:
+                    pass
+            elif issue['type'] == 'help':
+                try:
+                    if cache[issue['package']].is_installed:
+                        help_needed.append(issue)
                 except KeyError:
                     pass
-        elif issue['type'] == 'no-testing':
-            try:
-                if cache[issue['package']].is_installed:
-                    no_testing.append(issue)
-            except KeyError:
-                pass
-        elif issue['type'] == 'gift':
-            try:
-                if cache[issue['package']].is_installed:
-                    gift.append(issue)
-            except KeyError:
-                pass
-        elif issue['type'] == 'help':
-            try:
-                if cache[issue['package']].is_installed:
-                    help_needed.append(issue)
-            except KeyError:
-                pass
 
     return TemplateResponse(
         request, 'help_contribute.html', {
@@ -163,6 +164,16 @@ def download_manual(request):
 
 def status_log(request):
     """Serve the last 100 lines of plinth's status log."""
-    logs = privileged.get_logs()
-    context = {'num_lines': 100, 'data': logs}
+    log = privileged.get_logs()
+    context = {'num_lines': 100, 'log': log}
     return TemplateResponse(request, 'statuslog.html', context)
+
+
+def status_log_tail(request):
+    """Return lines added to plinth's status log after the given position.
+
+    The status log page uses this when refreshed by the user to append to the
+    log instead of reloading.
+    """
+    log = privileged.get_logs(request.GET.get('plinth') or None)
+    return JsonResponse({'logs': {'plinth': log}})
@@ -1,19 +1,23 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Configure Let's Encrypt."""
 
+import datetime
 import filecmp
 import glob
 import importlib
 import inspect
+import json
 import os
 import pathlib
 import re
 import shutil
 import subprocess
 import sys
+import tempfile
 from typing import Any
 
 import configobj
+from cryptography import x509
 
 from plinth import action_utils
 from plinth import app as app_module
@@ -28,17 +32,51 @@ RENEWAL_DIRECTORY = '/etc/letsencrypt/renewal/'
 AUTHENTICATOR = 'webroot'
 WEB_ROOT_PATH = '/var/www/html'
 APACHE_PREFIX = '/etc/apache2/sites-available/'
+APACHE_SITES_ENABLED = '/etc/apache2/sites-enabled/'
+VALIDITY_CACHE_FILE = pathlib.Path(
+    '/var/cache/plinth/letsencrypt-validity.json')
 APACHE_CONFIGURATION = '''
 Use FreedomBoxTLSSiteMacro {domain}
 '''
 
 
+def _get_certificate_info(domain: str) -> dict[str, Any]:
+    """Return details of a certificate and the files they were read from.
+
+    'key' holds the modification times of the certificate and its renewal
+    configuration. It changes when the certificate is renewed or replaced.
+    """
+    certificate_file = pathlib.Path(le.LIVE_DIRECTORY) / domain / 'cert.pem'
+    renewal_file = pathlib.Path(RENEWAL_DIRECTORY) / f'{domain}.conf'
+    key = (certificate_file.stat().st_mtime_ns, _get_mtime_ns(renewal_file))
+    certificate = x509.load_pem_x509_certificate(
+        certificate_file.read_bytes())
+    try:
+        expiry = certificate.not_valid_after_utc
+    except AttributeError:  # cryptography < 42
+        expiry = certificate.not_valid_after.replace(
+            tzinfo=datetime.timezone.utc)
+
+    server = None
+    if key[1] is not None:
+        config = configobj.ConfigObj(str(renewal_file))
+        server = config.get('renewalparams', {}).get('server')
+
+    return {'key': key, 'expiry': expiry, 'server': server}
+
+
+def _get_mtime_ns(path: pathlib.Path) -> int | None:
+    """Return the modification time of a file or None if it does not exist."""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
 def _get_certificate_expiry(domain: str) -> str:
-    """Return the expiry date of a certificate."""
-    certificate_file = os.path.join(le.LIVE_DIRECTORY, domain, 'cert.pem')
-    output = subprocess.check_output(
-        ['openssl', 'x509', '-enddate', '-noout', '-in', certificate_file])
-    return output.decode().strip().split('=')[1]
+    """Return the expiry date of a certificate in the format of openssl."""
+    expiry = _get_certificate_info(domain)['expiry']
+    return f'{expiry:%b} {expiry.day:2} {expiry:%H:%M:%S %Y} GMT'
 
 
 def _get_modified_time(domain: str) -> int:
@@ -48,7 +86,74 @@ def _get_modified_time(domain: str) -> int:
 
 
 def _get_validity_status(domain: str) -> str:
-    """Return validity status of a certificate; valid, revoked, expired."""
+    """Return validity status of a certificate; valid, revoked, expired.
+
+    Checks are made in the same order as 'certbot certificates'. Only the
+    revocation check needs certbot, which asks the OCSP responder. Its answer
+    is stored in a file, because each privileged action runs in a new process,
+    and is used until the certificate or its renewal configuration changes.
+    """
+    info = _get_certificate_info(domain)
+    # Same as certbot's check for certificates from the staging server
+    if info['server'] and 'staging' in info['server']:
+        return 'test_cert'
+
+    if info['expiry'] <= datetime.datetime.now(datetime.timezone.utc):
+        return 'expired'
+
+    key = list(info['key'])
+    cache = _read_validity_cache()
+    if domain in cache and cache[domain]['key'] == key:
+        return cache[domain]['validity']
+
+    validity = _get_certbot_validity_status(domain)
+    cache[domain] = {'key': key, 'validity': validity}
+    _write_validity_cache(cache)
+    return validity
+
+
+def _read_validity_cache() -> dict[str, Any]:
+    """Return validity status of certificates reported earlier by certbot."""
+    try:
+        return json.loads(VALIDITY_CACHE_FILE.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_validity_cache(cache: dict[str, Any]):
+    """Store validity status of certificates reported by certbot.
+
+    Privileged actions may run at the same time, so each writer uses its own
+    temporary file. The cache is only an optimization, failing to write it is
+    not an error.
+    """
+    temp_file = None
+    try:
+        VALIDITY_CACHE_FILE.parent.mkdir(mode=0o700, parents=True,
+                                         exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=VALIDITY_CACHE_FILE.parent,
+                prefix=VALIDITY_CACHE_FILE.name, delete=False) as temp_file:
+            temp_file.write(json.dumps(cache))
+
+        os.replace(temp_file.name, VALIDITY_CACHE_FILE)
+    except OSError:
+        if temp_file:
+            pathlib.Path(temp_file.name).unlink(missing_ok=True)
+
+
+def _forget_certificates(domains):
+    """Forget validity status of certificates of domains."""
+    cache = _read_validity_cache()
+    if set(cache).intersection(domains):
+        _write_validity_cache({
+            domain: entry
+            for domain, entry in cache.items() if domain not in domains
+        })
+
+
+def _get_certbot_validity_status(domain: str) -> str:
+    """Return validity status of a certificate as reported by certbot."""
     output = subprocess.check_output(['certbot', 'certificates', '-d', domain])
     line = output.decode(sys.stdout.encoding)
 
@@ -78,6 +183,8 @@ def _get_status() -> dict[str, Any]:
         if os.path.isdir(os.path.join(le.LIVE_DIRECTORY, domain))
     ]
 
+    _forget_certificates(set(_read_validity_cache()).difference(domains))
+
     domain_status = {}
     for domain in domains:
         domain_status[domain] = {
@@ -86,7 +193,7 @@ def _get_status() -> dict[str, Any]:
             'expiry_date':
                 _get_certificate_expiry(domain),
             'web_enabled':
-                action_utils.webserver_is_enabled(domain, kind='site'),
+                _is_site_enabled(domain),
             'validity':
                 _get_validity_status(domain),
             'lineage':
@@ -97,6 +204,15 @@ def _get_status() -> dict[str, Any]:
     return domain_status
 
 
+def _is_site_enabled(domain):
+    """Return whether the Apache site of a domain is enabled.
+
+    Same as 'a2query -s' without starting a process for each domain.
+    """
+    return os.path.exists(os.path.join(APACHE_SITES_ENABLED,
+                                       domain + '.conf'))
+
+
 @privileged
 def setup(old_version: int):
     """Upgrade old site configuration to new macro based style.
@@ -149,6 +265,9 @@ def revoke(domain: str):
             raise RuntimeError('Error revoking certificate: {error}'.format(
                 error=stderr.decode()))
 
+        # Certificate files may be kept after revocation
+        _forget_certificates([domain])
+
     action_utils.webserver_disable(domain, kind='site')
 
 
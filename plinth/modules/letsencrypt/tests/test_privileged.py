@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test reading the status of Let's Encrypt certificates.
+"""
+
+import datetime
+import os
+from unittest.mock import call, patch
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from plinth.modules.letsencrypt import privileged
+
+
+@pytest.fixture(name='letsencrypt_dir', autouse=True)
+def fixture_letsencrypt_dir(tmp_path):
+    """Use a temporary directory for certificates and renewal configs."""
+    (tmp_path / 'live').mkdir()
+    (tmp_path / 'renewal').mkdir()
+    (tmp_path / 'sites-enabled').mkdir()
+    with patch('plinth.modules.letsencrypt.LIVE_DIRECTORY',
+               str(tmp_path / 'live')), \
+         patch('plinth.modules.letsencrypt.privileged.RENEWAL_DIRECTORY',
+               str(tmp_path / 'renewal')), \
+         patch('plinth.modules.letsencrypt.privileged.VALIDITY_CACHE_FILE',
+               tmp_path / 'cache' / 'validity.json'), \
+         patch('plinth.modules.letsencrypt.privileged.APACHE_SITES_ENABLED',
+               str(tmp_path / 'sites-enabled')):
+        yield tmp_path
+
+
+@pytest.fixture(name='certbot')
+def fixture_certbot():
+    """Patch certbot and return the mock."""
+    with patch('subprocess.check_output') as check_output:
+        check_output.return_value = b'Expiry Date: x (VALID: 89 days)\n'
+        yield check_output
+
+
+def _write_certificate(letsencrypt_dir, domain, days, mtime=1000):
+    """Write a self-signed certificate expiring after given days."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, domain)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expiry = (now + datetime.timedelta(days=days)).replace(microsecond=0)
+    certificate = x509.CertificateBuilder().subject_name(name).issuer_name(
+        name).public_key(key.public_key()).serial_number(1).not_valid_before(
+            now - datetime.timedelta(days=100)).not_valid_after(expiry).sign(
+                key, hashes.SHA256())
+
+    domain_dir = letsencrypt_dir / 'live' / domain
+    domain_dir.mkdir(exist_ok=True)
+    certificate_file = domain_dir / 'cert.pem'
+    certificate_file.write_bytes(
+        certificate.public_bytes(serialization.Encoding.PEM))
+    os.utime(certificate_file, (mtime, mtime))
+    return expiry
+
+
+def test_status(letsencrypt_dir, certbot):
+    """Test that certificates are read and certbot runs only once."""
+    expiry = _write_certificate(letsencrypt_dir, 'a.example', 30)
+    _write_certificate(letsencrypt_dir, 'b.example', 30)
+    (letsencrypt_dir / 'sites-enabled' / 'a.example.conf').write_text('')
+    with patch('subprocess.run') as subprocess_run:
+        status = privileged._get_status()
+        assert privileged._get_status() == status
+
+    subprocess_run.assert_not_called()
+    assert not status['b.example']['web_enabled']
+    del status['b.example']
+
+    assert status == {
+        'a.example': {
+            'certificate_available': True,
+            'expiry_date': expiry.strftime('%b %e %H:%M:%S %Y GMT'),
+            'web_enabled': True,
+            'validity': 'valid',
+            'lineage': str(letsencrypt_dir / 'live' / 'a.example'),
+            'modified_time': 1000
+        }
+    }
+    certbot.assert_has_calls([
+        call(['certbot', 'certificates', '-d', 'a.example']),
+        call(['certbot', 'certificates', '-d', 'b.example'])
+    ], any_order=True)
+    assert certbot.call_count == 2
+
+
+def test_validity(letsencrypt_dir, certbot):
+    """Test that validity is found without certbot when possible."""
+    _write_certificate(letsencrypt_dir, 'a.example', -1)
+    assert privileged._get_validity_status('a.example') == 'expired'
+    certbot.assert_not_called()
+
+    renewal_file = letsencrypt_dir / 'renewal' / 'a.example.conf'
+    renewal_file.write_text(
+        '[renewalparams]\n'
+        'server = https://acme-staging-v02.api.letsencrypt.org/directory\n')
+    _write_certificate(letsencrypt_dir, 'a.example', 30)
+    assert privileged._get_validity_status('a.example') == 'test_cert'
+    certbot.assert_not_called()
+
+    renewal_file.unlink()
+    certbot.return_value = b'Expiry Date: x (INVALID: REVOKED)\n'
+    assert privileged._get_validity_status('a.example') == 'revoked'
+    assert privileged._get_validity_status('a.example') == 'revoked'
+    assert certbot.call_count == 1
+
+    # Validity is remembered by the next privileged action process
+    assert privileged._get_validity_status('a.example') == 'revoked'
+    assert certbot.call_count == 1
+
+    # Renewed certificate is checked again
+    _write_certificate(letsencrypt_dir, 'a.example', 90, mtime=2000)
+    certbot.return_value = b'Expiry Date: x (VALID: 89 days)\n'
+    assert privileged._get_validity_status('a.example') == 'valid'
+    assert certbot.call_count == 2
+
+
+def test_forget_removed_domains(letsencrypt_dir, certbot):
+    """Test that certificates of removed domains are forgotten."""
+    _write_certificate(letsencrypt_dir, 'a.example', 30)
+    _write_certificate(letsencrypt_dir, 'b.example', 30)
+    privileged._get_status()
+    assert set(privileged._read_validity_cache()) == {'a.example', 'b.example'}
+
+    (letsencrypt_dir / 'live' / 'b.example' / 'cert.pem').unlink()
+    (letsencrypt_dir / 'live' / 'b.example').rmdir()
+    assert list(privileged._get_status()) == ['a.example']
+
+    assert list(privileged._read_validity_cache()) == ['a.example']
+
+
+def test_write_validity_cache(letsencrypt_dir):
+    """Test that failing to write the validity cache is not an error."""
+    privileged._write_validity_cache({'a.example': {'validity': 'valid'}})
+    assert privileged._read_validity_cache() == {
+        'a.example': {
+            'validity': 'valid'
+        }
+    }
+    assert os.listdir(letsencrypt_dir / 'cache') == ['validity.json']
+
+    with patch('os.replace', side_effect=FileNotFoundError):
+        privileged._write_validity_cache({})
+
+    assert os.listdir(letsencrypt_dir / 'cache') == ['validity.json']
+    assert privileged._read_validity_cache() == {
+        'a.example': {
+            'validity': 'valid'
+        }
+    }
@@ -1,12 +1,11 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """FreedomBox app for Minetest server."""
 
-import augeas
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 
 from plinth import app as app_module
-from plinth import cfg, frontpage, menu
+from plinth import augeas_cache, cfg, frontpage, menu
 from plinth.daemon import Daemon
 from plinth.modules.backups.components import BackupRestore
 from plinth.modules.firewall.components import Firewall
@@ -116,16 +115,6 @@ class MinetestApp(app_module.App):
         return True
 
 
-def load_augeas():
-    """Initialize Augeas."""
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-    aug.set('/augeas/load/Php/lens', 'Php.lns')
-    aug.set('/augeas/load/Php/incl[last() + 1]', CONFIG_FILE)
-    aug.load()
-    return aug
-
-
 def get_max_players(aug):
     """Return the maximum players allowed on the server at one time."""
     value = aug.get(AUG_PATH + '/max_users')
@@ -153,11 +142,12 @@ def is_damage_enabled(aug):
 
 def get_configuration():
     """Return the current configuration."""
-    aug = load_augeas()
-    conf = {
-        'max_players': get_max_players(aug),
-        'creative_mode': is_creative_mode_enabled(aug),
-        'enable_pvp': is_pvp_enabled(aug),
-        'enable_damage': is_damage_enabled(aug),
-    }
+    with augeas_cache.read('Php', CONFIG_FILE) as aug:
+        conf = {
+            'max_players': get_max_players(aug),
+            'creative_mode': is_creative_mode_enabled(aug),
+            'enable_pvp': is_pvp_enabled(aug),
+            'enable_damage': is_damage_enabled(aug),
+        }
+
     return conf
@@ -7,9 +7,7 @@ import pathlib
 import shutil
 import subprocess
 
-import augeas
-
-from plinth import action_utils
+from plinth import action_utils, augeas_cache
 from plinth.actions import privileged
 
 KEYS_DIRECTORY = pathlib.Path('/etc/openvpn/freedombox-keys')
@@ -241,9 +239,9 @@ def get_profile(username: str, remote_server: str) -> str:
 
 def set_unique_subject(value):
     """Set the unique_subject value to a particular value."""
-    aug = load_augeas()
-    aug.set('/files' + str(ATTR_FILE) + '/unique_subject', value)
-    aug.save()
+    # shell-script config file lens
+    with augeas_cache.edit('Simplevars', ATTR_FILE) as aug:
+        aug.set('/files' + str(ATTR_FILE) + '/unique_subject', value)
 
 
 def _read_file(filename):
@@ -257,18 +255,6 @@ def _is_non_empty_file(filepath):
     return os.path.isfile(filepath) and os.path.getsize(filepath) > 0
 
 
-def load_augeas():
-    """Initialize Augeas."""
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-
-    # shell-script config file lens
-    aug.set('/augeas/load/Simplevars/lens', 'Simplevars.lns')
-    aug.set('/augeas/load/Simplevars/incl[last() + 1]', str(ATTR_FILE))
-    aug.load()
-    return aug
-
-
 @privileged
 def uninstall():
     """Remove configuration directory for OpenVPN."""
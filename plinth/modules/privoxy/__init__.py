@@ -7,11 +7,10 @@ from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext_noop
 
-from plinth import action_utils
 from plinth import app as app_module
 from plinth import cfg, frontpage, menu
 from plinth.daemon import Daemon
-from plinth.modules.apache.components import diagnose_url
+from plinth.modules.apache.components import diagnose_url, get_addresses
 from plinth.modules.backups.components import BackupRestore
 from plinth.modules.firewall.components import Firewall
 from plinth.modules.users.components import UsersAndGroups
@@ -93,9 +92,12 @@ class PrivoxyApp(app_module.App):
         results.extend(diagnose_url_with_proxy())
         return results
 
+    def pre_install(self, old_version):
+        """Preseed debconf values before installing packages."""
+        privileged.pre_install()
+
     def setup(self, old_version):
         """Install and configure the app."""
-        privileged.pre_install()
         super().setup(old_version)
         privileged.setup()
         if not old_version:
@@ -107,7 +109,7 @@ def diagnose_url_with_proxy():
     url = 'https://debian.org/'  # Gives a simple redirect to www.
 
     results = []
-    for address in action_utils.get_addresses():
+    for address in get_addresses():
         proxy = 'http://{host}:8118/'.format(host=address['url_address'])
         env = {'https_proxy': proxy}
 
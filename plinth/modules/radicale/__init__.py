@@ -5,11 +5,10 @@ FreedomBox app for radicale.
 
 import logging
 
-import augeas
 from django.utils.translation import gettext_lazy as _
 
 from plinth import app as app_module
-from plinth import cfg, frontpage, menu
+from plinth import augeas_cache, cfg, frontpage, menu
 from plinth.config import DropinConfigs
 from plinth.modules.apache.components import Uwsgi, Webserver
 from plinth.modules.backups.components import BackupRestore
@@ -124,23 +123,11 @@ class RadicaleApp(app_module.App):
         return True
 
 
-def load_augeas():
-    """Prepares the augeas."""
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-
-    # INI file lens
-    aug.set('/augeas/load/Puppet/lens', 'Puppet.lns')
-    aug.set('/augeas/load/Puppet/incl[last() + 1]', CONFIG_FILE)
-
-    aug.load()
-    return aug
-
-
 def get_rights_value():
     """Returns the current Rights value."""
-    aug = load_augeas()
-    value = aug.get('/files' + CONFIG_FILE + '/rights/type')
+    # INI file lens
+    with augeas_cache.read('Puppet', CONFIG_FILE) as aug:
+        value = aug.get('/files' + CONFIG_FILE + '/rights/type')
 
     if value == 'from_file':
         # Default rights file is equivalent to owner_only.
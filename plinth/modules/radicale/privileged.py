@@ -3,9 +3,7 @@
 
 import os
 
-import augeas
-
-from plinth import action_utils
+from plinth import action_utils, augeas_cache
 from plinth.actions import privileged
 
 CONFIG_FILE = '/etc/radicale/config'
@@ -19,9 +17,9 @@ def configure(rights_type: str):
         # Default rights file is equivalent to owner_only.
         rights_type = 'from_file'
 
-    aug = load_augeas()
-    aug.set('/files' + CONFIG_FILE + '/rights/type', rights_type)
-    aug.save()
+    # INI file lens
+    with augeas_cache.edit('Puppet', CONFIG_FILE) as aug:
+        aug.set('/files' + CONFIG_FILE + '/rights/type', rights_type)
 
     action_utils.service_try_restart('uwsgi')
 
@@ -32,16 +30,3 @@ def fix_paths():
     # Workaround for bug in radicale's uwsgi script (#931201)
     if not os.path.exists(LOG_PATH):
         os.makedirs(LOG_PATH)
-
-
-def load_augeas():
-    """Initialize Augeas."""
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-
-    # INI file lens
-    aug.set('/augeas/load/Puppet/lens', 'Puppet.lns')
-    aug.set('/augeas/load/Puppet/incl[last() + 1]', CONFIG_FILE)
-
-    aug.load()
-    return aug
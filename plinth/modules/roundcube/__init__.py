@@ -93,9 +93,12 @@ class RoundcubeApp(app_module.App):
                                        **manifest.backup)
         self.add(backup_restore)
 
+    def pre_install(self, old_version):
+        """Preseed debconf values before installing packages."""
+        privileged.pre_install()
+
     def setup(self, old_version):
         """Install and configure the app."""
-        privileged.pre_install()
         super().setup(old_version)
         privileged.setup()
         if old_version == 0:
@@ -9,9 +9,7 @@ import shutil
 import stat
 import subprocess
 
-import augeas
-
-from plinth import action_utils, utils
+from plinth import action_utils, augeas_cache, utils
 from plinth.actions import privileged
 
 config_file = pathlib.Path('/etc/ssh/sshd_config.d/freedombox.conf')
@@ -114,23 +112,12 @@ def set_keys(user: str, keys: str, auth_user: str, auth_password: str):
     os.chmod(key_file_path, stat.S_IRUSR | stat.S_IWUSR)
 
 
-def _load_augeas():
-    """Initialize augeas for this app's configuration file."""
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-    aug.set('/augeas/load/Sshd/lens', 'Sshd.lns')
-    aug.set('/augeas/load/Sshd/incl[last() + 1]', '/etc/ssh/sshd_config')
-    aug.load()
-
-    return aug
-
-
 @privileged
 def is_password_authentication_enabled() -> bool:
     """Retrieve value of password authentication from sshd configuration."""
-    aug = _load_augeas()
-    field_path = '/files/etc/ssh/sshd_config/PasswordAuthentication'
-    get_value = aug.get(field_path)
+    with augeas_cache.read('Sshd', '/etc/ssh/sshd_config') as aug:
+        get_value = aug.get('PasswordAuthentication')
+
     return (get_value or 'yes') == 'yes'
 
 
@@ -138,6 +125,5 @@ def is_password_authentication_enabled() -> bool:
 def set_password_authentication(enable: bool):
     """Set value of password authentication in sshd configuration."""
     value = 'yes' if enable else 'no'
-    aug = _load_augeas()
-    aug.set('/files/etc/ssh/sshd_config/PasswordAuthentication', value)
-    aug.save()
+    with augeas_cache.edit('Sshd', '/etc/ssh/sshd_config') as aug:
+        aug.set('PasswordAuthentication', value)
@@ -4,7 +4,7 @@
 import logging
 import threading
 
-from plinth import cfg
+from plinth import cfg, dbus
 from plinth.utils import import_from_gi
 
 from . import privileged
@@ -47,9 +47,7 @@ logger = logging.getLogger(__name__)
 
 def _get_dbus_proxy(object_, interface):
     """Return a DBusProxy for a given UDisks2 object and interface."""
-    connection = gio.bus_get_sync(gio.BusType.SYSTEM)
-    return gio.DBusProxy.new_sync(connection, gio.DBusProxyFlags.NONE, None,
-                                  _DBUS_NAME, object_, interface)
+    return dbus.get_proxy(_DBUS_NAME, object_, interface)
 
 
 class Proxy:
@@ -319,6 +317,7 @@ def _on_interfaces_removed(_connection, _sender_name, _object_path,
 
     """
     object_path, _interfaces = parameters
+    dbus.invalidate_proxies(_DBUS_NAME, object_path)
     if object_path.startswith(_OBJECTS['jobs']):
         _on_job_removed(object_path)
 
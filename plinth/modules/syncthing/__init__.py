@@ -11,8 +11,7 @@ from plinth.modules.apache.components import Webserver
 from plinth.modules.backups.components import BackupRestore
 from plinth.modules.firewall.components import (Firewall,
                                                 FirewallLocalProtection)
-from plinth.modules.users import add_user_to_share_group
-from plinth.modules.users import privileged as users_privileged
+from plinth.modules.users import add_user_to_share_group, rename_group
 from plinth.modules.users.components import UsersAndGroups
 from plinth.package import Packages
 from plinth.utils import format_lazy
@@ -131,7 +130,7 @@ class SyncthingApp(app_module.App):
             old_groupname = 'syncthing'
             new_groupname = 'syncthing-access'
 
-            users_privileged.rename_group(old_groupname, new_groupname)
+            rename_group(old_groupname, new_groupname)
 
             from django.contrib.auth.models import Group
             Group.objects.filter(name=old_groupname).update(name=new_groupname)
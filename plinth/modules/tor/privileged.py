@@ -12,9 +12,7 @@ import subprocess
 import time
 from typing import Any
 
-import augeas
-
-from plinth import action_utils
+from plinth import action_utils, augeas_cache
 from plinth.actions import privileged
 
 INSTANCE_NAME = 'plinth'
@@ -63,20 +61,18 @@ def _first_time_setup():
             if not line.startswith('+'):
                 torrc.write(line)
 
-    aug = augeas_load()
-
-    aug.set(TOR_CONFIG_AUG + '/ControlPort', '9051')
-    _enable_relay(relay=True, bridge=True, aug=aug)
-    aug.set(TOR_CONFIG_AUG + '/ExitPolicy[1]', 'reject *:*')
-    aug.set(TOR_CONFIG_AUG + '/ExitPolicy[2]', 'reject6 *:*')
-
-    aug.set(TOR_CONFIG_AUG + '/HiddenServiceDir',
-            f'/var/lib/tor-instances/{INSTANCE_NAME}/hidden_service')
-    aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[1]', '22 127.0.0.1:22')
-    aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[2]', '80 127.0.0.1:80')
-    aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[3]', '443 127.0.0.1:443')
+    with augeas_cache.edit('Tor', TOR_CONFIG) as aug:
+        aug.set(TOR_CONFIG_AUG + '/ControlPort', '9051')
+        _enable_relay(relay=True, bridge=True, aug=aug)
+        aug.set(TOR_CONFIG_AUG + '/ExitPolicy[1]', 'reject *:*')
+        aug.set(TOR_CONFIG_AUG + '/ExitPolicy[2]', 'reject6 *:*')
 
-    aug.save()
+        aug.set(TOR_CONFIG_AUG + '/HiddenServiceDir',
+                f'/var/lib/tor-instances/{INSTANCE_NAME}/hidden_service')
+        aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[1]', '22 127.0.0.1:22')
+        aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[2]', '80 127.0.0.1:80')
+        aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[3]',
+                '443 127.0.0.1:443')
 
     action_utils.service_enable(SERVICE_NAME)
     action_utils.service_restart(SERVICE_NAME)
@@ -110,13 +106,10 @@ def _upgrade_orport_value():
 
     """
     logger.info('Upgrading ORPort value for Tor')
-    aug = augeas_load()
-
-    if _is_relay_enabled(aug):
-        aug.set(TOR_CONFIG_AUG + '/ORPort[1]', '9001')
-        aug.set(TOR_CONFIG_AUG + '/ORPort[2]', '[::]:9001')
-
-    aug.save()
+    with augeas_cache.edit('Tor', TOR_CONFIG) as aug:
+        if _is_relay_enabled(aug):
+            aug.set(TOR_CONFIG_AUG + '/ORPort[1]', '9001')
+            aug.set(TOR_CONFIG_AUG + '/ORPort[2]', '[::]:9001')
 
     action_utils.service_try_restart(SERVICE_NAME)
 
@@ -131,14 +124,12 @@ def _remove_proxy():
     This functionality was split off to a separate app, Tor Proxy.
     """
     logger.info('Removing SocksProxy from Tor configuration')
-    aug = augeas_load()
-    for config in [
-            'SocksPort', 'VirtualAddrNetworkIPv4', 'AutomapHostsOnResolve',
-            'TransPort', 'DNSPort'
-    ]:
-        aug.remove(TOR_CONFIG_AUG + '/' + config)
-
-    aug.save()
+    with augeas_cache.edit('Tor', TOR_CONFIG) as aug:
+        for config in [
+                'SocksPort', 'VirtualAddrNetworkIPv4',
+                'AutomapHostsOnResolve', 'TransPort', 'DNSPort'
+        ]:
+            aug.remove(TOR_CONFIG_AUG + '/' + config)
     action_utils.service_try_restart(SERVICE_NAME)
 
 
@@ -148,23 +139,28 @@ def configure(use_upstream_bridges: bool | None = None,
               bridge_relay: bool | None = None,
               hidden_service: bool | None = None):
     """Configure Tor."""
-    aug = augeas_load()
+    hidden_service_changed = False
+    with augeas_cache.edit('Tor', TOR_CONFIG) as aug:
+        _use_upstream_bridges(use_upstream_bridges, aug=aug)
 
-    _use_upstream_bridges(use_upstream_bridges, aug=aug)
+        if use_upstream_bridges:
+            relay = False
+            bridge_relay = False
 
-    if use_upstream_bridges:
-        relay = False
-        bridge_relay = False
+        if upstream_bridges:
+            _set_upstream_bridges(upstream_bridges, aug=aug)
 
-    if upstream_bridges:
-        _set_upstream_bridges(upstream_bridges, aug=aug)
+        _enable_relay(relay, bridge_relay, aug=aug)
+
+        if hidden_service:
+            hidden_service_changed = _enable_hs(aug=aug)
+        elif hidden_service is not None:
+            hidden_service_changed = _disable_hs(aug=aug)
 
-    _enable_relay(relay, bridge_relay, aug=aug)
+        hidden_service_info = _get_hidden_service(aug)
 
-    if hidden_service:
-        _enable_hs(aug=aug)
-    elif hidden_service is not None:
-        _disable_hs(aug=aug)
+    if hidden_service_changed:
+        _set_onion_header(hidden_service_info)
 
 
 @privileged
@@ -180,8 +176,10 @@ def restart():
             and action_utils.service_is_running(SERVICE_NAME)):
         action_utils.service_restart(SERVICE_NAME)
 
-        aug = augeas_load()
-        if aug.get(TOR_CONFIG_AUG + '/HiddenServiceDir'):
+        with augeas_cache.read('Tor', TOR_CONFIG) as aug:
+            hidden_service_dir = aug.get(TOR_CONFIG_AUG + '/HiddenServiceDir')
+
+        if hidden_service_dir:
             # wait until hidden service information is available
             tries = 0
             while not _get_hidden_service()['enabled']:
@@ -194,15 +192,17 @@ def restart():
 @privileged
 def get_status() -> dict[str, bool | str | dict[str, Any]]:
     """Return dict with Tor status."""
-    aug = augeas_load()
-    return {
-        'use_upstream_bridges': _are_upstream_bridges_enabled(aug),
-        'upstream_bridges': _get_upstream_bridges(aug),
-        'relay_enabled': _is_relay_enabled(aug),
-        'bridge_relay_enabled': _is_bridge_relay_enabled(aug),
-        'ports': _get_ports(),
-        'hidden_service': _get_hidden_service(aug)
-    }
+    with augeas_cache.read('Tor', TOR_CONFIG) as aug:
+        status = {
+            'use_upstream_bridges': _are_upstream_bridges_enabled(aug),
+            'upstream_bridges': _get_upstream_bridges(aug),
+            'relay_enabled': _is_relay_enabled(aug),
+            'bridge_relay_enabled': _is_bridge_relay_enabled(aug),
+            'hidden_service': _get_hidden_service(aug)
+        }
+
+    status['ports'] = _get_ports()
+    return status
 
 
 def _are_upstream_bridges_enabled(aug) -> bool:
@@ -277,14 +277,15 @@ QUIT
 
 def _get_hidden_service(aug=None) -> dict[str, Any]:
     """Return a string with configured Tor hidden service information."""
+    if not aug:
+        with augeas_cache.read('Tor', TOR_CONFIG) as aug:
+            return _get_hidden_service(aug)
+
     hs_enabled = False
     hs_status = 'Ok'
     hs_hostname = None
     hs_ports = []
 
-    if not aug:
-        aug = augeas_load()
-
     hs_dir = aug.get(TOR_CONFIG_AUG + '/HiddenServiceDir')
     hs_port_paths = aug.match(TOR_CONFIG_AUG + '/HiddenServicePort')
 
@@ -322,30 +323,22 @@ def _disable():
     action_utils.service_disable(SERVICE_NAME)
 
 
-def _use_upstream_bridges(use_upstream_bridges: bool | None = None, aug=None):
+def _use_upstream_bridges(use_upstream_bridges: bool | None, aug):
     """Enable use of upstream bridges."""
     if use_upstream_bridges is None:
         return
 
-    if not aug:
-        aug = augeas_load()
-
     if use_upstream_bridges:
         aug.set(TOR_CONFIG_AUG + '/UseBridges', '1')
     else:
         aug.set(TOR_CONFIG_AUG + '/UseBridges', '0')
 
-    aug.save()
 
-
-def _set_upstream_bridges(upstream_bridges=None, aug=None):
+def _set_upstream_bridges(upstream_bridges, aug):
     """Set list of upstream bridges."""
     if upstream_bridges is None:
         return
 
-    if not aug:
-        aug = augeas_load()
-
     aug.remove(TOR_CONFIG_AUG + '/Bridge')
     if upstream_bridges:
         bridges = [bridge.strip() for bridge in upstream_bridges.split('\n')]
@@ -358,17 +351,12 @@ def _set_upstream_bridges(upstream_bridges=None, aug=None):
     aug.set(TOR_CONFIG_AUG + '/ClientTransportPlugin',
             'obfs3,scramblesuit,obfs4 exec /usr/bin/obfs4proxy')
 
-    aug.save()
 
-
-def _enable_relay(relay: bool | None, bridge: bool | None, aug: augeas.Augeas):
+def _enable_relay(relay: bool | None, bridge: bool | None, aug):
     """Enable Tor bridge relay."""
     if relay is None and bridge is None:
         return
 
-    if not aug:
-        aug = augeas_load()
-
     use_upstream_bridges = _are_upstream_bridges_enabled(aug)
 
     if relay and not use_upstream_bridges:
@@ -387,38 +375,28 @@ def _enable_relay(relay: bool | None, bridge: bool | None, aug: augeas.Augeas):
         aug.remove(TOR_CONFIG_AUG + '/ServerTransportPlugin')
         aug.remove(TOR_CONFIG_AUG + '/ExtORPort')
 
-    aug.save()
-
-
-def _enable_hs(aug=None):
-    """Enable Tor hidden service."""
-    if not aug:
-        aug = augeas_load()
 
+def _enable_hs(aug) -> bool:
+    """Enable Tor hidden service and return whether it was changed."""
     if _get_hidden_service(aug)['enabled']:
-        return
+        return False
 
     aug.set(TOR_CONFIG_AUG + '/HiddenServiceDir',
             f'/var/lib/tor-instances/{INSTANCE_NAME}/hidden_service')
     aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[1]', '22 127.0.0.1:22')
     aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[2]', '80 127.0.0.1:80')
     aug.set(TOR_CONFIG_AUG + '/HiddenServicePort[3]', '443 127.0.0.1:443')
-    aug.save()
-    _set_onion_header(_get_hidden_service(aug))
+    return True
 
 
-def _disable_hs(aug=None):
-    """Disable Tor hidden service."""
-    if not aug:
-        aug = augeas_load()
-
+def _disable_hs(aug) -> bool:
+    """Disable Tor hidden service and return whether it was changed."""
     if not _get_hidden_service(aug)['enabled']:
-        return
+        return False
 
     aug.remove(TOR_CONFIG_AUG + '/HiddenServiceDir')
     aug.remove(TOR_CONFIG_AUG + '/HiddenServicePort')
-    aug.save()
-    _set_onion_header(None)
+    return True
 
 
 def _update_port(name, number):
@@ -463,16 +441,6 @@ def _update_ports():
     action_utils.service_restart('firewalld')
 
 
-def augeas_load():
-    """Initialize Augeas."""
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-    aug.set('/augeas/load/Tor/lens', 'Tor.lns')
-    aug.set('/augeas/load/Tor/incl[last() + 1]', TOR_CONFIG)
-    aug.load()
-    return aug
-
-
 def _set_onion_header(hidden_service):
     """Set Apache configuration for the Onion-Location header."""
     logger.info('Setting Onion-Location header for Apache')
@@ -7,10 +7,12 @@ import pathlib
 import re
 import subprocess
 import time
+from typing import Any
 
 from plinth.action_utils import (apt_hold, apt_hold_flag, apt_hold_freedombox,
                                  apt_unhold_freedombox, debconf_set_selections,
-                                 is_package_manager_busy, run_apt_command,
+                                 is_package_manager_busy, read_log_file,
+                                 run_apt_command,
                                  service_daemon_reload, service_is_running,
                                  service_restart, service_start, service_stop)
 from plinth.actions import privileged
@@ -145,24 +147,20 @@ def disable_auto():
 
 
 @privileged
-def get_log() -> str:
-    """Return the automatic upgrades log."""
-    log_lines = []
-    try:
-        log_lines.append('==> ' + os.path.basename(LOG_FILE))
-        with open(LOG_FILE, 'r', encoding='utf-8') as file_handle:
-            log_lines.append(file_handle.read())
-    except IOError:
-        pass
+def get_log(
+        positions: dict[str, str] | None = None) -> dict[str, dict[str, Any]]:
+    """Return the lines added to automatic upgrades logs after positions.
 
-    try:
-        log_lines.append('==> ' + os.path.basename(DPKG_LOG_FILE))
-        with open(DPKG_LOG_FILE, 'r', encoding='utf-8') as file_handle:
-            log_lines.append(file_handle.read())
-    except IOError:
-        pass
+    'positions' maps names of log files to positions returned earlier. Each log
+    file is read from the start when its position is not given.
+    """
+    positions = positions or {}
+    logs = {}
+    for log_file in (LOG_FILE, DPKG_LOG_FILE):
+        name = os.path.basename(log_file)
+        logs[name] = read_log_file(log_file, positions.get(name))
 
-    return '\n'.join(log_lines)
+    return logs
 
 
 def _get_protocol() -> str:
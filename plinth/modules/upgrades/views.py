@@ -3,18 +3,16 @@
 
 import subprocess
 
-from apt.cache import Cache
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.utils.translation import gettext as _
 from django.views.generic import TemplateView
 from django.views.generic.edit import FormView
 
-from plinth import __version__
+from plinth import __version__, package
 from plinth.modules import first_boot, upgrades
-from plinth.privileged import packages as packages_privileged
 from plinth.views import AppView
 
 from . import privileged
@@ -41,9 +39,8 @@ class UpgradesConfigurationView(AppView):
         context = super().get_context_data(*args, **kwargs)
         context['can_activate_backports'] = upgrades.can_activate_backports()
         context['is_backports_requested'] = upgrades.is_backports_requested()
-        context['is_busy'] = (_is_updating()
-                              or packages_privileged.is_package_manager_busy())
-        context['log'] = privileged.get_log()
+        context['is_busy'] = _is_busy()
+        context['logs'] = privileged.get_log()
         context['refresh_page_sec'] = 3 if context['is_busy'] else None
         context['version'] = __version__
         context['new_version'] = is_newer_version_available()
@@ -93,9 +90,9 @@ class UpgradesConfigurationView(AppView):
 
 def is_newer_version_available():
     """Return whether a newer Freedombox version is available."""
-    cache = Cache()
-    freedombox = cache['freedombox']
-    return not freedombox.candidate.is_installed
+    with package.apt_cache() as cache:
+        freedombox = cache['freedombox']
+        return not freedombox.candidate.is_installed
 
 
 def get_os_release():
@@ -118,6 +115,11 @@ def _is_updating():
     return str(result.stdout).startswith('activ')  # 'active' or 'activating'
 
 
+def _is_busy():
+    """Return whether an update or another package operation is running."""
+    return _is_updating() or package.is_package_manager_busy()
+
+
 def upgrade(request):
     """Serve the upgrade page."""
     if request.method == 'POST':
@@ -130,6 +132,19 @@ def upgrade(request):
     return redirect(reverse_lazy('upgrades:index'))
 
 
+def log(request):
+    """Return lines added to the upgrades logs after the given positions.
+
+    The upgrades page uses this to append to the logs while an update is
+    running instead of reloading.
+    """
+    positions = {name: position for name, position in request.GET.items()}
+    return JsonResponse({
+        'is_busy': _is_busy(),
+        'logs': privileged.get_log(positions)
+    })
+
+
 def activate_backports(request):
     """Activate backports."""
     if request.method == 'POST':
@@ -210,8 +225,7 @@ class UpdateFirstbootProgressView(TemplateView):
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
-        context['is_busy'] = (_is_updating()
-                              or packages_privileged.is_package_manager_busy())
+        context['is_busy'] = _is_busy()
         context['next_step'] = first_boot.next_step()
         context['refresh_page_sec'] = 3 if context['is_busy'] else None
         return context
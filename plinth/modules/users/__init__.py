@@ -3,14 +3,15 @@
 
 import grp
 import subprocess
+import threading
+import time
 
-import augeas
 from django.utils.text import format_lazy
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext_noop
 
 from plinth import app as app_module
-from plinth import cfg, menu
+from plinth import augeas_cache, cfg, menu
 from plinth.config import DropinConfigs
 from plinth.daemon import Daemon
 from plinth.modules.diagnostics.check import DiagnosticCheck, Result
@@ -20,6 +21,13 @@ from plinth.privileged import service as service_privileged
 from . import privileged
 from .components import UsersAndGroups
 
+# Time in seconds for which the groups of a user are remembered
+USER_GROUPS_CACHE_TTL = 300
+
+_user_groups: dict[str, tuple[float, list[str]]] = {}
+_user_groups_generation = 0
+_user_groups_lock = threading.Lock()
+
 first_boot_steps = [
     {
         'id': 'users_firstboot',
@@ -146,27 +154,21 @@ def _diagnose_nslcd_config(config, key, value):
 
 def _diagnose_nsswitch_config():
     """Diagnose that Name Service Switch is configured to use LDAP."""
-    nsswitch_conf = '/etc/nsswitch.conf'
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-    aug.transform('Nsswitch', nsswitch_conf)
-    aug.set('/augeas/context', '/files' + nsswitch_conf)
-    aug.load()
-
     results = []
     for database in ['passwd', 'group', 'shadow']:
         check_id = f'users-nsswitch-config-{database}'
         result = Result.FAILED
-        for match in aug.match('database'):
-            if aug.get(match) != database:
-                continue
+        with augeas_cache.read('Nsswitch', '/etc/nsswitch.conf') as aug:
+            for match in aug.match('database'):
+                if aug.get(match) != database:
+                    continue
 
-            for service_match in aug.match(match + '/service'):
-                if 'ldap' == aug.get(service_match):
-                    result = Result.PASSED
-                    break
+                for service_match in aug.match(match + '/service'):
+                    if 'ldap' == aug.get(service_match):
+                        result = Result.PASSED
+                        break
 
-            break
+                break
 
         description = gettext_noop('Check nsswitch config "{database}"')
         parameters = {'database': database}
@@ -186,6 +188,51 @@ def get_last_admin_user():
     return None
 
 
+def get_user_groups(username):
+    """Return the LDAP groups of a user.
+
+    Groups are remembered for a while to avoid a privileged call each time.
+    They are forgotten sooner when they are changed using this app.
+    """
+    with _user_groups_lock:
+        cached = _user_groups.get(username)
+        generation = _user_groups_generation
+
+    if cached and time.monotonic() - cached[0] < USER_GROUPS_CACHE_TTL:
+        return cached[1]
+
+    groups = privileged.get_user_groups(username)
+    with _user_groups_lock:
+        # Don't remember groups that changed while they were being read
+        if generation == _user_groups_generation:
+            _user_groups[username] = (time.monotonic(), groups)
+
+    return groups
+
+
+def invalidate_user_groups(username=None):
+    """Forget the remembered groups of a user or of all users."""
+    global _user_groups_generation
+    with _user_groups_lock:
+        _user_groups_generation += 1
+        if username:
+            _user_groups.pop(username, None)
+        else:
+            _user_groups.clear()
+
+
+def rename_group(old_groupname, new_groupname):
+    """Rename an LDAP group and forget the remembered groups of users."""
+    privileged.rename_group(old_groupname, new_groupname)
+    invalidate_user_groups()
+
+
+def remove_group(groupname):
+    """Remove an LDAP group and forget the remembered groups of users."""
+    privileged.remove_group(groupname)
+    invalidate_user_groups()
+
+
 def add_user_to_share_group(username, service=None):
     """Add user to the freedombox-share group."""
     try:
@@ -194,5 +241,6 @@ def add_user_to_share_group(username, service=None):
         group_members = []
     if username not in group_members:
         privileged.add_user_to_group(username, 'freedombox-share')
+        invalidate_user_groups(username)
         if service:
             service_privileged.try_restart(service)
@@ -20,7 +20,7 @@ import plinth.modules.ssh.privileged as ssh_privileged
 from plinth.modules import first_boot
 from plinth.utils import is_user_admin
 
-from . import get_last_admin_user, privileged
+from . import get_last_admin_user, invalidate_user_groups, privileged
 from .components import UsersAndGroups
 
 
@@ -155,17 +155,21 @@ class CreateUserForm(ValidNewUsernameCheckMixin,
                     _('Creating LDAP user failed: {error}'.format(
                         error=error)))
 
-            for group in self.cleaned_data['groups']:
-                try:
-                    privileged.add_user_to_group(user.get_username(), group,
-                                                 auth_username,
-                                                 confirm_password)
-                except Exception as error:
-                    messages.error(
-                        self.request,
-                        _('Failed to add new user to {group} group: {error}').
-                        format(group=group, error=error))
+            groups = self.cleaned_data['groups']
+            try:
+                if groups:
+                    privileged.update_user_groups(user.get_username(), groups,
+                                                  [], auth_username,
+                                                  confirm_password)
+            except Exception as error:
+                messages.error(
+                    self.request,
+                    _('Failed to add new user to groups: {error}').format(
+                        error=error))
+
+            invalidate_user_groups(user.get_username())
 
+            for group in groups:
                 group_object, created = Group.objects.get_or_create(name=group)
                 group_object.user_set.add(user)
 
@@ -263,25 +267,25 @@ class UserUpdateForm(ValidNewUsernameCheckMixin, PasswordConfirmForm,
                                    _('Renaming LDAP user failed.'))
 
             new_groups = user.groups.values_list('name', flat=True)
-            for old_group in old_groups:
-                if old_group not in new_groups:
-                    try:
-                        privileged.remove_user_from_group(
-                            user.get_username(), old_group, auth_username,
-                            confirm_password)
-                    except Exception:
-                        messages.error(self.request,
-                                       _('Failed to remove user from group.'))
-
-            for new_group in new_groups:
-                if new_group not in old_groups:
-                    try:
-                        privileged.add_user_to_group(user.get_username(),
-                                                     new_group, auth_username,
-                                                     confirm_password)
-                    except Exception:
-                        messages.error(self.request,
-                                       _('Failed to add user to group.'))
+            groups_to_add = [
+                group for group in new_groups if group not in old_groups
+            ]
+            groups_to_remove = [
+                group for group in old_groups if group not in new_groups
+            ]
+            if groups_to_add or groups_to_remove:
+                try:
+                    privileged.update_user_groups(user.get_username(),
+                                                  groups_to_add,
+                                                  groups_to_remove,
+                                                  auth_username,
+                                                  confirm_password)
+                except Exception:
+                    messages.error(self.request,
+                                   _('Failed to update user groups.'))
+
+            invalidate_user_groups(self.username)
+            invalidate_user_groups(user.get_username())
 
             try:
                 ssh_privileged.set_keys(user.get_username(),
@@ -383,6 +387,8 @@ class FirstBootForm(ValidNewUsernameCheckMixin, auth.forms.UserCreationForm):
                     _('Failed to add new user to admin group: {error}'.format(
                         error=error)))
 
+            invalidate_user_groups(user.get_username())
+
             # Create initial Django groups
             for group_choice in UsersAndGroups.get_group_choices():
                 auth.models.Group.objects.get_or_create(name=group_choice[0])
@@ -1,20 +1,19 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Configuration helper for the LDAP user directory."""
 
-import logging
+import base64
 import os
 import re
 import shutil
 import subprocess
 
-import augeas
-
-from plinth import action_utils, utils
+from plinth import action_utils, augeas_cache, utils
 from plinth.actions import privileged
 
 INPUT_LINES = None
 ACCESS_CONF = '/etc/security/access.conf'
 LDAPSCRIPTS_CONF = '/etc/ldapscripts/freedombox-ldapscripts.conf'
+GROUPS_DN = 'ou=groups,dc=thisbox'
 
 
 def _validate_user(username, password, must_be_admin=True):
@@ -159,39 +158,27 @@ def _configure_ldapscripts():
     # modify a copy of the config file
     shutil.copy('/etc/ldapscripts/ldapscripts.conf', LDAPSCRIPTS_CONF)
 
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-    aug.set('/augeas/load/Shellvars/lens', 'Shellvars.lns')
-    aug.set('/augeas/load/Shellvars/incl[last() + 1]', LDAPSCRIPTS_CONF)
-    aug.load()
-
-    # XXX: Password setting on users is disabled as changing passwords
-    # using SASL Auth is not supported.
-    aug.set('/files' + LDAPSCRIPTS_CONF + '/SERVER', '"ldapi://"')
-    aug.set('/files' + LDAPSCRIPTS_CONF + '/SASLAUTH', '"EXTERNAL"')
-    aug.set('/files' + LDAPSCRIPTS_CONF + '/SUFFIX', '"dc=thisbox"')
-    aug.set('/files' + LDAPSCRIPTS_CONF + '/USUFFIX', '"ou=Users"')
-    aug.set('/files' + LDAPSCRIPTS_CONF + '/GSUFFIX', '"ou=Groups"')
-    aug.set('/files' + LDAPSCRIPTS_CONF + '/PASSWORDGEN', '"true"')
-    aug.set('/files' + LDAPSCRIPTS_CONF + '/CREATEHOMES', '"yes"')
-    aug.save()
+    with augeas_cache.edit('Shellvars', LDAPSCRIPTS_CONF) as aug:
+        # XXX: Password setting on users is disabled as changing passwords
+        # using SASL Auth is not supported.
+        aug.set('/files' + LDAPSCRIPTS_CONF + '/SERVER', '"ldapi://"')
+        aug.set('/files' + LDAPSCRIPTS_CONF + '/SASLAUTH', '"EXTERNAL"')
+        aug.set('/files' + LDAPSCRIPTS_CONF + '/SUFFIX', '"dc=thisbox"')
+        aug.set('/files' + LDAPSCRIPTS_CONF + '/USUFFIX', '"ou=Users"')
+        aug.set('/files' + LDAPSCRIPTS_CONF + '/GSUFFIX', '"ou=Groups"')
+        aug.set('/files' + LDAPSCRIPTS_CONF + '/PASSWORDGEN', '"true"')
+        aug.set('/files' + LDAPSCRIPTS_CONF + '/CREATEHOMES', '"yes"')
 
 
 @privileged
 def get_nslcd_config():
     """Get nslcd configuration for diagnostics."""
-    nslcd_conf = '/etc/nslcd.conf'
-    aug = augeas.Augeas(flags=augeas.Augeas.NO_LOAD +
-                        augeas.Augeas.NO_MODL_AUTOLOAD)
-    aug.transform('Nslcd', nslcd_conf)
-    aug.set('/augeas/context', '/files' + nslcd_conf)
-    aug.load()
-
-    return {
-        'uri': aug.get('uri/1'),
-        'base': aug.get('base'),
-        'sasl_mech': aug.get('sasl_mech')
-    }
+    with augeas_cache.read('Nslcd', '/etc/nslcd.conf') as aug:
+        return {
+            'uri': aug.get('uri/1'),
+            'base': aug.get('base'),
+            'sasl_mech': aug.get('sasl_mech')
+        }
 
 
 def _get_samba_users():
@@ -241,8 +228,7 @@ def remove_user(username: str, password: str | None = None):
 
     _delete_samba_user(username)
 
-    for group in groups:
-        _remove_user_from_group(username, group)
+    _update_group_members(username, [], groups)
 
     _run(['ldapdeleteuser', username])
 
@@ -256,13 +242,11 @@ def rename_user(old_username: str, new_username: str):
 
     _delete_samba_user(old_username)
 
-    for group in groups:
-        _remove_user_from_group(old_username, group)
+    _update_group_members(old_username, [], groups)
 
     _run(['ldaprenameuser', old_username, new_username])
 
-    for group in groups:
-        _add_user_to_group(new_username, group)
+    _update_group_members(new_username, groups, [])
 
     _flush_cache()
 
@@ -302,67 +286,35 @@ def _get_admin_users():
 
     Raise an error if the slapd service is not running.
     """
-    admin_users = []
-
-    try:
-        output = subprocess.check_output([
-            'ldapsearch', '-LLL', '-Q', '-Y', 'EXTERNAL', '-H', 'ldapi:///',
-            '-o', 'ldif-wrap=no', '-s', 'base', '-b',
-            'cn=admin,ou=groups,dc=thisbox', 'memberUid'
-        ]).decode()
-    except subprocess.CalledProcessError as error:
-        if error.returncode == 32:
-            # no entries found
-            return []
-        raise
-
-    for line in output.splitlines():
-        if line.startswith('memberUid: '):
-            user = line.split('memberUid: ', 1)[1].strip()
-            admin_users.append(user)
-
-    return admin_users
+    entries = _search_ldap(f'cn=admin,{GROUPS_DN}', '(objectClass=*)',
+                           ['memberUid'], scope='base')
+    return entries[0].get('memberUid', []) if entries else []
 
 
 def _get_group_users(groupname):
     """Return list of members in the group."""
     try:
-        process = _run(['ldapgid', '-P', groupname], stdout=subprocess.PIPE)
+        entries = _search_ldap(f'cn={groupname},{GROUPS_DN}',
+                               '(objectClass=*)', ['memberUid'], scope='base')
     except subprocess.CalledProcessError:
-        return []  # Group does not exist
-
-    output = process.stdout.decode()
-    # extract users from output, example: 'admin:*:10001:user1,user2'
-    users = output.rsplit(':')[-1].strip().split(',')
-    if users == ['']:
         return []
-    return users
+
+    return entries[0].get('memberUid', []) if entries else []
 
 
 def _get_user_groups(username):
     """Return only the supplementary groups of the given user.
 
-    Exclude the 'users' primary group from the returned list.
+    Exclude the 'users' primary group from the returned list. Groups are
+    ordered by their group ID.
     """
-    process = _run(['ldapid', username], stdout=subprocess.PIPE, check=False)
-    output = process.stdout.decode().strip()
-    if output:
-        groups_part = output.split(' ')[2]
-        try:
-            groups = groups_part.split('=')[1]
-        except IndexError:
-            logging.warning('Could not read groups for user %s: \n%s',
-                            username, output)
-            return []
-
-        group_names = [
-            user.strip('()') for user in re.findall(r'\(.*?\)', groups)
-        ]
-        group_names.remove('users')
-        return group_names
-
-    logging.warning('User %s not found in LDAP', username)
-    return []
+    search_filter = '(&(objectClass=posixGroup)(memberUid={}))'.format(
+        _escape_filter_value(username))
+    entries = _search_ldap(GROUPS_DN, search_filter, ['cn', 'gidNumber'])
+    entries.sort(key=lambda entry: int(entry['gidNumber'][0]))
+    return [
+        entry['cn'][0] for entry in entries if entry['cn'][0] != 'users'
+    ]
 
 
 @privileged
@@ -371,10 +323,21 @@ def get_user_groups(username: str) -> list[str]:
     return _get_user_groups(username)
 
 
+def _get_existing_groups(groupnames):
+    """Return the set of groups that exist out of the given groups."""
+    if not groupnames:
+        return set()
+
+    search_filter = '(&(objectClass=posixGroup)(|{}))'.format(''.join(
+        f'(cn={_escape_filter_value(groupname)})'
+        for groupname in groupnames))
+    entries = _search_ldap(GROUPS_DN, search_filter, ['cn'], scope='one')
+    return {entry['cn'][0] for entry in entries}
+
+
 def _group_exists(groupname):
     """Return whether a group already exits."""
-    process = _run(['ldapgid', groupname], check=False)
-    return process.returncode == 0
+    return bool(_get_existing_groups([groupname]))
 
 
 def _create_group(groupname):
@@ -415,10 +378,53 @@ def remove_group(groupname: str):
         _flush_cache()
 
 
-def _add_user_to_group(username, groupname):
-    """Add an LDAP user to an LDAP group."""
-    _create_group(groupname)
-    _run(['ldapaddusertogroup', username, groupname])
+def _update_group_members(username, groups_to_add, groups_to_remove):
+    """Add a user to some groups and remove from others in one batch.
+
+    Groups that don't exist are created before adding the user to them.
+    Memberships that already are as requested are skipped as changing them
+    is an error which would abort the rest of the batch.
+    """
+    for name in [username, *groups_to_add, *groups_to_remove]:
+        _validate_name(name)
+
+    groups_to_add = list(dict.fromkeys(groups_to_add))
+    groups_to_remove = list(dict.fromkeys(groups_to_remove))
+    if not groups_to_add and not groups_to_remove:
+        return
+
+    search_filter = '(&(objectClass=posixGroup)(|{}))'.format(''.join(
+        f'(cn={_escape_filter_value(groupname)})'
+        for groupname in [*groups_to_add, *groups_to_remove]))
+    entries = _search_ldap(GROUPS_DN, search_filter, ['cn', 'memberUid'],
+                           scope='one')
+    existing_groups = {entry['cn'][0] for entry in entries}
+    member_groups = {
+        entry['cn'][0]
+        for entry in entries if username in entry.get('memberUid', [])
+    }
+
+    for groupname in groups_to_add:
+        if groupname not in existing_groups:
+            _run(['ldapaddgroup', groupname])
+
+    changes = [(groupname, 'add') for groupname in groups_to_add
+               if groupname not in member_groups]
+    changes += [(groupname, 'delete') for groupname in groups_to_remove
+                if groupname in member_groups]
+    if not changes:
+        return
+
+    # Names are validated and can be used in DNs without escaping
+    member_uid = base64.b64encode(username.encode()).decode()
+    ldif = ''.join(f'''dn: cn={groupname},{GROUPS_DN}
+changetype: modify
+{operation}: memberUid
+memberUid:: {member_uid}
+
+''' for groupname, operation in changes)
+    _run(['ldapmodify', '-Q', '-Y', 'EXTERNAL', '-H', 'ldapi:///'],
+         input=ldif.encode())
 
 
 @privileged
@@ -429,15 +435,10 @@ def add_user_to_group(username: str, groupname: str,
     if groupname == 'admin':
         _validate_user(auth_user, auth_password)
 
-    _add_user_to_group(username, groupname)
+    _update_group_members(username, [groupname], [])
     _flush_cache()
 
 
-def _remove_user_from_group(username, groupname):
-    """Remove an LDAP user from an LDAP group."""
-    _run(['ldapdeleteuserfromgroup', username, groupname])
-
-
 @privileged
 def remove_user_from_group(username: str, groupname: str, auth_user: str,
                            auth_password: str):
@@ -445,12 +446,27 @@ def remove_user_from_group(username: str, groupname: str, auth_user: str,
     if groupname == 'admin':
         _validate_user(auth_user, auth_password)
 
-    _remove_user_from_group(username, groupname)
+    _update_group_members(username, [], [groupname])
     _flush_cache()
     if groupname == 'freedombox-share':
         _disconnect_samba_user(username)
 
 
+@privileged
+def update_user_groups(username: str, groups_to_add: list[str],
+                       groups_to_remove: list[str],
+                       auth_user: str | None = None,
+                       auth_password: str | None = None):
+    """Add an LDAP user to some LDAP groups and remove from others."""
+    if 'admin' in groups_to_add or 'admin' in groups_to_remove:
+        _validate_user(auth_user, auth_password)
+
+    _update_group_members(username, groups_to_add, groups_to_remove)
+    _flush_cache()
+    if 'freedombox-share' in groups_to_remove:
+        _disconnect_samba_user(username)
+
+
 @privileged
 def get_group_users(group_name: str) -> list[str]:
     """Get the list of users of an LDAP group."""
@@ -477,6 +493,57 @@ def set_user_status(username: str, status: str, auth_user: str,
             _disconnect_samba_user(username)
 
 
+def _search_ldap(base, search_filter, attributes, scope='sub'):
+    """Search LDAP and return the found entries.
+
+    Each entry is a dictionary mapping attribute names to lists of values.
+    Return an empty list if the base object does not exist.
+    """
+    try:
+        process = _run([
+            'ldapsearch', '-LLL', '-Q', '-Y', 'EXTERNAL', '-H', 'ldapi:///',
+            '-o', 'ldif-wrap=no', '-s', scope, '-b', base, search_filter
+        ] + attributes, stdout=subprocess.PIPE)
+    except subprocess.CalledProcessError as error:
+        if error.returncode == 32:
+            # no such object
+            return []
+        raise
+
+    entries = []
+    for paragraph in process.stdout.decode().split('\n\n'):
+        entry = {}
+        for line in paragraph.splitlines():
+            name, _, value = line.partition(':')
+            if value.startswith(':'):
+                value = base64.b64decode(value[1:]).decode()
+
+            entry.setdefault(name, []).append(value.strip())
+
+        if entry:
+            entries.append(entry)
+
+    return entries
+
+
+def _validate_name(name):
+    """Raise an error if a user or group name is not acceptable.
+
+    Same as the username validation of the web interface. This keeps names
+    from changing the meaning of LDIF and other input given to LDAP tools.
+    """
+    if not re.fullmatch(r'[\w.@][\w.@-]+', name, flags=re.ASCII):
+        raise ValueError('Invalid user or group name')
+
+
+def _escape_filter_value(value):
+    """Escape special characters in a value used in an LDAP search filter."""
+    for character in '\\*()\0':
+        value = value.replace(character, '\\{:02x}'.format(ord(character)))
+
+    return value
+
+
 def _flush_cache():
     """Flush nscd and apache2 cache."""
     _run(['nscd', '--invalidate=passwd'])
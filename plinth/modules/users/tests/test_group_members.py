@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for changing group memberships with LDIF.
+"""
+
+import base64
+from unittest.mock import call, patch
+
+import pytest
+
+from plinth.modules.users import privileged
+
+
+@pytest.fixture(name='run')
+def fixture_run():
+    """Patch running LDAP tools and return the mock."""
+    with patch('plinth.modules.users.privileged._run') as run, \
+         patch('plinth.modules.users.privileged._search_ldap') as \
+         search_ldap:
+        search_ldap.return_value = [{
+            'cn': ['admin'],
+            'memberUid': ['bob', 'alice']
+        }, {
+            'cn': ['web-users'],
+            'memberUid': ['alice']
+        }, {
+            'cn': ['git-access'],
+            'memberUid': ['bob']
+        }]
+        yield run
+
+
+def test_update_group_members(run):
+    """Test that memberships are changed in one batch."""
+    privileged._update_group_members('bob', ['web-users'], ['admin'])
+    member_uid = base64.b64encode(b'bob').decode()
+    run.assert_called_once()
+    assert run.call_args.kwargs['input'].decode() == f'''\
+dn: cn=web-users,ou=groups,dc=thisbox
+changetype: modify
+add: memberUid
+memberUid:: {member_uid}
+
+dn: cn=admin,ou=groups,dc=thisbox
+changetype: modify
+delete: memberUid
+memberUid:: {member_uid}
+
+'''
+
+
+def test_update_group_members_unchanged(run):
+    """Test that memberships already as requested are skipped."""
+    privileged._update_group_members('bob', ['git-access', 'new-group'],
+                                     ['web-users', 'missing-group'])
+    member_uid = base64.b64encode(b'bob').decode()
+    assert run.call_args_list[0] == call(['ldapaddgroup', 'new-group'])
+    assert run.call_args_list[1].kwargs['input'].decode() == f'''\
+dn: cn=new-group,ou=groups,dc=thisbox
+changetype: modify
+add: memberUid
+memberUid:: {member_uid}
+
+'''
+
+    run.reset_mock()
+    privileged._update_group_members('bob', ['git-access'], ['web-users'])
+    run.assert_not_called()
+
+
+@pytest.mark.parametrize('username, groupname', [
+    ('bob\n\ndn: cn=admin,ou=groups,dc=thisbox\nchangetype: modify\n'
+     'add: memberUid\nmemberUid: eve', 'web-users'),
+    ('bob', 'web-users,ou=groups,dc=thisbox\ndn: cn=admin'),
+    ('bob', 'a+b'),
+    ('-bob', 'web-users'),
+    ('', 'web-users'),
+])
+def test_update_group_members_invalid_name(run, username, groupname):
+    """Test that names which could change the LDIF are rejected."""
+    with pytest.raises(ValueError):
+        privileged._update_group_members(username, [groupname], [])
+
+    with pytest.raises(ValueError):
+        privileged._update_group_members(username, [], [groupname])
+
+    run.assert_not_called()
@@ -388,3 +388,25 @@ def test_user_group_interactions():
     with pytest.raises(subprocess.CalledProcessError):
         privileged.remove_user_from_group(user1, random_group, admin_user,
                                           admin_password)
+
+
+def test_update_user_groups():
+    """Test adding a user to groups and removing from groups together."""
+    _create_admin_if_does_not_exist()
+    admin_user, admin_password = _get_admin_user_password()
+
+    group1, group2, group3 = (_random_string() for _ in range(3))
+    user1, _ = _create_user(groups=[group1, group2])
+
+    # Missing groups are created while other changes are made
+    privileged.update_user_groups(user1, [group3], [group1], admin_user,
+                                  admin_password)
+    _cleanup_groups.add(group3)
+    assert [group2, group3] == privileged.get_user_groups(user1)
+    assert [user1] == privileged.get_group_users(group3)
+    assert [] == privileged.get_group_users(group1)
+
+    # Removing from a group that the user is not part of fails
+    with pytest.raises(subprocess.CalledProcessError):
+        privileged.update_user_groups(user1, [], [group1], admin_user,
+                                      admin_password)
@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for remembering the groups of users.
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from plinth.modules import users
+
+
+@pytest.fixture(name='get_user_groups', autouse=True)
+def fixture_get_user_groups():
+    """Patch the privileged call and clear remembered groups."""
+    with patch('plinth.modules.users._user_groups', {}), \
+         patch('plinth.modules.users.privileged.get_user_groups') as get:
+        get.side_effect = lambda username: [username + '-group']
+        yield get
+
+
+def test_get_user_groups(get_user_groups):
+    """Test that groups are remembered until invalidated."""
+    assert users.get_user_groups('user1') == ['user1-group']
+    assert users.get_user_groups('user1') == ['user1-group']
+    assert users.get_user_groups('user2') == ['user2-group']
+    assert get_user_groups.call_count == 2
+
+    users.invalidate_user_groups('user1')
+    assert users.get_user_groups('user1') == ['user1-group']
+    assert users.get_user_groups('user2') == ['user2-group']
+    assert get_user_groups.call_count == 3
+
+    users.invalidate_user_groups()
+    assert users.get_user_groups('user2') == ['user2-group']
+    assert get_user_groups.call_count == 4
+
+
+@patch('plinth.modules.users.USER_GROUPS_CACHE_TTL', 0)
+def test_get_user_groups_expired(get_user_groups):
+    """Test that groups are read again after some time."""
+    users.get_user_groups('user1')
+    users.get_user_groups('user1')
+    assert get_user_groups.call_count == 2
+
+
+def test_get_user_groups_changed_while_reading(get_user_groups):
+    """Test that groups changed while being read are not remembered."""
+
+    def get(username):
+        users.invalidate_user_groups(username)
+        return ['old-group']
+
+    get_user_groups.side_effect = get
+    assert users.get_user_groups('user1') == ['old-group']
+    assert not users._user_groups
+
+
+@pytest.mark.parametrize('function, arguments', [
+    ('rename_group', ['group1', 'group2']),
+    ('remove_group', ['group1']),
+])
+def test_group_changes_forget_user_groups(get_user_groups, function,
+                                          arguments):
+    """Test that renaming or removing a group forgets groups of all users."""
+    users.get_user_groups('user1')
+    with patch(f'plinth.modules.users.privileged.{function}') as action:
+        getattr(users, function)(*arguments)
+
+    action.assert_called_once_with(*arguments)
+    users.get_user_groups('user1')
+    assert get_user_groups.call_count == 2
@@ -46,6 +46,7 @@ def module_patch():
     with patch('pwd.getpwall', return_value=pwd_users), \
          patch(f'{privileged}.create_user'), \
          patch(f'{privileged}.add_user_to_group'), \
+         patch(f'{privileged}.update_user_groups'), \
          patch(f'{privileged}.set_user_password'), \
          patch(f'{privileged}.set_user_status'), \
          patch(f'{privileged}.rename_user'), \
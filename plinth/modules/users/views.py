@@ -20,7 +20,7 @@ from plinth.modules import first_boot
 from plinth.utils import is_user_admin
 from plinth.views import AppView
 
-from . import get_last_admin_user, privileged
+from . import get_last_admin_user, invalidate_user_groups, privileged
 from .forms import (CreateUserForm, FirstBootForm, UserChangePasswordForm,
                     UserUpdateForm)
 
@@ -156,6 +156,8 @@ class UserDelete(ContextMixin, DeleteView):
         except Exception:
             messages.error(self.request, _('Deleting LDAP user failed.'))
 
+        invalidate_user_groups(self.kwargs['slug'])
+
     def _delete(self, *args, **kwargs):
         """Set the success message of deleting the user.
 
@@ -4,20 +4,30 @@
 import copy
 import logging
 
+from django.contrib.auth.models import Group, User
 from django.core.exceptions import ValidationError
 from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.template.exceptions import TemplateDoesNotExist
 from django.template.response import SimpleTemplateResponse
-from django.utils.translation import gettext
+from django.utils.translation import get_language, gettext
 
 from plinth import cfg
 from plinth.utils import SafeFormatter
 
-from . import db, models
+from . import db, events, models
 
 severities = {'exception': 5, 'error': 4, 'warning': 3, 'info': 2, 'debug': 1}
 logger = logging.getLogger(__name__)
 
+# Display context of each notification, keyed by notification ID. Each entry
+# is valid only for the notification's last update time and language.
+_display_cache = {}
+
+# Names of the groups each user belongs to, keyed by user ID
+_user_groups_cache = {}
+
 
 class Notification(models.StoredNotification):
     """API to create persistent global notifications to users.
@@ -168,6 +178,7 @@ class Notification(models.StoredNotification):
         except KeyError:
             return severities['info']
 
+    @db.retry_if_busy
     def dismiss(self, should_dismiss=True):
         """Mark the notification as read or unread.
 
@@ -220,6 +231,7 @@ class Notification(models.StoredNotification):
                 raise ValidationError('Invalid action class')
 
     @staticmethod
+    @db.retry_if_busy
     def update_or_create(**kwargs):
         """Update a notification or create one if necessary.
 
@@ -237,11 +249,10 @@ class Notification(models.StoredNotification):
     def get(key):  # pylint: disable=redefined-builtin
         """Return a notification object with a matching ID."""
         # pylint: disable=no-member
-        with db.lock:
-            try:
-                return Notification.objects.get(pk=key)
-            except Notification.DoesNotExist:
-                raise KeyError('No such notification')
+        try:
+            return Notification.objects.get(pk=key)
+        except Notification.DoesNotExist:
+            raise KeyError('No such notification')
 
     @staticmethod
     def list(key=None, app_id=None, user=None, dismissed=False):
@@ -270,16 +281,14 @@ class Notification(models.StoredNotification):
             filters.append(Q(app_id=app_id))
 
         if user:
-            # XXX: Consider implementing caching for user groups
-            groups = user.groups.values_list('name', flat=True)
+            groups = _get_user_groups(user)
             filters.append(Q(user__isnull=True) | Q(user=user.username))
             filters.append(Q(group__isnull=True) | Q(group__in=groups))
 
         if dismissed is not None:
             filters.append(Q(dismissed=dismissed))
 
-        with db.lock:
-            return Notification.objects.filter(*filters)[0:10]
+        return Notification.objects.filter(*filters)[0:10]
 
     @staticmethod
     def _translate(string_, data=None):
@@ -335,38 +344,114 @@ class Notification(models.StoredNotification):
 
     @staticmethod
     def get_display_context(request, user):
-        """Return a list of notifications meant for display to a user."""
+        """Return a list of notifications meant for display to a user.
+
+        Translated strings and rendered body of a notification are reused
+        until the notification is updated or the language changes. Body
+        templates may link back to the current page, so only the body rendered
+        for the last request path is kept.
+        """
         notifications = Notification.list(user=user)
         max_severity = max(notifications, default=None,
                            key=lambda note: note.severity_value)
         max_severity = max_severity.severity if max_severity else None
 
+        language = get_language()
         notes = []
         for note in notifications:
-            data = Notification._translate_dict(note.data, note.data)
-            actions = copy.deepcopy(note.actions)
-            for action in actions:
-                if 'text' in action:
-                    action['text'] = Notification._translate(
-                        action['text'], data)
-
-            note_context = {
-                'id': note.id,
-                'app_id': note.app_id,
-                'severity': note.severity,
-                'title': Notification._translate(note.title, data),
-                'message': Notification._translate(note.message, data),
-                'actions': actions,
-                'data': data,
-                'created_time': note.created_time,
-                'last_update_time': note.last_update_time,
-                'user': note.user,
-                'group': note.group,
-                'dismissed': note.dismissed,
-            }
-            body = Notification._render(request, note.body_template,
-                                        note_context)
+            cache_key = (note.last_update_time, language)
+            entry = _display_cache.get(note.id)
+            if not entry or entry['key'] != cache_key:
+                entry = {
+                    'key': cache_key,
+                    'context': note._get_context(),
+                    'rendered': (None, None)
+                }
+                _display_cache[note.id] = entry
+
+            note_context = dict(entry['context'])
+            body_path, body = entry['rendered']
+            if body_path != request.path:
+                body = Notification._render(request, note.body_template,
+                                            note_context)
+                # Path and body are replaced together as other requests may
+                # be rendering the same notification for other paths.
+                entry['rendered'] = (request.path, body)
+
             note_context['body'] = body
             notes.append(note_context)
 
         return {'notifications': notes, 'max_severity': max_severity}
+
+    def _get_context(self):
+        """Return the translated context for displaying the notification."""
+        data = Notification._translate_dict(self.data, self.data)
+        actions = copy.deepcopy(self.actions)
+        for action in actions:
+            if 'text' in action:
+                action['text'] = Notification._translate(action['text'], data)
+
+        return {
+            'id': self.id,
+            'app_id': self.app_id,
+            'severity': self.severity,
+            'title': Notification._translate(self.title, data),
+            'message': Notification._translate(self.message, data),
+            'actions': actions,
+            'data': data,
+            'created_time': self.created_time,
+            'last_update_time': self.last_update_time,
+            'user': self.user,
+            'group': self.group,
+            'dismissed': self.dismissed,
+        }
+
+
+def _get_user_groups(user):
+    """Return the names of the groups that a user belongs to."""
+    try:
+        return _user_groups_cache[user.pk]
+    except KeyError:
+        pass
+
+    groups = list(user.groups.values_list('name', flat=True))
+    if user.pk is not None:
+        _user_groups_cache[user.pk] = groups
+
+    return groups
+
+
+@receiver(post_save, sender=Notification)
+def _on_notification_post_save(sender, instance, **kwargs):
+    """Inform pages waiting for changes about the updated notification."""
+    events.stream.notify()
+
+
+@receiver(post_delete, sender=Notification)
+def _on_notification_post_delete(sender, instance, **kwargs):
+    """Drop the display context of a deleted notification."""
+    _display_cache.pop(instance.pk, None)
+    events.stream.notify()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _on_user_groups_changed(sender, instance, **kwargs):
+    """Drop cached groups of users whose group membership changed."""
+    if isinstance(instance, User):
+        _user_groups_cache.pop(instance.pk, None)
+    else:
+        _user_groups_cache.clear()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def _on_group_or_user_changed(sender, **kwargs):
+    """Drop cached groups when a group is renamed or removed."""
+    _user_groups_cache.clear()
+
+
+def clear_caches():
+    """Forget the cached display contexts and user groups."""
+    _display_cache.clear()
+    _user_groups_cache.clear()
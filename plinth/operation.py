@@ -5,9 +5,10 @@ import enum
 import logging
 import threading
 from collections import OrderedDict
-from typing import Callable
+from typing import Callable, ClassVar
 
 from . import app as app_module
+from . import events
 
 logger = logging.getLogger(__name__)
 
@@ -26,13 +27,19 @@ class Operation:
                  args: list | None = None, kwargs: dict | None = None,
                  show_message: bool = True, show_notification: bool = False,
                  thread_data: dict | None = None,
-                 on_complete: Callable | None = None):
-        """Initialize to no operation."""
+                 on_complete: Callable | None = None,
+                 allow_parallel: bool = False):
+        """Initialize to no operation.
+
+        If allow_parallel is True, the operation may run at the same time as
+        other operations that also allow running in parallel.
+        """
         self.op_id = op_id
         self.app_id = app_id
         self.name = name
         self.show_message = show_message
         self.show_notification = show_notification
+        self.allow_parallel = allow_parallel
 
         self.target = target
         self.args = args or []
@@ -147,6 +154,7 @@ class Operation:
 
     def _update_notification(self) -> None:
         """Show an updated notification if needed."""
+        events.stream.notify()
         if not self.show_notification:
             return
 
@@ -169,12 +177,20 @@ class Operation:
 
 
 class OperationsManager:
-    """Global handler for all operations and their results."""
+    """Global handler for all operations and their results.
+
+    Operations run one at a time in the order they were created. Consecutive
+    operations that allow running in parallel run at the same time, up to a
+    limit.
+    """
+
+    MAX_PARALLEL_OPERATIONS: ClassVar[int] = 4
 
     def __init__(self) -> None:
         """Initialize the object."""
         self._operations: OrderedDict[str, Operation] = OrderedDict()
         self._current_operation: Operation | None = None
+        self._parallel_operations: list[Operation] = []
 
         # Assume that operations manager will be called from various threads
         # including the callback called from the threads it creates. Ensure
@@ -207,7 +223,11 @@ class OperationsManager:
         """Trigger next operation. Called from within previous thread."""
         logger.debug('%s: on_complete called', operation)
         with self._lock:
-            self._current_operation = None
+            if operation in self._parallel_operations:
+                self._parallel_operations.remove(operation)
+            else:
+                self._current_operation = None
+
             if not operation.show_message:
                 # No need to keep it lingering for later collection
                 del self._operations[operation.op_id]
@@ -221,11 +241,25 @@ class OperationsManager:
                 return
 
             for operation in self._operations.values():
-                if operation.state == Operation.State.WAITING:
+                if operation.state != Operation.State.WAITING:
+                    continue
+
+                if operation.allow_parallel:
+                    if (len(self._parallel_operations) >=
+                            self.MAX_PARALLEL_OPERATIONS):
+                        break
+
+                    logger.debug('%s: scheduling in parallel', operation)
+                    self._parallel_operations.append(operation)
+                    operation.run()
+                    continue
+
+                if not self._parallel_operations:
                     logger.debug('%s: scheduling', operation)
                     self._current_operation = operation
                     operation.run()
-                    break
+
+                break
 
     def filter(self, app_id: str) -> list[Operation]:
         """Return operations matching a pattern."""
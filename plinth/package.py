@@ -1,16 +1,21 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Framework for installing and updating distribution packages."""
 
+import contextlib
 import enum
 import logging
+import os
 import pathlib
+import threading
 import time
+from typing import ClassVar
 
 import apt.cache
 from django.utils.translation import gettext as _
 from django.utils.translation import gettext_lazy, gettext_noop
 
 import plinth.privileged.packages as privileged
+from plinth import actions
 from plinth import app as app_module
 from plinth.errors import MissingPackageError
 from plinth.utils import format_lazy
@@ -20,6 +25,151 @@ from .errors import PackageNotInstalledError
 
 logger = logging.getLogger(__name__)
 
+# Operations may run in parallel but only one package transaction can run
+_transaction_lock = threading.Lock()
+
+# Files whose modification indicates that the apt cache must be rebuilt
+_APT_CACHE_SOURCES = ['/var/lib/dpkg/status', '/var/lib/apt/lists']
+
+
+class _AptCache:
+    """An apt cache shared by all users and rebuilt only when invalidated.
+
+    Building an apt cache parses the dpkg status and all the package lists.
+    This takes seconds and tens of MB of memory on small boards. So, a single
+    cache is shared by all the users. It is rebuilt after it is invalidated
+    by a package transaction, by the notification about updated package lists
+    or when the files it was built from are modified.
+
+    Users are counted. When the cache has not been used by anyone for a while,
+    it is dropped to free the memory. When the cache is invalidated while in
+    use, current users continue to use the old cache and new users get a
+    newly built cache.
+    """
+
+    IDLE_TIMEOUT: ClassVar[float] = 300
+
+    def __init__(self):
+        """Initialize the shared cache."""
+        self._lock = threading.Lock()
+        self._cache = None
+        self._users = 0
+        self._sources_state = None
+        self._last_release_time = 0.0
+        self._drop_timer = None
+
+    @staticmethod
+    def _get_sources_state():
+        """Return the modification times of the files cache is built from."""
+        state = []
+        for path in _APT_CACHE_SOURCES:
+            try:
+                state.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                state.append(None)
+
+        return state
+
+    def acquire(self):
+        """Return the shared cache after building it if necessary."""
+        sources_state = self._get_sources_state()
+        with self._lock:
+            if self._cache is None or self._sources_state != sources_state:
+                logger.debug('Building apt cache')
+                self._cache = apt.Cache()
+                self._sources_state = sources_state
+
+            self._users += 1
+            return self._cache
+
+    def release(self):
+        """Stop using the shared cache."""
+        with self._lock:
+            self._users -= 1
+            self._last_release_time = time.monotonic()
+            if not self._users and not self._drop_timer:
+                self._schedule_drop(self.IDLE_TIMEOUT)
+
+    def _schedule_drop(self, timeout):
+        """Drop the cache after timeout if it is not used meanwhile."""
+        self._drop_timer = threading.Timer(timeout, self._drop_if_idle)
+        self._drop_timer.daemon = True
+        self._drop_timer.start()
+
+    def _drop_if_idle(self):
+        """Drop the cache if it has not been used for a while."""
+        with self._lock:
+            self._drop_timer = None
+            if self._users or self._cache is None:
+                return
+
+            idle_time = time.monotonic() - self._last_release_time
+            if idle_time < self.IDLE_TIMEOUT:
+                self._schedule_drop(self.IDLE_TIMEOUT - idle_time)
+                return
+
+            logger.debug('Dropping unused apt cache')
+            self._cache = None
+            self._sources_state = None
+
+    def invalidate(self):
+        """Build the cache again on next use."""
+        with self._lock:
+            # Users still holding the old cache object continue to use it.
+            self._cache = None
+            self._sources_state = None
+
+
+_apt_cache = _AptCache()
+
+
+class _PackageManagerBusy:
+    """Whether package manager is busy, remembered for a short while."""
+
+    TIMEOUT: ClassVar[float] = 2
+
+    def __init__(self):
+        """Initialize the remembered value."""
+        self._lock = threading.Lock()
+        self._value = None
+        self._time = 0.0
+
+    def get(self):
+        """Return the remembered value or None if it has expired."""
+        with self._lock:
+            if time.monotonic() - self._time >= self.TIMEOUT:
+                return None
+
+            return self._value
+
+    def set(self, value):
+        """Remember a newly found value."""
+        with self._lock:
+            self._value = value
+            self._time = time.monotonic()
+
+
+_package_manager_busy = _PackageManagerBusy()
+
+
+@contextlib.contextmanager
+def apt_cache():
+    """Return the shared apt cache as a context manager.
+
+    The cache must not be modified, such as by marking packages for
+    installation, as it is shared with other users.
+    """
+    cache = _apt_cache.acquire()
+    try:
+        yield cache
+    finally:
+        _apt_cache.release()
+
+
+def invalidate_apt_cache():
+    """Rebuild the shared apt cache on next use."""
+    _apt_cache.invalidate()
+
 
 class PackageExpression:
 
@@ -64,10 +214,10 @@ class Package(PackageExpression):
         return [self.name]
 
     def actual(self) -> str:
-        cache = apt.Cache()
-        if self.name in cache:
-            # TODO: Also return version and suite to install from
-            return self.name
+        with apt_cache() as cache:
+            if self.name in cache:
+                # TODO: Also return version and suite to install from
+                return self.name
 
         raise MissingPackageError(self.name)
 
@@ -205,7 +355,6 @@ class Packages(app_module.FollowerComponent):
         from plinth.modules.diagnostics.check import DiagnosticCheck, Result
 
         results = super().diagnose()
-        cache = apt.Cache()
         for package_expression in self.package_expressions:
             try:
                 package_name = package_expression.actual()
@@ -221,11 +370,12 @@ class Packages(app_module.FollowerComponent):
 
             result = Result.WARNING
             latest_version = '?'
-            if package_name in cache:
-                package = cache[package_name]
-                latest_version = package.candidate.version
-                if package.candidate.is_installed:
-                    result = Result.PASSED
+            with apt_cache() as cache:
+                if package_name in cache:
+                    package = cache[package_name]
+                    latest_version = package.candidate.version
+                    if package.candidate.is_installed:
+                        result = Result.PASSED
 
             check_id = f'package-latest-{package_name}'
             description = gettext_noop('Package {package_name} is the latest '
@@ -337,7 +487,6 @@ class Transaction:
 
         """
         try:
-            privileged.update()
             kwargs = {
                 'app_id': self.app_id,
                 'packages': self.package_names,
@@ -346,10 +495,14 @@ class Transaction:
                 'reinstall': reinstall,
                 'force_missing_configuration': force_missing_configuration
             }
-            privileged.install(**kwargs)
+            with actions.batch():
+                privileged.update()
+                privileged.install(**kwargs)
         except Exception as exception:
             logger.exception('Error installing package: %s', exception)
             raise
+        finally:
+            invalidate_apt_cache()
 
     def uninstall(self, purge):
         """Run an apt-get transaction to uninstall given packages."""
@@ -359,6 +512,8 @@ class Transaction:
         except Exception as exception:
             logger.exception('Error uninstalling package: %s', exception)
             raise
+        finally:
+            invalidate_apt_cache()
 
     def refresh_package_lists(self):
         """Refresh apt package lists."""
@@ -367,6 +522,8 @@ class Transaction:
         except Exception as exception:
             logger.exception('Error updating package lists: %s', exception)
             raise
+        finally:
+            invalidate_apt_cache()
 
     def _parse_progress(self, line):
         """Parse the apt-get process output line.
@@ -403,28 +560,89 @@ def install(package_names, skip_recommends=False, force_configuration=None,
 
     if not operation.thread_data.get('allow_install', True):
         # Raise error if packages are not already installed.
-        cache = apt.Cache()
-        for package_name in package_names:
-            if not cache[package_name].is_installed:
-                raise PackageNotInstalledError(package_name)
+        with apt_cache() as cache:
+            for package_name in package_names:
+                if not cache[package_name].is_installed:
+                    raise PackageNotInstalledError(package_name)
 
         return
 
-    start_time = time.time()
-    while is_package_manager_busy():
-        if time.time() - start_time >= 24 * 3600:  # One day
-            raise PackageException(_('Timeout waiting for package manager'))
+    preinstalled = operation.thread_data.get('packages_preinstalled', set())
+    if (set(package_names) <= preinstalled and not force_configuration
+            and not reinstall and not force_missing_configuration):
+        logger.info('Packages already installed for app - %s, packages - %s',
+                    operation.app_id, package_names)
+        return
+
+    with _transaction_lock:
+        _wait_for_package_manager()
+
+        logger.info('Running install for app - %s, packages - %s',
+                    operation.app_id, package_names)
+
+        from . import package
+        transaction = package.Transaction(operation.app_id, package_names)
+        operation.thread_data['transaction'] = transaction
+        transaction.install(skip_recommends, force_configuration, reinstall,
+                            force_missing_configuration)
 
-        time.sleep(3)  # seconds
 
-    logger.info('Running install for app - %s, packages - %s',
-                operation.app_id, package_names)
+def install_for_apps(apps) -> set[str]:
+    """Install packages of multiple apps together and return their names.
 
-    from . import package
-    transaction = package.Transaction(operation.app_id, package_names)
-    operation.thread_data['transaction'] = transaction
-    transaction.install(skip_recommends, force_configuration, reinstall,
-                        force_missing_configuration)
+    Packages of all the apps are installed in a single transaction, or two if
+    some of them skip recommended packages. Packages that conflict with
+    installed packages are left for the apps to install during their setup.
+    Must not be called from within an operation. Progress is not reported.
+
+    Raise MissingPackageError if a required package is not available.
+    """
+    packages: dict[bool, list[str]] = {False: [], True: []}
+    app_ids: dict[bool, list[str]] = {False: [], True: []}
+    for app in apps:
+        for component in app.get_components_of_type(Packages):
+            if component.find_conflicts() and component.conflicts_action \
+               not in (None, Packages.ConflictsAction.IGNORE):
+                continue
+
+            skip_recommends = component.skip_recommends
+            for package_name in component.get_actual_packages():
+                if package_name not in packages[skip_recommends]:
+                    packages[skip_recommends].append(package_name)
+
+            if app.app_id not in app_ids[skip_recommends]:
+                app_ids[skip_recommends].append(app.app_id)
+
+    installed_packages = set()
+    for skip_recommends in (False, True):
+        if not packages[skip_recommends]:
+            continue
+
+        with _transaction_lock:
+            _wait_for_package_manager()
+
+            logger.info('Running install for apps - %s, packages - %s',
+                        app_ids[skip_recommends], packages[skip_recommends])
+            transaction = Transaction(app_ids[skip_recommends],
+                                      packages[skip_recommends])
+            transaction.install(skip_recommends)
+
+        installed_packages.update(packages[skip_recommends])
+
+    return installed_packages
+
+
+def _wait_for_package_manager():
+    """Wait until no other package manager is running."""
+    start_time = time.monotonic()
+    while is_package_manager_busy():
+        if time.monotonic() - start_time >= 24 * 3600:  # One day
+            raise PackageException(_('Timeout waiting for package manager'))
+
+        # Wait in shorter periods to keep each privileged call short
+        if privileged.wait_for_package_manager(timeout=60):
+            _package_manager_busy.set(False)
+            break
 
 
 def uninstall(package_names, purge):
@@ -435,34 +653,42 @@ def uninstall(package_names, purge):
         raise RuntimeError(
             'uninstall() must be called from within an operation.')
 
-    start_time = time.time()
-    while is_package_manager_busy():
-        if time.time() - start_time >= 24 * 3600:  # One day
-            raise PackageException(_('Timeout waiting for package manager'))
+    with _transaction_lock:
+        _wait_for_package_manager()
 
-        time.sleep(3)  # seconds
+        logger.info('Running uninstall for app - %s, packages - %s',
+                    operation.app_id, package_names)
 
-    logger.info('Running uninstall for app - %s, packages - %s',
-                operation.app_id, package_names)
-
-    from . import package
-    transaction = package.Transaction(operation.app_id, package_names)
-    operation.thread_data['transaction'] = transaction
-    transaction.uninstall(purge)
+        from . import package
+        transaction = package.Transaction(operation.app_id, package_names)
+        operation.thread_data['transaction'] = transaction
+        transaction.uninstall(purge)
 
 
 def is_package_manager_busy():
-    """Return whether a package manager is running."""
+    """Return whether a package manager is running.
+
+    Pages and waiting operations ask frequently, so the answer is reused for a
+    short while.
+    """
+    is_busy = _package_manager_busy.get()
+    if is_busy is not None:
+        return is_busy
+
     try:
-        return privileged.is_package_manager_busy(_log_error=False)
+        is_busy = privileged.is_package_manager_busy(_log_error=False)
     except Exception:
         return False
 
+    _package_manager_busy.set(is_busy)
+    return is_busy
+
 
 def refresh_package_lists():
     """To be run in case apt package lists are outdated."""
     transaction = Transaction(None, None)
-    transaction.refresh_package_lists()
+    with _transaction_lock:
+        transaction.refresh_package_lists()
 
 
 def filter_conffile_prompt_packages(packages):
@@ -480,14 +706,14 @@ def packages_installed(candidates: list | tuple) -> list:
     :param candidates: A list of package names.
     :return: A list of installed Debian package names.
     """
-    cache = apt.cache.Cache()
     installed_packages = []
-    for package_name in candidates:
-        try:
-            package = cache[package_name]
-            if package.is_installed:
-                installed_packages.append(package_name)
-        except KeyError:
-            pass
+    with apt_cache() as cache:
+        for package_name in candidates:
+            try:
+                package = cache[package_name]
+                if package.is_installed:
+                    installed_packages.append(package_name)
+            except KeyError:
+                pass
 
     return installed_packages
@@ -30,10 +30,15 @@ def update():
 
 
 @privileged
-def install(app_id: str, packages: list[str], skip_recommends: bool = False,
+def install(app_id: str | list[str], packages: list[str],
+            skip_recommends: bool = False,
             force_configuration: str | None = None, reinstall: bool = False,
             force_missing_configuration: bool = False):
-    """Install packages using apt-get."""
+    """Install packages using apt-get.
+
+    app_id may be a list of apps when installing packages of multiple apps
+    together.
+    """
     if force_configuration not in ('old', 'new', None):
         raise ValueError('Invalid value for force_configuration')
 
@@ -90,15 +95,18 @@ def remove(app_id: str, packages: list[str], purge: bool):
 
 
 def _assert_managed_packages(app_id, packages):
-    """Check that list of packages are in fact managed by module."""
+    """Check that list of packages are in fact managed by module(s)."""
     from plinth.package import Packages
 
     module_loader.load_modules()
     app_module.apps_init()
-    app = app_module.App.get(app_id)
+    app_ids = [app_id] if isinstance(app_id, str) else app_id
     managed_packages = []
-    for component in app.get_components_of_type(Packages):
-        managed_packages += component.possible_packages + component.conflicts
+    for app_id_ in app_ids:
+        app = app_module.App.get(app_id_)
+        for component in app.get_components_of_type(Packages):
+            managed_packages += (component.possible_packages +
+                                 component.conflicts)
 
     for package in packages:
         assert package in managed_packages
@@ -106,11 +114,17 @@ def _assert_managed_packages(app_id, packages):
 
 @privileged
 def is_package_manager_busy() -> bool:
-    """Check whether package manager is busy.
+    """Check whether package manager is busy."""
+    return action_utils.is_package_manager_busy()
+
 
-    An exit code of zero indicates that package manager is busy.
+@privileged
+def wait_for_package_manager(timeout: int) -> bool:
+    """Wait up to timeout seconds for package manager to be free.
+
+    Return whether package manager is free.
     """
-    return action_utils.is_package_manager_busy()
+    return action_utils.wait_for_package_manager(timeout)
 
 
 @privileged
@@ -1,6 +1,9 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """List and handle system services."""
 
+import functools
+from concurrent import futures
+
 from plinth import action_utils
 from plinth import app as app_module
 from plinth import module_loader
@@ -8,6 +11,34 @@ from plinth.actions import privileged
 from plinth.daemon import Daemon, RelatedDaemon
 
 
+def _forget_unit_state(action):
+    """Forget the remembered state of the service when the action returns.
+
+    The undecorated action is still run by the privileged process.
+    """
+
+    @functools.wraps(action)
+    def wrapper(service, *args, **kwargs):
+        from plinth import unit_state
+        try:
+            result = action(service, *args, **kwargs)
+        except Exception:
+            unit_state.forget(service)
+            raise
+
+        if isinstance(result, futures.Future):
+            # Action is part of a batch and runs later
+            result.add_done_callback(lambda _: unit_state.forget(service))
+        else:
+            unit_state.forget(service)
+
+        return result
+
+    wrapper.__wrapped__ = action.__wrapped__
+    return wrapper
+
+
+@_forget_unit_state
 @privileged
 def start(service: str):
     """Start a service."""
@@ -15,6 +46,7 @@ def start(service: str):
     action_utils.service_start(service)
 
 
+@_forget_unit_state
 @privileged
 def stop(service: str):
     """Stop a running service."""
@@ -22,6 +54,7 @@ def stop(service: str):
     action_utils.service_stop(service)
 
 
+@_forget_unit_state
 @privileged
 def enable(service: str):
     """Enable a service so that it start on system boot."""
@@ -29,6 +62,7 @@ def enable(service: str):
     action_utils.service_enable(service)
 
 
+@_forget_unit_state
 @privileged
 def disable(service: str):
     """Disable a service so that it does not start on system boot."""
@@ -36,6 +70,7 @@ def disable(service: str):
     action_utils.service_disable(service)
 
 
+@_forget_unit_state
 @privileged
 def restart(service: str):
     """Restart a service."""
@@ -43,6 +78,7 @@ def restart(service: str):
     action_utils.service_restart(service)
 
 
+@_forget_unit_state
 @privileged
 def try_restart(service: str):
     """Restart a service if it is running."""
@@ -50,6 +86,7 @@ def try_restart(service: str):
     action_utils.service_try_restart(service)
 
 
+@_forget_unit_state
 @privileged
 def reload(service: str):
     """Reload a service."""
@@ -57,6 +94,7 @@ def reload(service: str):
     action_utils.service_reload(service)
 
 
+@_forget_unit_state
 @privileged
 def mask(service: str):
     """Mask a service."""
@@ -64,6 +102,7 @@ def mask(service: str):
     action_utils.service_mask(service)
 
 
+@_forget_unit_state
 @privileged
 def unmask(service: str):
     """Unmask a service."""
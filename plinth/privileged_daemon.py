@@ -0,0 +1,303 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Daemon to run privileged actions requested over a UNIX socket.
+
+Running each privileged action as a separate process requires starting sudo,
+a new Python interpreter, reading the configuration and importing the
+privileged module. This daemon runs as superuser and performs these steps only
+once. Each request is served in a forked child process so that the output of
+the action can be captured and a misbehaving action can't affect the daemon.
+The action is terminated if the client closes the connection before the
+response is sent.
+
+The daemon is typically started by systemd using socket activation. Only
+superuser and the user that FreedomBox service runs as are allowed to make
+requests. This is verified using the peer credentials of the socket
+connection.
+
+Request is a JSON object with the keys 'module', 'action', 'args' and
+'kwargs'. A batch request is a JSON object with the key 'calls' containing a
+list of such objects. Response is a JSON object with the keys 'returncode',
+'output', 'error' and 'return_value'. 'returncode' has the same meaning as the
+exit code of the actions script and 'return_value' is the same as the value
+written by the actions script.
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import logging
+import os
+import pwd
+import select
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import time
+
+import plinth.log
+from plinth import actions, cfg, module_loader
+
+SD_LISTEN_FDS_START = 3
+
+ALLOWED_USER = 'plinth'
+
+# Seconds to wait for an action to exit after asking it to terminate
+TERMINATE_TIMEOUT = 5
+
+logger = logging.getLogger(__name__)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handle a single privileged action request."""
+
+    def handle(self):
+        """Authenticate the peer, run the action and send the response."""
+        if not _is_peer_allowed(self.request):
+            logger.warning('Rejected request from unauthorized peer')
+            response = json.dumps(_get_response(actions.EXIT_PERM)).encode()
+        else:
+            response = _run_request_in_child(self.rfile.read(), self.request)
+            if response is None:
+                return  # Peer has gone away, nobody to respond to
+
+        self.wfile.write(response)
+
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """UNIX socket server that serves each request in a forked child."""
+
+
+def _get_peer_uid(connection):
+    """Return the user ID of the process on the other end of a socket."""
+    credentials = connection.getsockopt(socket.SOL_SOCKET,
+                                        socket.SO_PEERCRED,
+                                        struct.calcsize('3i'))
+    _pid, uid, _gid = struct.unpack('3i', credentials)
+    return uid
+
+
+def _get_allowed_uids():
+    """Return the list of user IDs allowed to make requests."""
+    allowed_uids = [0]
+    try:
+        allowed_uids.append(pwd.getpwnam(ALLOWED_USER).pw_uid)
+    except KeyError:
+        pass
+
+    return allowed_uids
+
+
+def _is_peer_allowed(connection):
+    """Return whether the peer of a connection may make requests."""
+    return _get_peer_uid(connection) in _get_allowed_uids()
+
+
+def _get_response(returncode, return_value=None, output=b'', error=b''):
+    """Return a response object that can be serialized into JSON."""
+    return {
+        'returncode': returncode,
+        'return_value': return_value,
+        'output': output.decode(errors='surrogateescape'),
+        'error': error.decode(errors='surrogateescape')
+    }
+
+
+def _run_request_in_child(request, connection):
+    """Run a request in a child process and return the encoded response.
+
+    The client closes the connection when it is no longer interested in the
+    result, such as when a call times out. The action is then terminated along
+    with the processes it started, which share its new process group, and None
+    is returned.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            connection.close()
+            os.setpgid(0, 0)
+            response = json.dumps(_run_request(request)).encode()
+            with open(write_fd, 'wb') as file_handle:
+                file_handle.write(response)
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    poller = select.poll()
+    poller.register(read_fd, select.POLLIN)
+    poller.register(connection, 0)  # Hang up and errors are always reported
+    chunks = []
+    with open(read_fd, 'rb', buffering=0) as file_handle:
+        while True:
+            events = dict(poller.poll())
+            if read_fd in events:
+                chunk = file_handle.read(65536)
+                if not chunk:
+                    break
+
+                chunks.append(chunk)
+            elif events:
+                logger.warning('Peer closed connection, terminating action')
+                _terminate_process_group(pid)
+                return None
+
+    os.waitpid(pid, 0)
+    response = b''.join(chunks)
+    if not response:
+        return json.dumps(_get_response(1)).encode()
+
+    return response
+
+
+def _terminate_process_group(pid):
+    """Terminate a process group, kill it if it does not exit in time."""
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(pid, signal.SIGTERM)
+
+    deadline = time.monotonic() + TERMINATE_TIMEOUT
+    while time.monotonic() < deadline:
+        if os.waitpid(pid, os.WNOHANG) != (0, 0):
+            break
+
+        time.sleep(0.1)
+    else:
+        os.killpg(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    # Processes started by the action may outlive it
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(pid, signal.SIGKILL)
+
+
+def _run_request(request):
+    """Run a request while capturing its output and return the response."""
+    with tempfile.TemporaryFile() as output_file, \
+         tempfile.TemporaryFile() as error_file:
+        saved_fds = _redirect_output(output_file, error_file)
+        try:
+            returncode, return_value = _run_action(request)
+        finally:
+            _restore_output(saved_fds)
+
+        output_file.seek(0)
+        error_file.seek(0)
+        return _get_response(returncode, return_value, output_file.read(),
+                             error_file.read())
+
+
+def _redirect_output(output_file, error_file):
+    """Point stdout and stderr to given files and return the old ones."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = (os.dup(1), os.dup(2))
+    os.dup2(output_file.fileno(), 1)
+    os.dup2(error_file.fileno(), 2)
+    return saved_fds
+
+
+def _restore_output(saved_fds):
+    """Restore stdout and stderr to the saved file descriptors."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for target_fd, saved_fd in zip((1, 2), saved_fds):
+        os.dup2(saved_fd, target_fd)
+        os.close(saved_fd)
+
+
+def _run_action(request):
+    """Run the action and return the exit code and return value.
+
+    Errors are mapped to the same exit codes as the actions script.
+    """
+    try:
+        try:
+            request = json.loads(request)
+        except json.JSONDecodeError as exception:
+            raise SyntaxError('Request not JSON.') from exception
+
+        if not isinstance(request, dict):
+            raise SyntaxError('Invalid request format')
+
+        if 'calls' in request:
+            return 0, actions.privileged_batch_call(request['calls'])
+
+        arguments = {
+            'args': request.get('args'),
+            'kwargs': request.get('kwargs')
+        }
+        return_value = actions.privileged_call(str(request.get('module')),
+                                               str(request.get('action')),
+                                               arguments)
+        return 0, return_value
+    except PermissionError as exception:
+        logger.error(exception.args[0])
+        return actions.EXIT_PERM, None
+    except SyntaxError as exception:
+        logger.error(exception.args[0])
+        return actions.EXIT_SYNTAX, None
+    except TypeError as exception:
+        logger.error(exception.args[0])
+        return actions.EXIT_SYNTAX, None
+    except Exception as exception:
+        logger.exception(exception)
+        return 1, None
+
+
+def _preload_modules():
+    """Import all the privileged modules so that forked children share them."""
+    import_paths = ['plinth'] + module_loader.get_modules_to_load()
+    for import_path in import_paths:
+        try:
+            importlib.import_module(import_path + '.privileged')
+        except ModuleNotFoundError:
+            pass
+        except Exception as exception:
+            logger.exception('Could not import privileged module of %s: %s',
+                             import_path, exception)
+
+
+def _get_server(socket_path):
+    """Return a server listening on activated socket or on the given path."""
+    listen_pid = os.environ.get('LISTEN_PID')
+    listen_fds = int(os.environ.get('LISTEN_FDS', '0'))
+    if listen_pid == str(os.getpid()) and listen_fds >= 1:
+        logger.info('Using socket passed by service manager')
+        server = Server(socket_path, RequestHandler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = socket.socket(fileno=SD_LISTEN_FDS_START)
+        return server
+
+    try:
+        if stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    server = Server(socket_path, RequestHandler)
+    os.chmod(socket_path, 0o666)  # Peer credentials are checked per request
+    logger.info('Listening on socket %s', socket_path)
+    return server
+
+
+def main():
+    """Parse arguments and serve requests until terminated."""
+    plinth.log.action_init()
+
+    parser = argparse.ArgumentParser(
+        description='Run privileged actions for FreedomBox service')
+    parser.add_argument('--socket-path', default=actions.SOCKET_PATH,
+                        help='Path of the UNIX socket to listen on')
+    arguments = parser.parse_args()
+
+    cfg.read()
+    _preload_modules()
+    with _get_server(arguments.socket_path) as server:
+        server.serve_forever()
@@ -8,7 +8,6 @@ import threading
 import time
 from collections import defaultdict
 
-import apt
 from django.utils.translation import gettext_noop
 
 import plinth
@@ -16,6 +15,7 @@ from plinth import app as app_module
 from plinth.package import PackageException, Packages
 from plinth.signals import post_setup
 
+from . import events
 from . import operation as operation_module
 from . import package
 from .privileged import packages as packages_privileged
@@ -27,8 +27,14 @@ is_first_setup_running = False
 _is_shutting_down = False
 
 
-def run_setup_on_app(app_id, allow_install=True, rerun=False):
-    """Execute the setup process in a thread."""
+def run_setup_on_app(app_id, allow_install=True, rerun=False,
+                     allow_parallel=False, packages_preinstalled=None):
+    """Execute the setup process in a thread.
+
+    If allow_parallel is True, setup may run at the same time as setup of
+    other apps. packages_preinstalled is a set of package names that have
+    already been installed and need not be installed again by the app.
+    """
     # App is already up-to-date
     app = app_module.App.get(app_id)
     current_version = app.get_setup_version()
@@ -46,8 +52,10 @@ def run_setup_on_app(app_id, allow_install=True, rerun=False):
     return operation_module.manager.new(
         f'{app_id}-setup', app_id, name, _run_setup_on_app,
         [app, current_version], show_message=show_message,
-        show_notification=show_notification,
-        thread_data={'allow_install': allow_install})
+        show_notification=show_notification, thread_data={
+            'allow_install': allow_install,
+            'packages_preinstalled': packages_preinstalled or set()
+        }, allow_parallel=allow_parallel)
 
 
 def _run_setup_on_app(app, current_version):
@@ -155,10 +163,16 @@ def stop():
 
 
 def setup_apps(app_ids=None, essential=False, allow_install=True):
-    """Run setup on selected or essential apps."""
+    """Run setup on selected or essential apps.
+
+    Apps are grouped into levels using their dependencies. Apps in a level
+    only depend on apps in earlier levels. Levels are set up one after the
+    other and apps within a level are set up in parallel.
+    """
     logger.info(
         'Running setup for apps, essential - %s, '
         'selected apps - %s', essential, app_ids)
+    apps = []
     for app in app_module.App.list():
         if essential and not app.info.is_essential:
             continue
@@ -166,9 +180,95 @@ def setup_apps(app_ids=None, essential=False, allow_install=True):
         if app_ids and app.app_id not in app_ids:
             continue
 
-        operation = run_setup_on_app(app.app_id, allow_install=allow_install)
+        apps.append(app)
+
+    for level_apps in _get_dependency_levels(apps):
+        _setup_apps_in_parallel(level_apps, allow_install)
+
+
+def _get_dependency_levels(apps):
+    """Group apps into levels such that apps only depend on earlier levels.
+
+    Apps must be in dependency order as returned by App.list(). Dependencies
+    that are not in the given list of apps are ignored.
+    """
+    app_levels = {}
+    levels = []
+    for app in apps:
+        level = 0
+        for dependency in app.info.depends:
+            if dependency in app_levels:
+                level = max(level, app_levels[dependency] + 1)
+
+        app_levels[app.app_id] = level
+        if level == len(levels):
+            levels.append([])
+
+        levels[level].append(app)
+
+    return levels
+
+
+def _setup_apps_in_parallel(apps, allow_install):
+    """Run setup on independent apps in parallel.
+
+    Packages of apps being installed for the first time are installed
+    together in a single transaction before running setup. Pre-install steps
+    of these apps, such as preseeding debconf, are run before that. Apps
+    being updated install packages during their setup as they may need force
+    upgrades.
+
+    Setup steps changing resources shared by all apps, such as the web server
+    configuration and the firewall, are serialized by the components doing
+    them. Package operations are serialized by the package manager.
+
+    Raise the exception of the first failed setup after all setups finish.
+    """
+    packages_preinstalled = set()
+    new_apps = [app for app in apps if not app.get_setup_version()]
+    if allow_install and len(new_apps) > 1:
+        new_apps = [app for app in new_apps if _run_pre_install(app)]
+
+    if allow_install and len(new_apps) > 1:
+        try:
+            packages_preinstalled = package.install_for_apps(new_apps)
+        except Exception as exception:
+            logger.warning(
+                'Unable to install packages of apps together, apps will '
+                'install them separately: %s', exception)
+
+    operations = []
+    for app in apps:
+        operation = run_setup_on_app(
+            app.app_id, allow_install=allow_install, allow_parallel=True,
+            packages_preinstalled=packages_preinstalled)
         if operation:
+            operations.append(operation)
+
+    first_exception = None
+    for operation in operations:
+        try:
             operation.join()
+        except Exception as exception:
+            first_exception = first_exception or exception
+
+    if first_exception:
+        raise first_exception
+
+
+def _run_pre_install(app):
+    """Run pre-install steps of a new app and return whether they succeeded.
+
+    Packages of an app whose pre-install steps fail are left for the app to
+    install during its setup, which reports the error.
+    """
+    try:
+        app.pre_install(0)
+        return True
+    except Exception as exception:
+        logger.warning('Pre-install steps of app %s failed: %s', app.app_id,
+                       exception)
+        return False
 
 
 def list_dependencies(app_ids=None, essential=False):
@@ -221,6 +321,7 @@ def _run_first_setup():
     is_first_setup_running = True
     run_setup_on_apps(None, allow_install=False)
     is_first_setup_running = False
+    events.stream.notify()
 
 
 def _run_regular_setup():
@@ -548,8 +649,8 @@ class ForceUpgrader():
     @staticmethod
     def _get_list_of_upgradable_packages():
         """Return list of packages that can be upgraded."""
-        cache = apt.cache.Cache()
-        return [package for package in cache if package.is_upgradable]
+        with package.apt_cache() as cache:
+            return [package_ for package_ in cache if package_.is_upgradable]
 
     @staticmethod
     def _filter_managed_packages(packages):
@@ -583,5 +684,6 @@ class ForceUpgrader():
 
 def on_package_cache_updated():
     """Called by D-Bus service when apt package cache is updated."""
+    package.invalidate_apt_cache()
     force_upgrader = ForceUpgrader.get_instance()
     force_upgrader.on_package_cache_updated()
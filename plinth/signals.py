@@ -25,3 +25,6 @@ domain_added = Signal()
 
 # Arguments: domain_type, name
 domain_removed = Signal()
+
+# Arguments: keys
+kvstore_changed = Signal()
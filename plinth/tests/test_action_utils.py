@@ -3,20 +3,25 @@
 Test module for key/value store.
 """
 
+import io
 import json
 import pathlib
 import subprocess
-from unittest.mock import patch
+import sys
+from unittest.mock import MagicMock, patch
 
 import pytest
 
 from plinth.action_utils import (get_addresses, get_hostname,
-                                 is_systemd_running, service_action,
+                                 get_package_manager_lock_holder,
+                                 is_systemd_running, read_journal,
+                                 read_log_file, service_action,
                                  service_disable, service_enable,
                                  service_is_enabled, service_is_running,
                                  service_reload, service_restart,
                                  service_start, service_stop,
-                                 service_try_restart, service_unmask)
+                                 service_try_restart, service_unmask,
+                                 wait_for_package_manager)
 
 UNKNOWN = 'unknowndeamon'
 
@@ -137,3 +142,145 @@ def test_get_addresses():
     assert len(ips) > 3  # min: ip, 2x'localhost', hostname
     for address in ips:
         assert address['kind'] in ('4', '6')
+
+
+def test_read_log_file(tmp_path):
+    """Test reading lines added to a log file after a position."""
+    log_file = tmp_path / 'test.log'
+    assert read_log_file(log_file) == {
+        'data': '',
+        'position': None,
+        'reset': True
+    }
+
+    log_file.write_text('line1\nline2\npartial')
+    inode = log_file.stat().st_ino
+    result = read_log_file(log_file)
+    assert result == {
+        'data': 'line1\nline2\n',
+        'position': f'{inode}:12',
+        'reset': True
+    }
+
+    with log_file.open('a') as file_handle:
+        file_handle.write(' line3\nline4\n')
+
+    result = read_log_file(log_file, result['position'])
+    assert result == {
+        'data': 'partial line3\nline4\n',
+        'position': f'{inode}:32',
+        'reset': False
+    }
+    assert read_log_file(log_file, result['position'])['data'] == ''
+
+    # Only the last complete lines that fit are read
+    with log_file.open('a') as file_handle:
+        file_handle.write('line5\nline6\n')
+
+    result = read_log_file(log_file, result['position'], max_bytes=8)
+    assert result == {
+        'data': 'line6\n',
+        'position': f'{inode}:44',
+        'reset': True
+    }
+
+    # Truncated file is read from the start
+    log_file.write_text('line7\n')
+    assert read_log_file(log_file, result['position']) == {
+        'data': 'line7\n',
+        'position': f'{inode}:6',
+        'reset': True
+    }
+
+    # Rotated file is read from the start
+    position = f'{inode}:6'
+    log_file.rename(tmp_path / 'test.log.1')
+    log_file.write_text('line8\nline9\n')
+    result = read_log_file(log_file, position)
+    assert result['data'] == 'line8\nline9\n'
+    assert result['reset']
+    assert read_log_file(log_file, 'invalid')['reset']
+
+
+@patch('subprocess.Popen')
+def test_read_journal(popen):
+    """Test reading journal entries of a unit after a cursor."""
+    outputs = []
+
+    def _popen(command, **kwargs):
+        output, *returncode = outputs.pop(0)
+        process = MagicMock(stdout=io.BytesIO(output.encode()),
+                            returncode=returncode[0] if returncode else 0)
+        process.__enter__.return_value = process
+        return process
+
+    popen.side_effect = _popen
+    outputs.append(('line1\nline2\n-- cursor: s=1\n', ))
+    assert read_journal('plinth') == {
+        'data': 'line1\nline2\n',
+        'position': 's=1',
+        'reset': True
+    }
+    assert popen.call_args.args[0] == [
+        'journalctl', '--no-pager', '--quiet', '--show-cursor',
+        '--unit=plinth', '--lines=100'
+    ]
+
+    outputs.append(('', ))
+    assert read_journal('plinth', 's=1') == {
+        'data': '',
+        'position': 's=1',
+        'reset': False
+    }
+    assert popen.call_args.args[0][-1] == '--after-cursor=s=1'
+
+    outputs.append(('line3\n-- cursor: s=2\n', ))
+    assert read_journal('plinth', 's=1', lines=2) == {
+        'data': 'line3\n',
+        'position': 's=2',
+        'reset': False
+    }
+
+    # Entries after the cursor that don't fit are left out
+    outputs.append(('line3\nline4\nline5\n-- cursor: s=3\n', ))
+    assert read_journal('plinth', 's=1', lines=2) == {
+        'data': 'line4\nline5\n',
+        'position': 's=3',
+        'reset': True
+    }
+
+    # Invalid cursor is ignored
+    outputs.extend([('', 1), ('line1\n-- cursor: s=2\n', )])
+    assert read_journal('plinth', 'invalid') == {
+        'data': 'line1\n',
+        'position': 's=2',
+        'reset': True
+    }
+
+    outputs.append(('', 1))
+    with pytest.raises(subprocess.CalledProcessError):
+        read_journal('plinth')
+
+
+def test_package_manager_lock(tmp_path):
+    """Test finding the process holding a package manager lock."""
+    lock_files = [tmp_path / 'lock-missing', tmp_path / 'lock']
+    lock_files[1].touch()
+    script = ('import fcntl, sys\n'
+              f'lock_file = open("{lock_files[1]}", "w")\n'
+              'fcntl.lockf(lock_file, fcntl.LOCK_EX)\n'
+              'print(flush=True)\n'
+              'sys.stdin.read()\n')
+    with patch('plinth.action_utils.PACKAGE_MANAGER_LOCK_FILES', lock_files):
+        assert get_package_manager_lock_holder() is None
+        assert wait_for_package_manager(0)
+
+        with subprocess.Popen([sys.executable, '-c', script],
+                              stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE) as process:
+            process.stdout.readline()
+            assert get_package_manager_lock_holder() == process.pid
+            assert not wait_for_package_manager(0.1, interval=0.05)
+            process.stdin.close()
+
+        assert get_package_manager_lock_holder() is None
@@ -7,32 +7,55 @@ description of the expectations.
 
 """
 
+import asyncio
+import concurrent.futures
 import json
 import os
+import socket
 import subprocess
+import sys
+import threading
+import time
 from unittest.mock import Mock, call, patch
 
 import pytest
 
-from plinth import cfg
+from plinth import actions, cfg
 from plinth.actions import privileged
+from plinth.errors import ActionNotRunError
+
+
+def _get_pipe(read_end):
+    """Return one end of a pipe whose other end is closed."""
+    read_fd, write_fd = os.pipe()
+    if read_end:
+        os.close(write_fd)
+        return open(read_fd, 'rb')
+
+    os.close(read_fd)
+    return open(write_fd, 'wb')
 
 
 @pytest.fixture(name='popen')
 def fixture_popen():
     """A fixture to patch subprocess.Popen called by privileged action."""
 
-    with patch('subprocess.Popen') as popen:
+    with patch('subprocess.Popen') as popen, \
+         patch('plinth.actions._connect_to_server') as connect:
+        connect.side_effect = FileNotFoundError
 
         def call_popen(command, **kwargs):
-            write_fd = int(command[8])
+            write_fd = int(command[command.index('--write-fd') + 1])
             if not isinstance(popen.called_with_write_fd, list):
                 popen.called_with_write_fd = []
 
             popen.called_with_write_fd.append(write_fd)
             os.write(write_fd, bytes(popen.return_value, encoding='utf-8'))
             proc = Mock()
-            proc.communicate.return_value = ('', '')
+            proc.stdin = _get_pipe(read_end=False)
+            proc.stdout = _get_pipe(read_end=True)
+            proc.stderr = _get_pipe(read_end=True)
+            proc.poll.return_value = 0
             proc.returncode = 0
             return proc
 
@@ -40,6 +63,57 @@ def fixture_popen():
         yield popen
 
 
+@pytest.fixture(name='server')
+def fixture_server():
+    """A fixture to patch the connection to privileged daemon."""
+    client_socket, server_socket = socket.socketpair()
+
+    def serve():
+        with server_socket, server_socket.makefile('rb') as file_handle:
+            server.request = json.loads(file_handle.read())
+            server_socket.sendall(json.dumps(server.response).encode())
+
+    server = Mock()
+    thread = threading.Thread(target=serve)
+    thread.start()
+
+    async def open_connection():
+        return await asyncio.open_unix_connection(sock=client_socket)
+
+    with patch('plinth.actions._connect_to_server') as connect:
+        connect.side_effect = open_connection
+        yield server
+
+    thread.join()
+
+
+@pytest.fixture(name='process')
+def fixture_process():
+    """A fixture to run a real process instead of the actions script."""
+    with patch('plinth.actions._get_process_command') as get_command, \
+         patch('plinth.actions._connect_to_server') as connect:
+        connect.side_effect = FileNotFoundError
+
+        def set_script(script, return_value=None):
+            """Run a Python script that writes return value to write_fd."""
+
+            def get_process_command(write_fd, run_as_user, action_args):
+                return_value_json = json.dumps({
+                    'result': 'success',
+                    'return': return_value
+                })
+                output = f'{return_value_json!r}.encode()'
+                code = (f'import os, sys, time\n'
+                        f'input_ = sys.stdin.read()\n'
+                        f'{script}\n'
+                        f'os.write({write_fd}, {output})')
+                return [sys.executable, '-c', code]
+
+            get_command.side_effect = get_process_command
+
+        yield set_script
+
+
 def test_privileged_properties():
     """Test that privileged decorator sets proper properties on the method."""
 
@@ -140,3 +214,273 @@ def test_privileged_method_exceptions(get_module_name, popen):
     wrapped_func = privileged(func_with_exception)
     with pytest.raises(TypeError, match='type error'):
         wrapped_func()
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_privileged_method_call_on_server(get_module_name, server):
+    """Test that privileged method calls the daemon properly."""
+
+    def func_with_args(_a: int, _b: str, _c: int = 1, _d: str = 'dval'):
+        return
+
+    get_module_name.return_value = 'tests'
+    server.response = {
+        'returncode': 0,
+        'output': '',
+        'error': '',
+        'return_value': {
+            'result': 'success',
+            'return': 'bar'
+        }
+    }
+    wrapped_func = privileged(func_with_args)
+    return_value = wrapped_func(1, 'bval', None, _d='dnewval')
+    assert return_value == 'bar'
+    assert server.request == {
+        'module': 'tests',
+        'action': 'func_with_args',
+        'args': [1, 'bval', None],
+        'kwargs': {
+            '_d': 'dnewval'
+        }
+    }
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_privileged_method_exceptions_on_server(get_module_name, server):
+    """Test that exceptions from the daemon are raised properly."""
+
+    def func_with_exception():
+        raise TypeError('type error')
+
+    get_module_name.return_value = 'tests'
+    server.response = {
+        'returncode': 0,
+        'output': 'output\udcff',
+        'error': 'error',
+        'return_value': {
+            'result': 'exception',
+            'exception': {
+                'module': 'builtins',
+                'name': 'TypeError',
+                'args': ['type error'],
+                'traceback': ['']
+            }
+        }
+    }
+    wrapped_func = privileged(func_with_exception)
+    with pytest.raises(TypeError, match='type error') as exception:
+        wrapped_func()
+
+    assert exception.value.args == ('type error', b'output\xff', b'error')
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_privileged_method_errors_on_server(get_module_name, server):
+    """Test that errors in the daemon are raised as process errors."""
+
+    def func():
+        return
+
+    get_module_name.return_value = 'tests'
+    server.response = {
+        'returncode': 10,
+        'output': '',
+        'error': 'error',
+        'return_value': None
+    }
+    wrapped_func = privileged(func)
+    with pytest.raises(subprocess.CalledProcessError):
+        wrapped_func()
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_batch_as_process(get_module_name, popen):
+    """Test that calls in a batch are run in a single process."""
+
+    def func(_a: int):
+        return
+
+    get_module_name.return_value = 'tests'
+    popen.return_value = json.dumps([{
+        'result': 'success',
+        'return': 'foo'
+    }, {
+        'result': 'success',
+        'return': 'bar'
+    }])
+    wrapped_func = privileged(func)
+    with actions.batch():
+        future1 = wrapped_func(1)
+        future2 = wrapped_func(_a=2)
+        assert not future1.done()
+
+    assert future1.result() == 'foo'
+    assert future2.result() == 'bar'
+    assert popen.call_count == 1
+    write_fd = popen.called_with_write_fd[0]
+    assert popen.call_args.args[0] == [
+        'sudo', '--non-interactive', '--close-from',
+        str(write_fd + 1), cfg.actions_dir + '/actions', '--batch',
+        '--write-fd',
+        str(write_fd)
+    ]
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_batch_on_server(get_module_name, server):
+    """Test that calls in a batch are sent to the daemon together."""
+
+    def func(_a: int):
+        return
+
+    get_module_name.return_value = 'tests'
+    server.response = {
+        'returncode': 0,
+        'output': '',
+        'error': '',
+        'return_value': [{
+            'result': 'success',
+            'return': 'foo'
+        }, {
+            'result': 'exception',
+            'exception': {
+                'module': 'builtins',
+                'name': 'RuntimeError',
+                'args': ['error'],
+                'traceback': ['']
+            }
+        }]
+    }
+    wrapped_func = privileged(func)
+    with pytest.raises(RuntimeError, match='error'):
+        with actions.batch():
+            future1 = wrapped_func(1)
+            with actions.batch():  # Nested batch joins the outer batch
+                future2 = wrapped_func(2)
+
+            future3 = wrapped_func(3, _log_error=False)
+
+    assert server.request == {
+        'calls': [{
+            'module': 'tests',
+            'action': 'func',
+            'args': [1],
+            'kwargs': {}
+        }, {
+            'module': 'tests',
+            'action': 'func',
+            'args': [2],
+            'kwargs': {}
+        }, {
+            'module': 'tests',
+            'action': 'func',
+            'args': [3],
+            'kwargs': {}
+        }]
+    }
+    assert future1.result() == 'foo'
+    with pytest.raises(RuntimeError):
+        future2.result()
+
+    with pytest.raises(ActionNotRunError):
+        future3.result()
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_batch_unsupported_and_aborted(get_module_name, popen):
+    """Test unsupported options in a batch and batch abort on exception."""
+
+    def func():
+        return
+
+    get_module_name.return_value = 'tests'
+    wrapped_func = privileged(func)
+    with actions.batch():
+        with pytest.raises(ValueError):
+            wrapped_func(_run_as_user='foo')
+
+    with pytest.raises(KeyError):
+        with actions.batch():
+            future = wrapped_func()
+            raise KeyError('body failed')
+
+    assert not future.done()
+    popen.assert_not_called()
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_privileged_method_async(get_module_name, process):
+    """Test that privileged methods can be run asynchronously."""
+
+    def func(_a: str):
+        return
+
+    get_module_name.return_value = 'tests'
+    process('print(input_, file=sys.stderr)', 'foo')
+    wrapped_func = privileged(func)
+    future = wrapped_func('x' * 1000000, _run_async=True)
+    assert isinstance(future, concurrent.futures.Future)
+    assert future.result(timeout=10) == 'foo'
+
+    async def await_call():
+        return await asyncio.wrap_future(wrapped_func('x', _run_async=True))
+
+    assert asyncio.run(await_call()) == 'foo'
+
+
+def _assert_process_exits(proc):
+    """Assert that a terminated process exits soon."""
+    for _ in range(50):
+        if proc.poll() is not None:
+            break
+
+        time.sleep(0.1)
+
+    assert proc.returncode is not None
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_privileged_method_timeout(get_module_name, process):
+    """Test that privileged methods time out and are terminated."""
+
+    def func():
+        return
+
+    get_module_name.return_value = 'tests'
+    process('time.sleep(10)')
+    wrapped_func = privileged(func)
+    start_time = time.time()
+    with patch('plinth.actions._terminate_process',
+               wraps=actions._terminate_process) as terminate_process:
+        with pytest.raises(TimeoutError):
+            wrapped_func(_timeout=0.2)
+
+        assert time.time() - start_time < 5
+        terminate_process.assert_called_once()
+        _assert_process_exits(terminate_process.call_args.args[0])
+
+
+@patch('plinth.actions._get_privileged_action_module_name')
+def test_privileged_method_cancel(get_module_name, process):
+    """Test that cancelling privileged method terminates the process."""
+
+    def func():
+        return
+
+    get_module_name.return_value = 'tests'
+    process('time.sleep(10)')
+    wrapped_func = privileged(func)
+    with patch('plinth.actions._terminate_process',
+               wraps=actions._terminate_process) as terminate_process:
+        future = wrapped_func(_run_async=True)
+        time.sleep(0.2)
+        assert future.cancel()
+        for _ in range(50):
+            if terminate_process.called:
+                break
+
+            time.sleep(0.1)
+
+        terminate_process.assert_called_once()
+        _assert_process_exits(terminate_process.call_args.args[0])
@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 import pytest
 
+from plinth import actions
 from plinth.actions import privileged
 
 actions_name = 'actions'
@@ -81,9 +82,66 @@ def test_call_syntax_checks(getuid, get_module_import_path, import_module,
         assert isinstance(line, str)
 
 
-def test_assert_valid_arguments(actions_module):
+@patch('importlib.import_module')
+@patch('plinth.module_loader.get_module_import_path')
+def test_batch_call(get_module_import_path, import_module):
+    """Test that a batch of calls is validated and run in order."""
+    calls = []
+
+    @privileged
+    def func(value: int):
+        calls.append(value)
+        if value == 2:
+            raise RuntimeError('foo exception')
+
+        return value
+
+    module = type('', (), {'func': func})
+    import_module.return_value = module
+    get_module_import_path.return_value = 'plinth.modules.test_module'
+
+    with pytest.raises(SyntaxError, match='Invalid batch format'):
+        actions.privileged_batch_call({})
+
+    with pytest.raises(SyntaxError, match='Invalid batch format'):
+        actions.privileged_batch_call([[]])
+
+    # All calls are validated before any call is run
+    batch = [{
+        'module': 'test-module',
+        'action': 'func',
+        'args': [1],
+        'kwargs': {}
+    }, {
+        'module': 'test-module',
+        'action': 'func',
+        'args': ['2'],
+        'kwargs': {}
+    }]
+    with pytest.raises(TypeError, match='Expected type int for arg #0'):
+        actions.privileged_batch_call(batch)
+
+    assert not calls
+
+    # Calls after a failed call are not run
+    batch[1]['args'] = [2]
+    batch.append({
+        'module': 'test-module',
+        'action': 'func',
+        'args': [3],
+        'kwargs': {}
+    })
+    return_values = actions.privileged_batch_call(batch)
+    assert calls == [1, 2]
+    assert len(return_values) == 2
+    assert return_values[0] == {'result': 'success', 'return': 1}
+    assert return_values[1]['result'] == 'exception'
+    assert return_values[1]['exception']['name'] == 'RuntimeError'
+
+
+def test_assert_valid_arguments():
     """Test that checking valid arguments works."""
-    assert_valid = actions_module._assert_valid_arguments
+    assert_valid = actions._assert_valid_arguments
 
     values = [
         None, [], 10, {}, {
@@ -139,9 +197,9 @@ def test_assert_valid_arguments(actions_module):
         assert_valid(func, {'args': [1, '2'], 'kwargs': {'c': '3'}})
 
 
-def test_assert_valid_type(actions_module):
+def test_assert_valid_type():
     """Test that type validation works as expected."""
-    assert_valid = actions_module._assert_valid_type
+    assert_valid = actions._assert_valid_type
 
     assert_valid(None, None, typing.Any)
 
@@ -59,6 +59,12 @@ def fixture_empty_apps():
     App._all_apps = collections.OrderedDict()
 
 
+@pytest.fixture(name='clear_setup_versions', autouse=True)
+def fixture_clear_setup_versions():
+    """Drop setup versions cached by earlier tests."""
+    App.clear_setup_versions()
+
+
 def test_app_instantiation():
     """Test that App is instantiated properly."""
     app = AppTest()
@@ -134,7 +140,10 @@ def test_app_setup(app_with_components):
     for component in app_with_components.components.values():
         component.setup = Mock()
 
-    app_with_components.setup(old_version=2)
+    with patch.object(app_with_components, 'pre_install') as pre_install:
+        app_with_components.setup(old_version=2)
+
+    pre_install.assert_called_once_with(2)
     for component in app_with_components.components.values():
         component.setup.assert_has_calls([call(old_version=2)])
 
@@ -184,6 +193,21 @@ def test_get_set_setup_version():
     assert app.get_setup_version() == 5
 
 
+@pytest.mark.django_db
+def test_setup_version_cache(django_assert_num_queries):
+    """Test that setup versions are read from database only once."""
+    app1 = AppSetupTest()
+    app2 = AppTest()
+    app1.set_setup_version(2)
+    with django_assert_num_queries(1):
+        assert app1.get_setup_version() == 2
+        assert app2.get_setup_version() == 0
+        assert app1.get_setup_state() == App.SetupState.NEEDS_UPDATE
+
+    app2.set_setup_version(4)
+    assert app2.get_setup_version() == 4
+
+
 def test_app_enable(app_with_components):
     """Test that enabling an app enables components."""
     app_with_components.disable()
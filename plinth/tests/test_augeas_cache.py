@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for shared access to configuration files parsed with Augeas.
+"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from plinth import augeas_cache
+
+
+@pytest.fixture(name='config_file')
+def fixture_config_file(tmp_path):
+    """Return a shell variables configuration file and forget loaded trees."""
+    config_file = tmp_path / 'test.conf'
+    config_file.write_text('KEY1=value1\nKEY2=value2\n', encoding='utf-8')
+    augeas_cache.clear()
+    yield config_file
+    augeas_cache.clear()
+
+
+def _get_tree(config_file):
+    """Return the shared tree of the configuration file."""
+    return augeas_cache._get_tree('Shellvars', config_file)
+
+
+def test_read(config_file):
+    """Test that a file is parsed again only when it changes."""
+    with augeas_cache.read('Shellvars', config_file) as aug:
+        assert aug.get('KEY1') == 'value1'
+
+    tree = _get_tree(config_file)
+    with patch.object(tree.aug, 'load', wraps=tree.aug.load) as load:
+        with augeas_cache.read('Shellvars', config_file) as aug:
+            assert aug.get('KEY1') == 'value1'
+
+        load.assert_not_called()
+
+        config_file.write_text('KEY1=value3\n', encoding='utf-8')
+        with augeas_cache.read('Shellvars', config_file) as aug:
+            assert aug.get('KEY1') == 'value3'
+            assert aug.get('KEY2') is None
+
+        load.assert_called_once()
+
+    # File replaced with another having same size and modification time
+    stat = config_file.stat()
+    new_file = config_file.with_suffix('.new')
+    new_file.write_text('KEY1=value4\n', encoding='utf-8')
+    os.utime(new_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    new_file.replace(config_file)
+    with augeas_cache.read('Shellvars', config_file) as aug:
+        assert aug.get('KEY1') == 'value4'
+
+
+def test_edit(config_file):
+    """Test that changes are saved once and the file isn't parsed again."""
+    with augeas_cache.edit('Shellvars', config_file) as aug:
+        aug.set('KEY1', 'value3')
+        aug.set('KEY3', 'value4')
+
+    assert config_file.read_text(encoding='utf-8') == \
+        'KEY1=value3\nKEY2=value2\nKEY3=value4\n'
+
+    tree = _get_tree(config_file)
+    with patch.object(tree.aug, 'load', wraps=tree.aug.load) as load:
+        with augeas_cache.read('Shellvars', config_file) as aug:
+            assert aug.get('KEY3') == 'value4'
+
+        load.assert_not_called()
+
+
+def test_edit_error(config_file):
+    """Test that changes are discarded when an error occurs."""
+    with pytest.raises(RuntimeError):
+        with augeas_cache.edit('Shellvars', config_file) as aug:
+            aug.set('KEY1', 'value3')
+            raise RuntimeError()
+
+    with augeas_cache.read('Shellvars', config_file) as aug:
+        assert aug.get('KEY1') == 'value1'
+
+    assert config_file.read_text(encoding='utf-8') == \
+        'KEY1=value1\nKEY2=value2\n'
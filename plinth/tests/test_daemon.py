@@ -4,14 +4,16 @@ Test module for component managing system daemons and other systemd units.
 """
 
 import socket
+import struct
 import subprocess
 from unittest.mock import Mock, call, patch
 
 import pytest
 
 from plinth.app import App, FollowerComponent, Info
-from plinth.daemon import (Daemon, RelatedDaemon, app_is_running,
-                           diagnose_netcat, diagnose_port_listening)
+from plinth.daemon import (Daemon, ListeningSockets, RelatedDaemon,
+                           app_is_running, diagnose_netcat,
+                           diagnose_port_listening, listening_sockets_snapshot)
 from plinth.modules.diagnostics.check import DiagnosticCheck, Result
 
 privileged_modules_to_mock = ['plinth.privileged.service']
@@ -200,22 +202,88 @@ def test_app_is_running(service_is_running):
     assert app_is_running(app)
 
 
-@patch('psutil.net_connections')
-def test_diagnose_port_listening(connections):
+def _proc_net_line(address, port, remote='0.0.0.0', state='0A'):
+    """Return a line in /proc/net/* format for a socket."""
+
+    def _encode(address):
+        family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        packed = socket.inet_pton(family, address)
+        words = struct.unpack(f'={len(packed) // 4}I', packed)
+        return ''.join(f'{word:08X}' for word in words)
+
+    return (f'0: {_encode(address)}:{port:04X} {_encode(remote)}:0000 {state} '
+            '00000000:00000000 00:00000000 00000000 0 0 1234 1')
+
+
+@pytest.fixture(name='proc_net')
+def fixture_proc_net(tmp_path):
+    """Create socket tables similar to /proc/net/*."""
+    header = 'sl local_address rem_address st ...'
+    tables = {
+        'tcp': [
+            _proc_net_line('0.0.0.0', 1234),
+            _proc_net_line('0.0.0.0', 2345, '1.1.1.1', state='01'),
+        ],
+        'tcp6': [
+            _proc_net_line('::1', 5678, '::'),
+            _proc_net_line('::', 6789, '::'),
+        ],
+        'udp': [
+            _proc_net_line('0.0.0.0', 3456, state='07'),
+            _proc_net_line('0.0.0.0', 4567, '1.1.1.1', state='01'),
+        ],
+        'udp6': [
+            _proc_net_line('::1', 5678, '::', state='07'),
+            _proc_net_line('::', 6789, '::', state='07'),
+        ],
+    }
+    for protocol, lines in tables.items():
+        (tmp_path / protocol).write_text('\n'.join([header] + lines) + '\n')
+
+    with patch('plinth.daemon.ListeningSockets.PROC_NET_PATH', tmp_path):
+        yield tmp_path
+
+
+def test_listening_sockets(proc_net):
+    """Test reading the listening sockets from /proc/net/*."""
+    sockets = ListeningSockets()
+    assert sockets.sockets == {
+        ('tcp', 1234, '0.0.0.0'): 1234,
+        ('tcp6', 5678, '::1'): 1234,
+        ('tcp6', 6789, '::'): 1234,
+        ('udp', 3456, '0.0.0.0'): 1234,
+        ('udp6', 5678, '::1'): 1234,
+        ('udp6', 6789, '::'): 1234,
+    }
+
+    (proc_net / 'tcp6').unlink()
+    sockets = ListeningSockets()
+    assert ('tcp', 1234, '0.0.0.0') in sockets.sockets
+    assert ('tcp6', 6789, '::') not in sockets.sockets
+
+
+def test_listening_sockets_snapshot(proc_net):
+    """Test that sockets are read only once within a snapshot."""
+    with patch('plinth.daemon._listening_sockets._loader',
+               wraps=ListeningSockets) as listening_sockets:
+        diagnose_port_listening(1234)
+        diagnose_port_listening(1234)
+        assert listening_sockets.call_count == 2
+
+        listening_sockets.reset_mock()
+        with listening_sockets_snapshot():
+            with listening_sockets_snapshot():
+                diagnose_port_listening(1234)
+
+            diagnose_port_listening(3456, 'udp')
+            assert listening_sockets.call_count == 1
+
+        diagnose_port_listening(1234)
+        assert listening_sockets.call_count == 2
+
+
+def test_diagnose_port_listening(proc_net):
     """Test running port listening diagnostics test."""
-    connections.return_value = [
-        Mock(status='LISTEN', laddr=('0.0.0.0', 1234), family=socket.AF_INET),
-        Mock(status='ESTABLISHED', laddr=('0.0.0.0', 2345),
-             family=socket.AF_INET),
-        Mock(raddr=(), laddr=('0.0.0.0', 3456), family=socket.AF_INET),
-        Mock(raddr=('1.1.1.1', 53), laddr=('0.0.0.0', 4567),
-             family=socket.AF_INET),
-        Mock(status='LISTEN', laddr=('::1', 5678), familiy=socket.AF_INET6),
-        Mock(status='LISTEN', laddr=('::', 6789), familiy=socket.AF_INET6),
-        Mock(raddr=(), laddr=('::1', 5678), familiy=socket.AF_INET6),
-        Mock(raddr=(), laddr=('::', 6789), familiy=socket.AF_INET6),
-    ]
-
     # Check that message is correct
     results = diagnose_port_listening(1234)
     assert results == DiagnosticCheck('daemon-listening-tcp-1234',
@@ -250,20 +318,6 @@ def test_diagnose_port_listening(connections):
             'listen_address': '0.0.0.0'
         })
 
-    # Check if psutil call is being made with right argument
-    results = diagnose_port_listening(1234, 'tcp')
-    connections.assert_called_with('tcp')
-    results = diagnose_port_listening(1234, 'tcp4')
-    connections.assert_called_with('tcp')
-    results = diagnose_port_listening(1234, 'tcp6')
-    connections.assert_called_with('tcp6')
-    results = diagnose_port_listening(3456, 'udp')
-    connections.assert_called_with('udp')
-    results = diagnose_port_listening(3456, 'udp4')
-    connections.assert_called_with('udp')
-    results = diagnose_port_listening(3456, 'udp6')
-    connections.assert_called_with('udp6')
-
     # TCP
     assert diagnose_port_listening(1234).result == Result.PASSED
     assert diagnose_port_listening(1000).result == Result.FAILED
@@ -272,9 +326,16 @@ def test_diagnose_port_listening(connections):
                                    '0.0.0.0').result == Result.PASSED
     assert diagnose_port_listening(1234, 'tcp',
                                    '1.1.1.1').result == Result.FAILED
-    assert diagnose_port_listening(1234, 'tcp6').result == Result.PASSED
+    assert diagnose_port_listening(1234, 'tcp6').result == Result.FAILED
+    assert diagnose_port_listening(5678, 'tcp6').result == Result.PASSED
+    assert diagnose_port_listening(5678, 'tcp6', '::1').result == \
+        Result.PASSED
     assert diagnose_port_listening(1234, 'tcp4').result == Result.PASSED
     assert diagnose_port_listening(6789, 'tcp4').result == Result.PASSED
+    assert diagnose_port_listening(6789, 'tcp4', '::').result == \
+        Result.PASSED
+    assert diagnose_port_listening(6789, 'tcp4', '0.0.0.0').result == \
+        Result.FAILED
     assert diagnose_port_listening(5678, 'tcp4').result == Result.FAILED
 
     # UDP
@@ -285,7 +346,8 @@ def test_diagnose_port_listening(connections):
                                    '0.0.0.0').result == Result.PASSED
     assert diagnose_port_listening(3456, 'udp',
                                    '1.1.1.1').result == Result.FAILED
-    assert diagnose_port_listening(3456, 'udp6').result == Result.PASSED
+    assert diagnose_port_listening(3456, 'udp6').result == Result.FAILED
+    assert diagnose_port_listening(5678, 'udp6').result == Result.PASSED
     assert diagnose_port_listening(3456, 'udp4').result == Result.PASSED
     assert diagnose_port_listening(6789, 'udp4').result == Result.PASSED
     assert diagnose_port_listening(5678, 'udp4').result == Result.FAILED
@@ -4,6 +4,10 @@ Tests for database utilities.
 """
 import threading
 import time
+from unittest.mock import Mock, patch
+
+import pytest
+from django.db import OperationalError
 
 from .. import db
 
@@ -66,3 +70,70 @@ def test_db_lock_release():
     end_time = time.time()
     assert return_value
     assert end_time - start_time <= 0.23
+
+
+def test_db_lock_statistics():
+    """Test that time spent waiting for the lock is recorded."""
+    event = threading.Event()
+    lock = db.DBLock()
+
+    def thread_func():
+        with lock:
+            event.set()
+            time.sleep(0.1)
+
+    thread = threading.Thread(target=thread_func)
+    thread.start()
+
+    event.wait()
+    with lock:
+        pass
+
+    thread.join()
+    statistics = lock.get_statistics()
+    assert statistics['acquire_count'] == 2
+    assert statistics['max_wait_time'] >= 0.05
+    assert statistics['total_wait_time'] >= statistics['max_wait_time']
+
+
+@patch('plinth.db.RETRY_INITIAL_DELAY', 0)
+def test_retry_if_busy():
+    """Test that operations are retried only if database is busy."""
+    function = Mock()
+    function.side_effect = [
+        OperationalError('database is locked'),
+        OperationalError('database is locked'), 'return-value'
+    ]
+    assert db.retry_if_busy(function)('arg') == 'return-value'
+    assert function.call_count == 3
+    function.assert_called_with('arg')
+
+    function = Mock(side_effect=OperationalError('database is locked'))
+    with pytest.raises(OperationalError):
+        db.retry_if_busy(function)()
+
+    assert function.call_count == db.RETRY_ATTEMPTS
+
+    function = Mock(side_effect=OperationalError('no such table'))
+    with pytest.raises(OperationalError):
+        db.retry_if_busy(function)()
+
+    assert function.call_count == 1
+
+
+@pytest.mark.django_db
+def test_retry_if_busy_in_transaction():
+    """Test that operations are not retried inside a transaction."""
+    function = Mock(side_effect=OperationalError('database is locked'))
+    with pytest.raises(OperationalError):
+        db.retry_if_busy(function)()
+
+    assert function.call_count == 1
+
+
+def test_get_database_options():
+    """Test that immediate transactions are used when possible."""
+    assert db.get_database_options((4, 2)) == {}
+    assert db.get_database_options((5, 1)) == {
+        'transaction_mode': 'IMMEDIATE'
+    }
@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for shared access to D-Bus services.
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from plinth import dbus
+
+glib = dbus.glib
+
+
+@pytest.fixture(name='connection', autouse=True)
+def fixture_connection():
+    """Patch the system bus connection and clear cached proxies."""
+    connection = Mock()
+    with patch('plinth.dbus.get_connection', return_value=connection), \
+         patch('plinth.dbus._proxies', {}), \
+         patch('plinth.dbus._watched_names', set()):
+        yield connection
+
+
+@patch('plinth.dbus.gio.DBusProxy.new_sync')
+def test_get_proxy(new_sync, connection):
+    """Test that proxies are cached until the service changes."""
+    new_sync.side_effect = lambda *args: Mock()
+    proxy1 = dbus.get_proxy('org.test.A', '/a', 'org.test.A.I1')
+    assert dbus.get_proxy('org.test.A', '/a', 'org.test.A.I1') is proxy1
+    proxy2 = dbus.get_proxy('org.test.A', '/a', 'org.test.A.I2')
+    proxy3 = dbus.get_proxy('org.test.A', '/b', 'org.test.A.I1')
+    proxy4 = dbus.get_proxy('org.test.B', '/a', 'org.test.B.I1')
+    assert len({proxy1, proxy2, proxy3, proxy4}) == 4
+    assert new_sync.call_count == 4
+
+    # Owner changes are watched once for each service
+    assert connection.signal_subscribe.call_count == 2
+    callback = connection.signal_subscribe.call_args.args[6]
+
+    dbus.invalidate_proxies('org.test.A', '/b')
+    assert dbus.get_proxy('org.test.A', '/a', 'org.test.A.I1') is proxy1
+    assert dbus.get_proxy('org.test.A', '/b', 'org.test.A.I1') is not proxy3
+
+    parameters = glib.Variant('(sss)', ('org.test.A', ':1.1', ''))
+    callback(None, None, None, None, None, parameters)
+    assert dbus.get_proxy('org.test.A', '/a', 'org.test.A.I1') is not proxy1
+    assert dbus.get_proxy('org.test.B', '/a', 'org.test.B.I1') is proxy4
+
+
+def test_call_many(connection):
+    """Test that many calls are made together and results are collected."""
+    error = glib.Error('GDBus.Error:org.test.Error: failed')
+
+    def call(name, object_path, interface, method, parameters, *args):
+        callback, index = args[-2:]
+        callback(connection, (method, parameters), index)
+
+    def call_finish(result):
+        method, parameters = result
+        if method == 'Fail':
+            raise error
+
+        return glib.Variant('(s)', (method + parameters.unpack()[0], ))
+
+    connection.call.side_effect = call
+    connection.call_finish.side_effect = call_finish
+    target = ('org.test.A', '/a', 'org.test.A.I1')
+    calls = [
+        target + ('Echo', glib.Variant('(s)', ('1', ))),
+        target + ('Fail', None),
+        target + ('Echo', glib.Variant('(s)', ('2', ))),
+    ]
+    assert dbus.call_many(calls) == [('Echo1', ), error, ('Echo2', )]
+    assert connection.call.call_count == 3
@@ -0,0 +1,62 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for notifying web pages about changes.
+"""
+
+import threading
+import time
+
+from plinth import events
+
+
+def test_notify():
+    """Test that notifying increments the version."""
+    stream = events.EventStream()
+    assert stream.version == 0
+    stream.notify()
+    assert stream.version == 1
+
+
+def test_wait_changed():
+    """Test that waiting returns immediately if version already changed."""
+    stream = events.EventStream()
+    stream.notify()
+    start_time = time.monotonic()
+    assert stream.wait(0, 1) == 1
+    assert time.monotonic() - start_time < 0.1
+
+
+def test_wait_timeout():
+    """Test that waiting returns same version after timeout."""
+    stream = events.EventStream()
+    start_time = time.monotonic()
+    assert stream.wait(0, 0.1) == 0
+    assert time.monotonic() - start_time >= 0.1
+
+
+def test_wait_notified():
+    """Test that waiting returns when notified from another thread."""
+    stream = events.EventStream()
+    thread = threading.Timer(0.1, stream.notify)
+    thread.start()
+    start_time = time.monotonic()
+    assert stream.wait(0, 5) == 1
+    assert time.monotonic() - start_time < 1
+    thread.join()
+
+
+def test_wait_max_waiters():
+    """Test that waiting returns immediately when too many are waiting."""
+    stream = events.EventStream()
+    stream.MAX_WAITERS = 1
+    thread = threading.Thread(target=stream.wait, args=(0, 5))
+    thread.start()
+    while not stream._waiters:
+        time.sleep(0.01)
+
+    start_time = time.monotonic()
+    assert stream.wait(0, 5) == 0
+    assert time.monotonic() - start_time < 1
+
+    stream.notify()
+    thread.join()
@@ -16,6 +16,9 @@ from plinth.frontpage import Shortcut, add_custom_shortcuts
 def fixture_clean_global_shortcuts():
     """Ensure that global list of shortcuts is clean."""
     Shortcut._all_shortcuts = {}
+    Shortcut._shortcuts_for_groups = {}
+    with patch('plinth.modules.users._user_groups', {}):
+        yield
 
 
 def test_shortcut_init_with_arguments():
@@ -140,6 +143,30 @@ def test_shortcut_list_with_username(get_user_groups, common_shortcuts):
     assert return_list == [cuts[0], cuts[3], cut]
 
 
+@patch('plinth.modules.users.privileged.get_user_groups')
+def test_shortcut_list_for_groups_cached(get_user_groups, common_shortcuts):
+    """Test that shortcuts for a set of groups are computed only once."""
+    cuts = common_shortcuts
+
+    get_user_groups.return_value = ['group1']
+    assert Shortcut.list(username='user1') == [cuts[0], cuts[1], cuts[3]]
+    get_user_groups.return_value = ['group1']
+    assert Shortcut.list(username='user2') == [cuts[0], cuts[1], cuts[3]]
+    assert Shortcut.list(username='user1') == [cuts[0], cuts[1], cuts[3]]
+    assert get_user_groups.call_count == 2
+    assert list(Shortcut._shortcuts_for_groups) == [frozenset(['group1'])]
+
+    cut = Shortcut('group1-web-app-component-2', 'name5', 'short5',
+                   url='url5', login_required=True, allowed_groups=['group1'])
+    assert not Shortcut._shortcuts_for_groups
+    assert Shortcut.list(username='user1') == [
+        cuts[0], cuts[1], cuts[3], cut
+    ]
+
+    cut.remove()
+    assert Shortcut.list(username='user1') == [cuts[0], cuts[1], cuts[3]]
+
+
 def test_add_custom_shortcuts(shortcuts_file):
     """Test that adding custom shortcuts succeeds."""
     shortcuts_file('nextcloud.json')
@@ -4,9 +4,11 @@ Test module for key/value store.
 """
 
 import pytest
+from django.db import transaction
 
 from plinth import kvstore
 from plinth.models import KVStore
+from plinth.signals import kvstore_changed
 
 pytestmark = pytest.mark.django_db
 
@@ -58,3 +60,85 @@ def test_delete():
     kvstore.delete('test-set-key')
     with pytest.raises(KVStore.DoesNotExist):
         kvstore.delete('test-set-key')
+
+
+def test_get_many_set_many():
+    """Test that multiple values can be stored and retrieved together."""
+    kvstore.set_many({'test-key-1': 'value-1', 'test-key-2': [1, 2]})
+    assert kvstore.get('test-key-1') == 'value-1'
+    assert kvstore.get_many(['test-key-1', 'test-key-2', 'test-key-3']) == {
+        'test-key-1': 'value-1',
+        'test-key-2': [1, 2],
+        'test-key-3': None
+    }
+    assert kvstore.get_many(['test-key-3'], 'default') == {
+        'test-key-3': 'default'
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cache(django_assert_num_queries):
+    """Test that values are read from the database only once."""
+    kvstore.set('test-key', {'a': 'b'})
+    kvstore.clear_cache()
+    with django_assert_num_queries(1):
+        assert kvstore.get('test-key') == {'a': 'b'}
+        assert kvstore.get('test-key') == {'a': 'b'}
+
+    with django_assert_num_queries(1):
+        assert kvstore.get_default('missing-key', 'x') == 'x'
+        assert kvstore.get_default('missing-key', 'x') == 'x'
+
+    kvstore.clear_cache()
+    with django_assert_num_queries(1):
+        kvstore.get_many(['test-key', 'missing-key'])
+        kvstore.get_many(['test-key', 'missing-key'])
+
+    value = kvstore.get('test-key')
+    value['a'] = 'c'
+    assert kvstore.get('test-key') == {'a': 'b'}
+
+    kvstore.set('missing-key', 'y')
+    assert kvstore.get('missing-key') == 'y'
+    kvstore.delete('missing-key')
+    with pytest.raises(KVStore.DoesNotExist):
+        kvstore.get('missing-key')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cache_rollback():
+    """Test that values written in a rolled back transaction aren't cached."""
+    kvstore.set('test-key', 'a')
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            kvstore.set('test-key', 'b')
+            assert kvstore.get('test-key') == 'b'
+            assert kvstore.get_many(['test-key']) == {'test-key': 'b'}
+            kvstore.delete('test-key')
+            assert kvstore.get_default('test-key', 'x') == 'x'
+            raise RuntimeError()
+
+    assert kvstore.get('test-key') == 'a'
+    with transaction.atomic():
+        kvstore.set('test-key', 'c')
+
+    assert kvstore.get('test-key') == 'c'
+
+
+def test_changed_signal():
+    """Test that a signal is sent when values are changed."""
+    received = []
+
+    def _receiver(sender, keys, **kwargs):
+        received.append(keys)
+
+    kvstore_changed.connect(_receiver)
+    try:
+        kvstore.set('test-key', 'value')
+        kvstore.set_many({'test-key-1': 1, 'test-key-2': 2})
+        kvstore.delete('test-key')
+    finally:
+        kvstore_changed.disconnect(_receiver)
+
+    assert received == [['test-key'], ['test-key-1', 'test-key-2'],
+                        ['test-key']]
@@ -10,11 +10,18 @@ import pytest
 from django.contrib.auth.models import Group, User
 from django.core.exceptions import ValidationError
 
+from plinth import notification as notification_module
 from plinth.notification import Notification
 
 pytestmark = pytest.mark.django_db
 
 
+@pytest.fixture(autouse=True)
+def fixture_clear_caches():
+    """Forget display contexts and user groups cached by other tests."""
+    notification_module.clear_caches()
+
+
 @pytest.fixture(name='note')
 def fixture_note():
     """Fixture to return a valid notification object."""
@@ -413,3 +420,54 @@ def test_display_context_body_template(note, user, load_cfg, rf):
     context_note = context['notifications'][0]
     assert context_note['body'].content == \
         b'Test notification body /plinth/help/about/\n'
+
+
+@patch('plinth.notification.gettext')
+def test_display_context_cache(gettext, note, user, load_cfg, rf):
+    """Test that display context is reused until notification changes."""
+    gettext.side_effect = lambda string: 'translated ' + string
+    request = rf.get('/plinth/help/about/')
+    note.body_template = 'test-notification.html'
+    note.save()
+
+    context = Notification.get_display_context(request, user)
+    call_count = gettext.call_count
+    assert Notification.get_display_context(request, user) == context
+    assert gettext.call_count == call_count
+
+    other_request = rf.get('/plinth/apps/')
+    context_note = Notification.get_display_context(
+        other_request, user)['notifications'][0]
+    assert context_note['body'].content == \
+        b'Test notification body /plinth/apps/\n'
+    assert context_note['title'] == 'translated Test Title'
+
+    # Only the body rendered for the last path is kept
+    context_note = Notification.get_display_context(request,
+                                                    user)['notifications'][0]
+    assert context_note['body'].content == \
+        b'Test notification body /plinth/help/about/\n'
+    assert notification_module._display_cache[note.id]['rendered'][0] == \
+        '/plinth/help/about/'
+
+    note.title = 'New Title'
+    note.save()
+    context_note = Notification.get_display_context(request,
+                                                    user)['notifications'][0]
+    assert context_note['title'] == 'translated New Title'
+
+
+def test_user_groups_cache(note, user, django_assert_num_queries):
+    """Test that groups of a user are cached until membership changes."""
+    note.group = 'test-group-2'
+    note.save()
+    assert list(Notification.list(user=user)) == []
+    with django_assert_num_queries(1):
+        assert list(Notification.list(user=user)) == []
+
+    group = Group.objects.create(name='test-group-2')
+    user.groups.add(group)
+    assert list(Notification.list(user=user)) == [note]
+
+    group.user_set.remove(user)
+    assert list(Notification.list(user=user)) == []
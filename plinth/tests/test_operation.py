@@ -244,6 +244,7 @@ def test_manager_init():
     manager = OperationsManager()
     assert manager._operations == {}
     assert manager._current_operation is None
+    assert manager._parallel_operations == []
     assert isinstance(manager._lock, threading.RLock().__class__)
 
 
@@ -344,6 +345,50 @@ def test_manager_scheduling():
     operation3.join()
 
 
+def test_manager_parallel_scheduling():
+    """Test running operations that allow running in parallel."""
+    manager = OperationsManager()
+    manager.MAX_PARALLEL_OPERATIONS = 2
+    events = [threading.Event() for _ in range(4)]
+
+    operation1 = manager.new('testop1', 'testapp', 'op1', events[0].wait,
+                             allow_parallel=True)
+    operation2 = manager.new('testop2', 'testapp', 'op2', events[1].wait,
+                             allow_parallel=True)
+    operation3 = manager.new('testop3', 'testapp', 'op3', events[2].wait,
+                             allow_parallel=True)
+    operation4 = manager.new('testop4', 'testapp', 'op4', events[3].wait)
+    operations = [operation1, operation2, operation3, operation4]
+
+    def _assert_is_running(*running_operations):
+        for operation in operations:
+            alive = operation in running_operations
+            assert operation.thread.is_alive() == alive
+
+    # Only a limited number of operations run in parallel
+    _assert_is_running(operation1, operation2)
+    assert manager._current_operation is None
+
+    events[0].set()
+    operation1.join()
+    _assert_is_running(operation2, operation3)
+
+    # Other operations wait until parallel operations are done
+    events[1].set()
+    operation2.join()
+    _assert_is_running(operation3)
+
+    events[2].set()
+    operation3.join()
+    _assert_is_running(operation4)
+    assert manager._current_operation == operation4
+
+    events[3].set()
+    operation4.join()
+    assert manager._current_operation is None
+    assert manager._parallel_operations == []
+
+
 def test_manager_filter():
     """Test returning filtered operations."""
     manager = OperationsManager()
@@ -3,11 +3,14 @@
 Test module for package module.
 """
 
+import os
+import time
 import unittest
 from unittest.mock import Mock, call, patch
 
 import pytest
 
+from plinth import package as package_module
 from plinth.app import App
 from plinth.errors import MissingPackageError
 from plinth.modules.diagnostics.check import DiagnosticCheck, Result
@@ -151,6 +154,70 @@ def test_packages_setup_with_conflicts(install, uninstall, packages_installed):
     install.assert_has_calls([call(['bash'], skip_recommends=False)])
 
 
+@patch('plinth.package.is_package_manager_busy')
+@patch('plinth.package.Transaction')
+@patch('plinth.operation.Operation.get_operation')
+def test_install(get_operation, transaction_class, is_package_manager_busy):
+    """Test that packages already installed with other apps are skipped."""
+    is_package_manager_busy.return_value = False
+    operation = Mock(app_id='test-app', thread_data={
+        'packages_preinstalled': {'package1', 'package2'}
+    })
+    get_operation.return_value = operation
+    package_module.install(['package1'])
+    transaction_class.assert_not_called()
+
+    package_module.install(['package1'], reinstall=True)
+    transaction_class.assert_called_with('test-app', ['package1'])
+    transaction_class.return_value.install.assert_called_with(
+        False, None, True, False)
+
+    transaction_class.reset_mock()
+    package_module.install(['package1', 'package3'])
+    transaction_class.assert_called_with('test-app', ['package1', 'package3'])
+
+
+@patch('plinth.package.packages_installed')
+@patch('plinth.package.is_package_manager_busy')
+@patch('plinth.package.Transaction')
+def test_install_for_apps(transaction_class, is_package_manager_busy,
+                          packages_installed):
+    """Test installing packages of multiple apps together."""
+    is_package_manager_busy.return_value = False
+    packages_installed.return_value = ['exim4-base']
+
+    class TestApp1(App):
+        """Test app."""
+        app_id = 'test-app1'
+
+        def __init__(self):
+            super().__init__()
+            self.add(Packages('test-component11', ['python3', 'bash']))
+            self.add(
+                Packages('test-component12', ['perl'], skip_recommends=True))
+
+    class TestApp2(App):
+        """Test app."""
+        app_id = 'test-app2'
+
+        def __init__(self):
+            super().__init__()
+            self.add(Packages('test-component21', ['bash', 'dash']))
+            self.add(
+                Packages('test-component22', ['python3'],
+                         conflicts=['exim4-base'],
+                         conflicts_action=Packages.ConflictsAction.REMOVE))
+
+    installed = package_module.install_for_apps([TestApp1(), TestApp2()])
+    assert installed == {'python3', 'bash', 'dash', 'perl'}
+    transaction_class.assert_has_calls([
+        call(['test-app1', 'test-app2'], ['python3', 'bash', 'dash']),
+        call().install(False),
+        call(['test-app1'], ['perl']),
+        call().install(True)
+    ])
+
+
 @patch('plinth.package.uninstall')
 def test_packages_uninstall(uninstall):
     """Test uninstalling packages component."""
@@ -308,6 +375,7 @@ def test_packages_has_unavailable_packages(path_class, cache):
     assert not component.has_unavailable_packages()
 
     cache.return_value = ['package1']
+    package_module.invalidate_apt_cache()
     assert component.has_unavailable_packages()
 
 
@@ -321,3 +389,67 @@ def test_packages_installed():
     assert len(packages_installed(())) == 0
     assert len(packages_installed(('unknown-package', ))) == 0
     assert len(packages_installed(('python3', ))) == 1
+
+
+@patch('plinth.package._APT_CACHE_SOURCES')
+@patch('apt.Cache')
+def test_apt_cache(cache_class, sources, tmp_path):
+    """Test that apt cache is shared until invalidated."""
+    source = tmp_path / 'status'
+    source.write_text('')
+    sources.__iter__.return_value = [str(source)]
+    cache_class.side_effect = lambda: Mock()
+
+    with package_module.apt_cache() as cache1:
+        with package_module.apt_cache() as cache2:
+            assert cache1 is cache2
+
+    package_module.invalidate_apt_cache()
+    with package_module.apt_cache() as cache3:
+        assert cache3 is not cache1
+
+    os.utime(source, ns=(0, 0))
+    with package_module.apt_cache() as cache4:
+        assert cache4 is not cache3
+
+    assert cache_class.call_count == 3
+
+
+@patch('apt.Cache')
+def test_apt_cache_idle(cache_class):
+    """Test that apt cache is dropped when unused for a while."""
+    apt_cache = package_module._AptCache()
+    apt_cache.IDLE_TIMEOUT = 0.05
+    cache_class.side_effect = lambda: Mock()
+
+    cache1 = apt_cache.acquire()
+    time.sleep(0.1)
+    assert apt_cache.acquire() is cache1
+    apt_cache.release()
+    apt_cache.release()
+
+    time.sleep(0.2)
+    assert apt_cache.acquire() is not cache1
+    apt_cache.release()
+
+
+@patch('plinth.privileged.packages.wait_for_package_manager')
+@patch('plinth.privileged.packages.is_package_manager_busy')
+def test_package_manager_busy(is_busy, wait_for_package_manager):
+    """Test that busy status is reused briefly and waiting is privileged."""
+    is_busy.return_value = True
+    wait_for_package_manager.return_value = True
+    with patch('plinth.package._package_manager_busy',
+               package_module._PackageManagerBusy()):
+        assert package_module.is_package_manager_busy()
+        assert package_module.is_package_manager_busy()
+        assert is_busy.call_count == 1
+
+        package_module._wait_for_package_manager()
+        wait_for_package_manager.assert_called_once_with(timeout=60)
+        assert not package_module.is_package_manager_busy()
+        assert is_busy.call_count == 1
+
+        package_module._package_manager_busy.TIMEOUT = 0
+        is_busy.side_effect = RuntimeError
+        assert not package_module.is_package_manager_busy()
@@ -0,0 +1,140 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for the daemon that runs privileged actions.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+from unittest.mock import patch
+
+from plinth import privileged_daemon
+
+
+@patch('plinth.privileged_daemon._get_allowed_uids')
+def test_is_peer_allowed(get_allowed_uids):
+    """Test that peers are authenticated using their credentials."""
+    client_socket, server_socket = socket.socketpair()
+    with client_socket, server_socket:
+        get_allowed_uids.return_value = [os.getuid()]
+        assert privileged_daemon._is_peer_allowed(server_socket)
+
+        get_allowed_uids.return_value = [os.getuid() + 1]
+        assert not privileged_daemon._is_peer_allowed(server_socket)
+
+
+@patch('plinth.actions.privileged_call')
+def test_run_request(privileged_call):
+    """Test that running a request captures the output of the action."""
+
+    def action(module_name, action_name, arguments):
+        os.write(1, b'test-output\n')
+        os.write(2, b'test-error\xff')
+        return {'result': 'success', 'return': arguments['args'][0]}
+
+    privileged_call.side_effect = action
+    request = {
+        'module': 'tests',
+        'action': 'func',
+        'args': ['foo'],
+        'kwargs': {}
+    }
+    response = privileged_daemon._run_request(json.dumps(request))
+    assert response['returncode'] == 0
+    assert response['return_value'] == {'result': 'success', 'return': 'foo'}
+    assert response['output'] == 'test-output\n'
+    assert response['error'].encode(
+        errors='surrogateescape') == b'test-error\xff'
+    privileged_call.assert_called_once_with('tests', 'func', {
+        'args': ['foo'],
+        'kwargs': {}
+    })
+
+
+@patch('plinth.actions.privileged_call')
+def test_run_request_errors(privileged_call):
+    """Test that errors are returned with the action script's exit codes."""
+    response = privileged_daemon._run_request('not-json')
+    assert response['returncode'] == 10
+
+    response = privileged_daemon._run_request('[]')
+    assert response['returncode'] == 10
+
+    for exception, returncode in ((SyntaxError('x'), 10), (TypeError('x'), 10),
+                                  (PermissionError('x'), 20),
+                                  (RuntimeError('x'), 1)):
+        privileged_call.side_effect = exception
+        response = privileged_daemon._run_request('{}')
+        assert response['returncode'] == returncode
+        assert response['return_value'] is None
+
+
+@patch('plinth.actions.privileged_batch_call')
+def test_run_batch_request(privileged_batch_call):
+    """Test that batch requests run all the calls together."""
+    privileged_batch_call.return_value = [{'result': 'success', 'return': 1}]
+    calls = [{'module': 'tests', 'action': 'func', 'args': [], 'kwargs': {}}]
+    response = privileged_daemon._run_request(json.dumps({'calls': calls}))
+    assert response['returncode'] == 0
+    assert response['return_value'] == [{'result': 'success', 'return': 1}]
+    privileged_batch_call.assert_called_once_with(calls)
+
+
+@patch('plinth.actions.privileged_call')
+def test_run_request_in_child(privileged_call, tmp_path):
+    """Test that actions run in a child process and are terminated."""
+    privileged_call.return_value = {'result': 'success', 'return': os.getpid()}
+    client_socket, server_socket = socket.socketpair()
+    with client_socket, server_socket:
+        response = privileged_daemon._run_request_in_child('{}', server_socket)
+        response = json.loads(response)
+        assert response['returncode'] == 0
+        assert response['return_value']['return'] == os.getpid()
+
+    def action(module_name, action_name, arguments):
+        process = subprocess.Popen(['sleep', '60'])
+        os.write(write_fd, str(process.pid).encode())
+        process.wait()
+
+    # Client closes the connection while the action is running
+    read_fd, write_fd = os.pipe()
+    privileged_call.side_effect = action
+    socket_path = str(tmp_path / 'socket')
+    with socket.socket(socket.AF_UNIX) as listen_socket:
+        listen_socket.bind(socket_path)
+        listen_socket.listen()
+        client = subprocess.Popen([
+            sys.executable, '-c', 'import socket, time\n'
+            'client = socket.socket(socket.AF_UNIX)\n'
+            f'client.connect({socket_path!r})\n'
+            'client.shutdown(socket.SHUT_WR)\n'
+            'time.sleep(60)'
+        ])
+        server_socket, _ = listen_socket.accept()
+
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(
+        privileged_daemon._run_request_in_child('{}', server_socket)))
+    with server_socket:
+        thread.start()
+        sleep_pid = int(os.read(read_fd, 100))
+        client.kill()
+        client.wait()
+        thread.join(timeout=10)
+
+    os.close(read_fd)
+    os.close(write_fd)
+    assert responses == [None]
+    assert not _is_process_running(sleep_pid)
+
+
+def _is_process_running(pid):
+    """Return whether a process exists and has not exited."""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='utf-8') as file_handle:
+            return file_handle.read().split(')')[-1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for running setup of apps.
+"""
+
+from unittest.mock import Mock, call, patch
+
+import pytest
+
+from plinth import setup
+
+
+def _get_app(app_id, depends=None, setup_version=0):
+    """Return a mock app with given dependencies."""
+    app = Mock(app_id=app_id)
+    app.info.depends = depends or []
+    app.get_setup_version.return_value = setup_version
+    return app
+
+
+def test_get_dependency_levels():
+    """Test grouping apps into levels by their dependencies."""
+    app1 = _get_app('app1')
+    app2 = _get_app('app2', ['app1'])
+    app3 = _get_app('app3')
+    app4 = _get_app('app4', ['app2', 'app3', 'not-selected'])
+    app5 = _get_app('app5', ['not-selected'])
+    assert setup._get_dependency_levels([app1, app2, app3, app4, app5]) == [
+        [app1, app3, app5], [app2], [app4]
+    ]
+    assert setup._get_dependency_levels([]) == []
+
+
+@patch('plinth.package.install_for_apps')
+@patch('plinth.setup.run_setup_on_app')
+def test_setup_apps_in_parallel(run_setup_on_app, install_for_apps):
+    """Test running setup of independent apps in parallel."""
+    app1 = _get_app('app1')
+    app2 = _get_app('app2', setup_version=1)
+    app3 = _get_app('app3')
+    install_for_apps.return_value = {'package1'}
+    operation = Mock()
+    run_setup_on_app.side_effect = [operation, None, operation]
+
+    setup._setup_apps_in_parallel([app1, app2, app3], allow_install=True)
+    install_for_apps.assert_called_with([app1, app3])
+    app1.pre_install.assert_called_once_with(0)
+    app2.pre_install.assert_not_called()
+    run_setup_on_app.assert_has_calls([
+        call(app_id, allow_install=True, allow_parallel=True,
+             packages_preinstalled={'package1'})
+        for app_id in ['app1', 'app2', 'app3']
+    ])
+    assert operation.join.call_count == 2
+
+    # Packages are not installed together when installing is not allowed
+    install_for_apps.reset_mock()
+    run_setup_on_app.side_effect = None
+    setup._setup_apps_in_parallel([app1, app3], allow_install=False)
+    install_for_apps.assert_not_called()
+
+    # Failure to install together is not fatal
+    install_for_apps.side_effect = RuntimeError()
+    setup._setup_apps_in_parallel([app1, app3], allow_install=True)
+    run_setup_on_app.assert_called_with('app3', allow_install=True,
+                                        allow_parallel=True,
+                                        packages_preinstalled=set())
+
+
+@patch('plinth.package.install_for_apps')
+@patch('plinth.setup.run_setup_on_app')
+def test_setup_apps_in_parallel_pre_install(run_setup_on_app,
+                                            install_for_apps):
+    """Test that pre-install steps run before installing packages together."""
+    app1 = _get_app('app1')
+    app2 = _get_app('app2')
+    app3 = _get_app('app3')
+    manager = Mock()
+    manager.attach_mock(app1.pre_install, 'pre_install1')
+    manager.attach_mock(install_for_apps, 'install_for_apps')
+    app2.pre_install.side_effect = RuntimeError()
+    setup._setup_apps_in_parallel([app1, app2, app3], allow_install=True)
+    assert manager.mock_calls[:2] == [
+        call.pre_install1(0),
+        call.install_for_apps([app1, app3])
+    ]
+
+    # Packages are installed separately if only one app is left
+    install_for_apps.reset_mock()
+    setup._setup_apps_in_parallel([app1, app2], allow_install=True)
+    install_for_apps.assert_not_called()
+
+
+@patch('plinth.setup.run_setup_on_app')
+def test_setup_apps_in_parallel_failure(run_setup_on_app):
+    """Test that all setups are waited for even when one fails."""
+    operation1 = Mock()
+    operation1.join.side_effect = RuntimeError('test-error')
+    operation2 = Mock()
+    run_setup_on_app.side_effect = [operation1, operation2]
+    with pytest.raises(RuntimeError, match='test-error'):
+        setup._setup_apps_in_parallel([_get_app('app1'), _get_app('app2')],
+                                      allow_install=False)
+
+    operation2.join.assert_called_with()
+
+
+@patch('plinth.setup._setup_apps_in_parallel')
+@patch('plinth.app.App.list')
+def test_setup_apps(app_list, setup_apps_in_parallel):
+    """Test that apps are set up one dependency level at a time."""
+    app1 = _get_app('app1')
+    app1.info.is_essential = True
+    app2 = _get_app('app2', ['app1'])
+    app2.info.is_essential = False
+    app_list.return_value = [app1, app2]
+
+    setup.setup_apps(['app1', 'app2'], allow_install=False)
+    setup_apps_in_parallel.assert_has_calls(
+        [call([app1], False), call([app2], False)])
+
+    setup_apps_in_parallel.reset_mock()
+    setup.setup_apps(essential=True)
+    setup_apps_in_parallel.assert_has_calls([call([app1], True)])
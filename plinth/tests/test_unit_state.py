@@ -0,0 +1,166 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for tracking the state of systemd units.
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from plinth import action_utils, actions, unit_state
+from plinth.privileged import service as service_privileged
+from plinth.utils import import_from_gi
+
+glib = import_from_gi('GLib', '2.0')
+
+
+@pytest.fixture(name='connection')
+def fixture_connection():
+    """Return a D-Bus connection that answers systemd queries."""
+    states = {'/unit/a': 'active', '/unit/b': 'inactive'}
+    file_states = {'a.service': 'enabled', 'b.service': 'static'}
+
+    def call_sync(_name, path, _interface, method, parameters, *_args):
+        if method == 'Subscribe':
+            return glib.Variant('()', ())
+
+        if method == 'LoadUnit':
+            unit = parameters.unpack()[0]
+            return glib.Variant('(o)', ('/unit/' + unit[0], ))
+
+        if method == 'Get':
+            return glib.Variant('(v)', (glib.Variant('s', states[path]), ))
+
+        unit = parameters.unpack()[0]
+        if unit not in file_states:
+            raise glib.Error('No such file')
+
+        return glib.Variant('(s)', (file_states[unit], ))
+
+    connection = Mock()
+    connection.call_sync.side_effect = call_sync
+    connection.states = states
+    connection.file_states = file_states
+    return connection
+
+
+@pytest.fixture(name='cache')
+def fixture_cache(connection):
+    """Return a unit state cache connected to D-Bus."""
+    cache = unit_state.UnitStateCache()
+    cache.connect(connection)
+    with patch('plinth.unit_state.cache', cache):
+        yield cache
+
+
+def _properties_changed(cache, path, changed, invalidated=None):
+    """Emit a PropertiesChanged signal for a unit."""
+    changed = {key: glib.Variant('s', value) for key, value in changed.items()}
+    parameters = glib.Variant(
+        '(sa{sv}as)', (unit_state.UNIT_INTERFACE, changed, invalidated or []))
+    cache._on_properties_changed(None, None, path, None, None, parameters)
+
+
+def _manager_signal(cache, signal, parameters):
+    """Emit a signal from systemd manager object."""
+    cache._on_manager_signal(None, None, None, None, signal, parameters)
+
+
+def test_not_available():
+    """Test that states are not answered when not connected."""
+    cache = unit_state.UnitStateCache()
+    assert not cache.is_available
+    with patch('plinth.unit_state.cache', cache):
+        assert unit_state.is_running('a.service') is None
+        assert unit_state.is_enabled('a.service') is None
+
+
+def test_is_running(cache, connection):
+    """Test that running state is queried once and updated by signals."""
+    assert unit_state.is_running('a.service')
+    assert not unit_state.is_running('b.service')
+    call_count = connection.call_sync.call_count
+    assert unit_state.is_running('a.service')
+    assert connection.call_sync.call_count == call_count
+
+    _properties_changed(cache, '/unit/a', {'ActiveState': 'deactivating'})
+    assert not unit_state.is_running('a.service')
+    _properties_changed(cache, '/unit/b', {'ActiveState': 'reloading'})
+    assert unit_state.is_running('b.service')
+    _properties_changed(cache, '/unit/b', {'SubState': 'running'})
+    assert unit_state.is_running('b.service')
+    assert connection.call_sync.call_count == call_count
+
+    _properties_changed(cache, '/unit/a', {}, ['ActiveState'])
+    assert unit_state.is_running('a.service')
+    assert connection.call_sync.call_count == call_count + 2
+
+    _manager_signal(cache, 'UnitRemoved',
+                    glib.Variant('(so)', ('b.service', '/unit/b')))
+    assert not unit_state.is_running('b.service')
+
+
+def test_is_enabled(cache, connection):
+    """Test that enabled state is queried once and updated by signals."""
+    assert unit_state.is_enabled('a.service')
+    assert unit_state.is_enabled('a.service', strict_check=True)
+    assert unit_state.is_enabled('b.service')
+    assert not unit_state.is_enabled('b.service', strict_check=True)
+    assert not unit_state.is_enabled('c.service')
+    call_count = connection.call_sync.call_count
+    assert not unit_state.is_enabled('c.service')
+    assert connection.call_sync.call_count == call_count
+
+    connection.file_states['a.service'] = 'disabled'
+    _manager_signal(cache, 'UnitFilesChanged', glib.Variant('()', ()))
+    assert not unit_state.is_enabled('a.service')
+    assert not unit_state.is_enabled('c.service')
+
+    connection.file_states['c.service'] = 'enabled'
+    _manager_signal(cache, 'Reloading', glib.Variant('(b)', (True, )))
+    assert not unit_state.is_enabled('c.service')
+    _manager_signal(cache, 'Reloading', glib.Variant('(b)', (False, )))
+    assert unit_state.is_enabled('c.service')
+
+
+def test_name_owner_changed(cache, connection):
+    """Test that states are forgotten when systemd restarts."""
+    assert unit_state.is_running('a.service')
+    connection.states['/unit/a'] = 'failed'
+    parameters = glib.Variant('(sss)', (unit_state.SYSTEMD_NAME, ':1.1',
+                                        ':1.2'))
+    cache._on_name_owner_changed(connection, None, None, None, None,
+                                 parameters)
+    assert not unit_state.is_running('a.service')
+    assert connection.call_sync.call_args_list[-3][0][3] == 'Subscribe'
+
+
+@patch('subprocess.run')
+def test_action_utils(subprocess_run, cache):
+    """Test that action utilities use remembered states when available."""
+    assert action_utils.service_is_running('a.service')
+    assert action_utils.service_is_enabled('b.service')
+    assert not action_utils.service_is_enabled('b.service', strict_check=True)
+    subprocess_run.assert_not_called()
+
+    with patch('plinth.unit_state.cache', unit_state.UnitStateCache()):
+        assert action_utils.service_is_running('a.service')
+        subprocess_run.assert_called_once()
+
+
+@patch('plinth.actions._run_privileged_method')
+def test_service_actions_forget_state(run_privileged_method, cache,
+                                      connection):
+    """Test that changing a service forgets its remembered states."""
+    assert unit_state.is_running('a.service')
+    assert unit_state.is_enabled('a.service')
+    connection.states['/unit/a'] = 'inactive'
+    connection.file_states['a.service'] = 'disabled'
+    service_privileged.stop('a.service')
+    run_privileged_method.assert_called_once()
+    assert not unit_state.is_running('a.service')
+    assert not unit_state.is_enabled('a.service')
+
+    # Privileged process runs the undecorated action
+    action = actions._get_privileged_action('plinth', 'stop')
+    assert not hasattr(action, '__wrapped__')
@@ -4,6 +4,7 @@ Test module for utilities.
 """
 
 import tempfile
+import threading
 from unittest.mock import MagicMock, Mock
 
 import pytest
@@ -11,8 +12,8 @@ import ruamel.yaml
 from django.test.client import RequestFactory
 from ruamel.yaml.compat import StringIO
 
-from plinth.utils import (SafeFormatter, YAMLFile, is_user_admin,
-                          is_valid_user_name)
+from plinth.utils import (SafeFormatter, SharedSnapshot, YAMLFile,
+                          is_user_admin, is_valid_user_name, run_in_threads)
 
 
 def test_is_valid_user_name():
@@ -154,3 +155,52 @@ def test_safe_string_formatter(input_, output):
     """Test the safe string formatter."""
     formatter = SafeFormatter()
     assert output == formatter.vformat(*input_)
+
+
+def test_shared_snapshot():
+    """Test that value is computed once within a snapshot."""
+    loader = Mock(side_effect=range(10))
+    snapshot = SharedSnapshot(loader)
+    assert snapshot.get() == 0
+    assert snapshot.get() == 1
+
+    with snapshot.shared():
+        assert snapshot.get() == 2
+        with snapshot.shared():
+            assert snapshot.get() == 2
+
+        assert snapshot.get() == 2
+
+    assert snapshot.get() == 3
+    assert loader.call_count == 4
+
+
+def test_run_in_threads():
+    """Test that jobs run in threads and hung jobs time out."""
+    release = threading.Event()
+
+    def function(argument):
+        if argument == 'hang':
+            release.wait(5)
+
+        if argument == 'fail':
+            raise RuntimeError('test error')
+
+        return argument * 2
+
+    results = {}
+
+    def on_finish(key, future, start_time):
+        assert start_time
+        results[key] = 'timeout' if future is None else \
+            future.exception() or future.result()
+
+    jobs = {'hung': 'hang', 'ok1': 'a', 'fail': 'fail', 'ok2': 'b'}
+    try:
+        run_in_threads(jobs, function, on_finish, timeout=0.5, max_workers=1)
+    finally:
+        release.set()
+
+    assert results.pop('hung') == 'timeout'
+    assert isinstance(results.pop('fail'), RuntimeError)
+    assert results == {'ok1': 'aa', 'ok2': 'bb'}
@@ -3,9 +3,14 @@
 Tests for common FreedomBox views.
 """
 
+import json
+from unittest.mock import patch
+
 import pytest
+from django.contrib.auth.models import AnonymousUser
 
-from plinth.views import is_safe_url
+from plinth import operation
+from plinth.views import events, is_safe_url
 
 
 @pytest.mark.parametrize('url', [
@@ -34,3 +39,40 @@ def test_is_safe_url_valid_url(url):
 def test_is_safe_url_invalid_url(url):
     """Test invalid URLs for safe URL checks."""
     assert not is_safe_url(url)
+
+
+@pytest.mark.parametrize('version', ['', 'invalid'])
+def test_events_invalid_version(rf, version):
+    """Test that events view rejects invalid versions."""
+    request = rf.get('/plinth/events/', {'version': version})
+    response = events(request)
+    assert response.status_code == 400
+
+
+@patch('plinth.views.is_user_admin')
+@patch('plinth.operation.manager.filter')
+@patch('plinth.events.stream.wait')
+def test_events(wait, filter_, is_user_admin, rf):
+    """Test that events view returns the state of operations."""
+    wait.return_value = 5
+    is_user_admin.return_value = False
+    request = rf.get('/plinth/events/', {'version': '3', 'app_id': 'testapp'})
+    request.user = AnonymousUser()
+    response = json.loads(events(request).content)
+    assert response == {'version': 5, 'is_busy': False}
+    wait.assert_called_with(3, 30)
+
+    is_user_admin.return_value = True
+    filter_.return_value = []
+    response = json.loads(events(request).content)
+    assert not response['is_busy']
+    assert 'app-operations' in response['operations_html']
+    filter_.assert_called_with('testapp')
+
+    running_operation = operation.Operation.__new__(operation.Operation)
+    running_operation.state = operation.Operation.State.RUNNING
+    filter_.return_value = [running_operation]
+    with patch('plinth.views.render_to_string', return_value=''):
+        response = json.loads(events(request).content)
+
+    assert response['is_busy']
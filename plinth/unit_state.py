@@ -0,0 +1,220 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Keep track of the state of systemd units using D-Bus signals.
+
+Checking whether a unit is running or enabled used to start a 'systemctl'
+process for each check. Pages listing apps check many units. Instead, states of
+units are queried from systemd over D-Bus once and are remembered. systemd
+emits signals when the state of a unit changes or when unit files are
+enabled/disabled. These signals are received on the glib main loop and update
+the remembered states.
+
+When systemd is not available, such as in containers or in privileged actions,
+callers fall back to using 'systemctl'.
+"""
+
+import logging
+import threading
+
+from plinth.utils import import_from_gi
+
+gio = import_from_gi('Gio', '2.0')
+glib = import_from_gi('GLib', '2.0')
+
+logger = logging.getLogger(__name__)
+
+SYSTEMD_NAME = 'org.freedesktop.systemd1'
+SYSTEMD_PATH = '/org/freedesktop/systemd1'
+MANAGER_INTERFACE = 'org.freedesktop.systemd1.Manager'
+UNIT_INTERFACE = 'org.freedesktop.systemd1.Unit'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+
+RUNNING_STATES = ('active', 'reloading')
+
+# Values of UnitFileState for which 'systemctl is-enabled' succeeds
+ENABLED_STATES = ('enabled', 'enabled-runtime', 'static', 'alias', 'indirect',
+                  'generated', 'transient')
+
+
+class UnitStateCache:
+    """Remember ActiveState and UnitFileState of systemd units."""
+
+    def __init__(self):
+        """Initialize the cache."""
+        self._connection = None
+        self._lock = threading.Lock()
+        self._unit_names = {}  # Object path -> set of unit names
+        self._active_states = {}  # Unit name -> ActiveState
+        self._file_states = {}  # Unit name -> UnitFileState or None
+
+    @property
+    def is_available(self):
+        """Return whether states can be answered from the cache."""
+        return self._connection is not None
+
+    def connect(self, connection):
+        """Subscribe to systemd signals on a D-Bus connection.
+
+        Must be run from glib thread so that signals are received there.
+        """
+        connection.signal_subscribe(SYSTEMD_NAME, PROPERTIES_INTERFACE,
+                                    'PropertiesChanged', None, UNIT_INTERFACE,
+                                    gio.DBusSignalFlags.NONE,
+                                    self._on_properties_changed)
+        for signal in ('UnitFilesChanged', 'Reloading', 'UnitRemoved'):
+            connection.signal_subscribe(SYSTEMD_NAME, MANAGER_INTERFACE,
+                                        signal, SYSTEMD_PATH, None,
+                                        gio.DBusSignalFlags.NONE,
+                                        self._on_manager_signal)
+
+        connection.signal_subscribe('org.freedesktop.DBus',
+                                    'org.freedesktop.DBus', 'NameOwnerChanged',
+                                    '/org/freedesktop/DBus', SYSTEMD_NAME,
+                                    gio.DBusSignalFlags.NONE,
+                                    self._on_name_owner_changed)
+
+        # systemd only emits signals for units when a client has subscribed
+        self._call(connection, 'Subscribe', None)
+        self._connection = connection
+
+    def clear(self):
+        """Forget all the remembered states."""
+        with self._lock:
+            self._unit_names.clear()
+            self._active_states.clear()
+            self._file_states.clear()
+
+    def forget(self, unit):
+        """Forget the remembered states of a unit.
+
+        Signals from systemd may arrive after an action changing the unit has
+        returned. States are queried again on next use.
+        """
+        with self._lock:
+            self._active_states.pop(unit, None)
+            self._file_states.pop(unit, None)
+
+    def get_active_state(self, unit):
+        """Return the ActiveState of a unit."""
+        state = self._active_states.get(unit)
+        if state is not None:
+            return state
+
+        path = self._call(self._connection, 'LoadUnit',
+                          glib.Variant('(s)', (unit, )))[0]
+        with self._lock:
+            self._unit_names.setdefault(path, set()).add(unit)
+
+        state = self._connection.call_sync(
+            SYSTEMD_NAME, path, PROPERTIES_INTERFACE, 'Get',
+            glib.Variant('(ss)', (UNIT_INTERFACE, 'ActiveState')), None,
+            gio.DBusCallFlags.NONE, -1, None).unpack()[0]
+
+        # A signal may have already provided a newer state after the query
+        with self._lock:
+            return self._active_states.setdefault(unit, state)
+
+    def get_file_state(self, unit):
+        """Return the UnitFileState of a unit or None if there is no file."""
+        try:
+            return self._file_states[unit]
+        except KeyError:
+            pass
+
+        try:
+            state = self._call(self._connection, 'GetUnitFileState',
+                               glib.Variant('(s)', (unit, )))[0]
+        except glib.Error:
+            state = None
+
+        with self._lock:
+            return self._file_states.setdefault(unit, state)
+
+    @staticmethod
+    def _call(connection, method, parameters):
+        """Call a method on systemd manager object and return the result."""
+        return connection.call_sync(SYSTEMD_NAME, SYSTEMD_PATH,
+                                    MANAGER_INTERFACE, method, parameters,
+                                    None, gio.DBusCallFlags.NONE, -1,
+                                    None).unpack()
+
+    def _on_properties_changed(self, _connection, _sender, path, _interface,
+                               _signal, parameters):
+        """Update the state of a unit when its properties change."""
+        _unit_interface, changed, invalidated = parameters.unpack()
+        with self._lock:
+            for unit in self._unit_names.get(path, ()):
+                if 'ActiveState' in changed:
+                    self._active_states[unit] = changed['ActiveState']
+                elif 'ActiveState' in invalidated:
+                    self._active_states.pop(unit, None)
+
+    def _on_manager_signal(self, _connection, _sender, _path, _interface,
+                           signal, parameters):
+        """Forget states invalidated by a change in systemd."""
+        with self._lock:
+            if signal == 'UnitRemoved':
+                removed_unit, path = parameters.unpack()
+                self._active_states.pop(removed_unit, None)
+                for unit in self._unit_names.pop(path, ()):
+                    self._active_states.pop(unit, None)
+            elif signal == 'UnitFilesChanged':
+                self._file_states.clear()
+            elif signal == 'Reloading' and not parameters.unpack()[0]:
+                # Unit files have been re-read after 'daemon-reload'
+                self._file_states.clear()
+                self._active_states.clear()
+
+    def _on_name_owner_changed(self, connection, _sender, _path, _interface,
+                               _signal, parameters):
+        """Forget all the states when systemd restarts."""
+        self.clear()
+        _name, _old_owner, new_owner = parameters.unpack()
+        if new_owner:
+            self._call(connection, 'Subscribe', None)
+
+
+cache = UnitStateCache()
+
+
+def init():
+    """Connect to systemd over D-Bus. Must be run from glib thread."""
+    from plinth import action_utils, dbus
+    if not action_utils.is_systemd_running():
+        logger.info('systemd not running, unit states will not be cached')
+        return
+
+    try:
+        connection = dbus.get_connection()
+        cache.connect(connection)
+    except glib.Error as exception:
+        logger.warning('Unable to track systemd unit states: %s', exception)
+
+
+def is_running(unit):
+    """Return whether a unit is running, if known, or None otherwise."""
+    if not cache.is_available:
+        return None
+
+    try:
+        return cache.get_active_state(unit) in RUNNING_STATES
+    except glib.Error as exception:
+        logger.warning('Unable to get state of unit %s: %s', unit, exception)
+        return None
+
+
+def is_enabled(unit, strict_check=False):
+    """Return whether a unit is enabled, if known, or None otherwise."""
+    if not cache.is_available:
+        return None
+
+    state = cache.get_file_state(unit)
+    if strict_check:
+        return state == 'enabled'
+
+    return state in ENABLED_STATES
+
+
+def forget(unit):
+    """Forget the remembered states of a unit after changing it."""
+    cache.forget(unit)
@@ -30,6 +30,9 @@ urlpatterns = [
     re_path(r'^captcha/refresh/$', public(cviews.captcha_refresh),
             name='captcha-refresh'),
 
+    # Operation and notification updates
+    re_path(r'^events/$', views.events, name='events'),
+
     # Notifications
     re_path(r'^notification/(?P<id>[A-Za-z0-9-=]+)/dismiss/$',
             views.notification_dismiss, name='notification_dismiss')
@@ -3,12 +3,16 @@
 Miscellaneous utility methods.
 """
 
+import contextlib
 import gzip
 import importlib
 import os
 import random
 import re
 import string
+import threading
+import time
+from concurrent import futures
 
 import markupsafe
 import ruamel.yaml
@@ -185,3 +189,95 @@ class SafeFormatter(string.Formatter):
             return super().get_value(key, args, kwargs)
         except (IndexError, KeyError):
             return f'?{key}?'
+
+
+class SharedSnapshot:
+    """A value computed once and shared while a snapshot is in use.
+
+    Outside of a snapshot, get() computes the value afresh each time. Within a
+    snapshot, from any thread, the value is computed when first needed and is
+    reused until the outermost snapshot ends.
+    """
+
+    def __init__(self, loader):
+        """Initialize the snapshot with a function that computes the value."""
+        self._loader = loader
+        self._value = None
+        self._users = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def shared(self):
+        """Share the value among all the calls to get() within."""
+        with self._lock:
+            self._users += 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._users -= 1
+                if not self._users:
+                    self._value = None
+
+    def get(self):
+        """Return the shared value or a freshly computed one."""
+        with self._lock:
+            if not self._users:
+                return self._loader()
+
+            if self._value is None:
+                self._value = self._loader()
+
+            return self._value
+
+
+def run_in_threads(jobs, function, on_finish, timeout, max_workers,
+                   thread_name_prefix=''):
+    """Run a function for each job in a pool of threads with a timeout.
+
+    'jobs' is a dictionary of keys and the arguments to call 'function' with.
+    on_finish(key, future, start_time) is called in the calling thread as each
+    job finishes. 'future' is None if the job did not finish within 'timeout'
+    seconds of starting. A thread can't be stopped, so a timed out job is left
+    to finish in the background. Jobs that have not started yet are moved to a
+    new pool so that they are not stuck behind it.
+    """
+    start_times = {}
+
+    def _run_job(key):
+        start_times[key] = time.monotonic()
+        return function(jobs[key])
+
+    def _new_executor():
+        return futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    executor = _new_executor()
+    pending = {executor.submit(_run_job, key): key for key in jobs}
+    try:
+        while pending:
+            done, _ = futures.wait(pending, timeout=1,
+                                   return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                on_finish(key, future, start_times[key])
+
+            timed_out = False
+            now = time.monotonic()
+            for future, key in list(pending.items()):
+                start_time = start_times.get(key)
+                if start_time and now - start_time > timeout:
+                    timed_out = True
+                    del pending[future]
+                    on_finish(key, None, start_time)
+
+            if timed_out:
+                executor.shutdown(wait=False)
+                executor = _new_executor()
+                for future, key in list(pending.items()):
+                    if future.cancel():
+                        del pending[future]
+                        pending[executor.submit(_run_job, key)] = key
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
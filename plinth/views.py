@@ -3,6 +3,7 @@
 Main FreedomBox views.
 """
 
+import copy
 import datetime
 import time
 import urllib.parse
@@ -10,8 +11,10 @@ import urllib.parse
 from django.contrib import messages
 from django.core.exceptions import ImproperlyConfigured
 from django.forms import Form
-from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect
+from django.http import (Http404, HttpResponseBadRequest, HttpResponseRedirect,
+                         JsonResponse)
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.translation import gettext as _
@@ -26,11 +29,15 @@ from plinth.modules.config import get_advanced_mode
 from plinth.modules.firewall.components import get_port_forwarding_info
 from plinth.package import Packages
 from plinth.translation import get_language_from_request, set_language
+from plinth.utils import is_user_admin
 
+from . import events as events_module
 from . import forms, frontpage, operation, package, setup
 
 REDIRECT_FIELD_NAME = 'next'
 
+EVENTS_TIMEOUT = 30
+
 
 def is_safe_url(url):
     """Check if the URL is safe to redirect to.
@@ -306,6 +313,8 @@ class AppOperationsView(TemplateView):
     def get_context_data(self, *args, **kwargs):
         """Add additional context data for template."""
         context = super().get_context_data(*args, **kwargs)
+        context['events_version'] = events_module.stream.version
+        context['events_app_id'] = self.app.app_id
         context['app_id'] = self.app.app_id
         context['app_info'] = self.app.info
         context['operations'] = operation.manager.filter(self.app.app_id)
@@ -326,6 +335,8 @@ class SetupView(TemplateView):
         app_id = self.kwargs['app_id']
         app = app_module.App.get(app_id)
 
+        context['events_version'] = events_module.stream.version
+        context['events_app_id'] = app.app_id
         context['app_id'] = app.app_id
         context['app_info'] = app.info
 
@@ -496,3 +507,51 @@ def notification_dismiss(request, id):
     notes[0].dismiss()
 
     return HttpResponseRedirect(_get_redirect_url_from_param(request))
+
+
+@public
+def events(request):
+    """Wait for changes to operations and notifications and return them.
+
+    Pages showing the progress of operations use this to update themselves in
+    place instead of reloading.
+    """
+    from .notification import Notification
+
+    try:
+        version = int(request.GET.get('version', ''))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid version')
+
+    version = events_module.stream.wait(version, EVENTS_TIMEOUT)
+    response = {'version': version, 'is_busy': setup.is_first_setup_running}
+
+    app_id = request.GET.get('app_id')
+    if app_id and is_user_admin(request):
+        operations = operation.manager.filter(app_id)
+        response['is_busy'] = any(
+            operation_.state != operation.Operation.State.COMPLETED
+            for operation_ in operations)
+        response['operations_html'] = render_to_string(
+            'operations.html', {'operations': operations})
+
+    if request.user.is_authenticated:
+        # Render links in notifications for the page instead of this view
+        page_request = copy.copy(request)
+        path = request.GET.get('path')
+        if path and is_safe_url(path):
+            page_request.path = path
+
+        notifications = Notification.get_display_context(
+            page_request, request.user)
+        context = {
+            'notifications': notifications['notifications'],
+            'notifications_max_severity': notifications['max_severity'],
+            'request': page_request
+        }
+        response['notifications_dropdown_html'] = render_to_string(
+            'notifications-dropdown.html', context)
+        response['notifications_html'] = render_to_string(
+            'notifications.html', context)
+
+    return JsonResponse(response)
@@ -9,13 +9,14 @@ import pathlib
 import random
 import stat
 
+import django
 import django.conf
 import django.core.management
 import django.core.wsgi
 from django.conf import global_settings
 from django.contrib.messages import constants as message_constants
 
-from . import cfg, glib, log, module_loader, settings
+from . import cfg, db, glib, log, module_loader, settings
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +35,8 @@ def init():
         settings.IPWARE_META_PRECEDENCE_ORDER = ('HTTP_X_FORWARDED_FOR', )
 
     settings.DATABASES['default']['NAME'] = cfg.store_file
+    settings.DATABASES['default']['OPTIONS'].update(
+        db.get_database_options(django.VERSION))
     settings.DEBUG = cfg.develop
     settings.FORCE_SCRIPT_NAME = cfg.server_dir
     settings.INSTALLED_APPS += module_loader.get_modules_to_load()
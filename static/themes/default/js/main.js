@@ -33,13 +33,211 @@ document.addEventListener('DOMContentLoaded', function() {
         if (isNaN(seconds))
             return;
 
-        window.setTimeout(() => {
-            // Refresh the page without resubmitting the POST data.
-            window.location = window.location.href;
-        }, seconds * 1000);
+        if (seconds > 0 && body.hasAttribute('data-events-url')) {
+            waitForEvents(body, seconds);
+            return;
+        }
+
+        if (seconds > 0 && document.querySelector('[data-log-tail-url]')) {
+            // Logs are updated in place and page is reloaded when done
+            return;
+        }
+
+        window.setTimeout(refreshPage, seconds * 1000);
+    }
+});
+
+/*
+ * Refresh the page without resubmitting the POST data.
+ */
+function refreshPage() {
+    window.location = window.location.href;
+}
+
+/*
+ * Update progress of operations and notifications in place as they change.
+ *
+ * Make a long-poll request that returns when something changes. Once the
+ * operations are done, reload the page to show their results. On errors, fall
+ * back to reloading the page after the given number of seconds.
+ */
+function waitForEvents(body, seconds) {
+    const url = body.getAttribute('data-events-url');
+    const appId = body.getAttribute('data-events-app-id');
+    let version = body.getAttribute('data-events-version');
+
+    function poll() {
+        const params = new URLSearchParams({
+            version: version,
+            app_id: appId,
+            path: window.location.pathname
+        });
+        fetch(url + '?' + params.toString(), {
+            credentials: 'same-origin',
+            headers: {'Accept': 'application/json'}
+        }).then((response) => {
+            if (!response.ok)
+                throw new Error('Failed to get events: ' + response.status);
+
+            return response.json();
+        }).then((data) => {
+            if (!data.is_busy) {
+                refreshPage();
+                return;
+            }
+
+            if (String(data.version) === version) {
+                // Timed out or server is busy, try again later
+                window.setTimeout(poll, seconds * 1000);
+                return;
+            }
+
+            version = String(data.version);
+            updateEvents(data);
+            poll();
+        }).catch(() => {
+            window.setTimeout(refreshPage, seconds * 1000);
+        });
     }
+
+    poll();
+}
+
+/*
+ * Append new lines to logs shown on the page instead of reloading it.
+ *
+ * Logs are elements with a data-log-name attribute at or inside an element
+ * with a data-log-tail-url or data-log-refresh-url attribute. The position of
+ * each log is sent to the URL which returns only the lines added after it.
+ *
+ * With data-log-tail-url, logs are updated periodically. Once the server is no
+ * longer busy, reload the page to show the results. With data-log-refresh-url,
+ * logs are updated only when a .log-refresh element inside is clicked. Logs
+ * with a data-log-max-lines attribute keep only that many last lines.
+ */
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-log-tail-url]').forEach(tailLogs);
+    document.querySelectorAll('[data-log-refresh-url]').forEach(refreshLogs);
 });
 
+function getLogs(container) {
+    const logs = Array.from(container.querySelectorAll('[data-log-name]'));
+    if (container.hasAttribute('data-log-name'))
+        logs.push(container);
+
+    return logs;
+}
+
+function fetchLogs(url, logs) {
+    const params = new URLSearchParams();
+    for (const log of logs) {
+        params.append(log.getAttribute('data-log-name'),
+                      log.getAttribute('data-log-position'));
+    }
+
+    return fetch(url + '?' + params.toString(), {
+        credentials: 'same-origin',
+        headers: {'Accept': 'application/json'}
+    }).then((response) => {
+        if (!response.ok)
+            throw new Error('Failed to get logs: ' + response.status);
+
+        return response.json();
+    }).then((data) => {
+        if (data.is_busy === false)
+            return data;
+
+        for (const log of logs) {
+            const update = data.logs[log.getAttribute('data-log-name')];
+            if (!update)
+                continue;
+
+            if (update.reset)
+                log.textContent = update.data;
+            else
+                log.append(update.data);
+
+            const maxLines = parseInt(log.getAttribute('data-log-max-lines'),
+                                      10);
+            if (maxLines > 0) {
+                const lines = log.textContent.split('\n');
+                // Last item is empty as log ends with a new line
+                if (lines.length > maxLines + 1)
+                    log.textContent = lines.slice(-maxLines - 1).join('\n');
+            }
+
+            log.setAttribute('data-log-position', update.position || '');
+        }
+
+        return data;
+    });
+}
+
+function tailLogs(container) {
+    const url = container.getAttribute('data-log-tail-url');
+    let seconds = parseInt(container.getAttribute('data-log-tail-sec'), 10);
+    if (isNaN(seconds) || seconds <= 0)
+        seconds = 3;
+
+    const logs = getLogs(container);
+
+    function poll() {
+        fetchLogs(url, logs).then((data) => {
+            if (data.is_busy === false) {
+                refreshPage();
+                return;
+            }
+
+            window.setTimeout(poll, seconds * 1000);
+        }).catch(() => {
+            // Web interface may be restarting during an update, try again
+            window.setTimeout(poll, seconds * 1000);
+        });
+    }
+
+    window.setTimeout(poll, seconds * 1000);
+}
+
+function refreshLogs(container) {
+    const url = container.getAttribute('data-log-refresh-url');
+    const logs = getLogs(container);
+    container.querySelectorAll('.log-refresh').forEach((button) => {
+        button.addEventListener('click', (event) => {
+            // Without JavaScript, the link reloads the page instead
+            event.preventDefault();
+            button.classList.add('disabled');
+            fetchLogs(url, logs).catch(() => {
+                window.location.reload();
+            }).finally(() => {
+                button.classList.remove('disabled');
+            });
+        });
+    });
+}
+
+/*
+ * Replace parts of the page with updated content from events.
+ */
+function updateEvents(data) {
+    const replacements = {
+        '.app-operations': data.operations_html,
+        '.notifications-dropdown': data.notifications_dropdown_html,
+        '.notifications': data.notifications_html,
+    };
+    for (const [selector, html] of Object.entries(replacements)) {
+        if (html === undefined)
+            continue;
+
+        document.querySelectorAll(selector).forEach((element) => {
+            // Don't close the list of notifications while user is reading it
+            if (element.querySelector('.dropdown-menu.show'))
+                return;
+
+            element.outerHTML = html;
+        });
+    }
+}
+
 /*
  * Return all submit buttons on the page
  */